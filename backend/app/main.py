@@ -1,5 +1,29 @@
-# main.py
-# Entry point for your Python backend (FastAPI, Flask, etc.)
+import contextlib
 
-if __name__ == "__main__":
-    print("Backend entry point. Implement your app logic here.")
+from fastapi import FastAPI
+
+from .routes import chat, metrics
+from .services import llm_service
+from .utils.config import settings
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs once per worker process: each has its own clients and caches
+    if settings.SERVER_WARM_UP:
+        await llm_service.warm_up()
+    try:
+        yield
+    finally:
+        await llm_service.shut_down()
+
+
+def create_app() -> FastAPI:
+    """
+    The AWS tutor API. Shared clients, caches and indexes are created and
+    connected at startup and closed on shutdown.
+    """
+    app = FastAPI(title="AWS Tutor", lifespan=lifespan)
+    app.include_router(chat.router)
+    app.include_router(metrics.router)
+    return app
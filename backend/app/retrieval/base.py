@@ -0,0 +1,41 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+
+@dataclass
+class SearchResult:
+    """
+    One retrieved documentation chunk. `score` is cosine similarity (higher
+    is better).
+    """
+
+    id: str
+    score: float
+    content: str
+    title: str = ""
+    url: str = ""
+    section: str = ""
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class Retriever:
+    """
+    Interface for vector retrieval backends.
+    """
+
+    async def search(self, embedding: Sequence[float], k: int = 5, text: str = "") -> List[SearchResult]:
+        """
+        Return the `k` chunks most similar to `embedding`, best first.
+        `text` is the question itself, for backends that also match terms.
+        """
+        raise NotImplementedError
+
+    def index_changed(self) -> bool:
+        """
+        Whether the index files it serves were replaced (rebuilt) since it
+        was opened. Backends that query a live service never are.
+        """
+        return False
+
+    async def close(self):
+        pass
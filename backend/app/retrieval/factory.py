@@ -0,0 +1,41 @@
+from typing import Optional
+
+from .base import Retriever
+
+
+def create_retriever(settings) -> Optional[Retriever]:
+    """
+    Build the retriever selected by RETRIEVER_BACKEND, or None for "none".
+    With RETRIEVER_SPARSE_INDEX_PATH set, it is fused with BM25 search.
+    """
+    dense = create_dense_retriever(settings)
+    if dense is None or not settings.RETRIEVER_SPARSE_INDEX_PATH:
+        return dense
+    from .hybrid import HybridRetriever
+    from .sparse import SparseIndex
+    return HybridRetriever(
+        dense,
+        SparseIndex(settings.RETRIEVER_SPARSE_INDEX_PATH),
+        candidates=settings.RETRIEVER_FUSION_CANDIDATES,
+        rrf_k=settings.RETRIEVER_RRF_K,
+    )
+
+
+def create_dense_retriever(settings) -> Optional[Retriever]:
+    backend = settings.RETRIEVER_BACKEND
+    if backend == "none":
+        return None
+    if backend == "weaviate":
+        from .weaviate_backend import WeaviateRetriever
+        return WeaviateRetriever(settings.VECTOR_DB_URL, class_name=settings.WEAVIATE_CLASS)
+    if backend == "memory":
+        from .memory import InMemoryRetriever
+        return InMemoryRetriever.open(
+            settings.RETRIEVER_INDEX_PATH,
+            ivf_lists=settings.RETRIEVER_IVF_LISTS,
+            ivf_probes=settings.RETRIEVER_IVF_PROBES,
+            quantization=settings.RETRIEVER_QUANTIZATION,
+            pq_subspaces=settings.RETRIEVER_PQ_SUBSPACES,
+            rerank=settings.RETRIEVER_EXACT_RERANK,
+        )
+    raise ValueError(f"Unknown RETRIEVER_BACKEND: {backend}")
@@ -0,0 +1,56 @@
+import asyncio
+import dataclasses
+from typing import Dict, List, Sequence
+
+from .base import Retriever, SearchResult
+from .sparse import SparseIndex
+
+
+def rrf_fuse(rankings: Sequence[Sequence[SearchResult]], k: int, rrf_k: int = 60) -> List[SearchResult]:
+    """
+    Reciprocal rank fusion: each result scores sum(1 / (rrf_k + rank)) over
+    the rankings it appears in. Ranks don't depend on how each ranking is
+    scored, so cosine similarities and BM25 scores can be combined as is.
+    """
+    fused: Dict[str, float] = {}
+    results: Dict[str, SearchResult] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            fused[result.id] = fused.get(result.id, 0.0) + 1.0 / (rrf_k + rank)
+            results.setdefault(result.id, result)
+    best = sorted(fused, key=fused.get, reverse=True)[:k]
+    return [dataclasses.replace(results[id], score=fused[id]) for id in best]
+
+
+class HybridRetriever(Retriever):
+    """
+    Dense retrieval fused with BM25 over a sparse index.
+
+    Both sides return their best `candidates` results for the question and
+    the lists are merged with reciprocal rank fusion, so a chunk that
+    contains the exact identifier asked about surfaces even when its
+    embedding is not among the nearest.
+    """
+
+    def __init__(self, dense: Retriever, sparse: SparseIndex, candidates: int = 50, rrf_k: int = 60):
+        self.dense = dense
+        self.sparse = sparse
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    async def search(self, embedding, k=5, text=""):
+        n = max(k, self.candidates)
+        if not text:
+            return await self.dense.search(embedding, k)
+        dense, sparse = await asyncio.gather(
+            self.dense.search(embedding, n, text),
+            asyncio.to_thread(self.sparse.search_sync, text, n),
+        )
+        return rrf_fuse([dense, sparse], k, self.rrf_k)
+
+    def index_changed(self):
+        return self.dense.index_changed() or self.sparse.changed()
+
+    async def close(self):
+        await self.dense.close()
+        self.sparse.close()
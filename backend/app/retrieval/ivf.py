@@ -0,0 +1,83 @@
+import numpy as np
+
+# Rows scored per block when the matrix isn't float32, to bound the size of
+# the temporary float32 copy
+SCORE_BLOCK_ROWS = 16384
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the `k` highest scores, best first, without a full sort.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def dot_rows(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    matrix @ query in float32. Reduced-precision matrices (e.g. a float16
+    memory-mapped store) are upcast block by block instead of all at once.
+    """
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+
+class IVFIndex:
+    """
+    Inverted-file index over unit-normalized vectors.
+
+    Vectors are clustered with spherical k-means into `n_lists` lists, and a
+    query only scores the rows of the `n_probe` lists whose centroids are
+    closest to it. The index only holds row numbers, so the matrix itself
+    can stay read-only (e.g. memory-mapped).
+    """
+
+    def __init__(self, centroids: np.ndarray, rows: np.ndarray, offsets: np.ndarray, n_probe: int = 8):
+        self.centroids = centroids
+        # Row numbers grouped by list: list i is rows[offsets[i]:offsets[i + 1]]
+        self.rows = rows
+        self.offsets = offsets
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, n_lists: int, n_probe: int = 8, iterations: int = 10,
+              sample_size: int = 100000, seed: int = 0) -> "IVFIndex":
+        """
+        Cluster the rows of `matrix`. Centroids are trained on at most
+        `sample_size` rows, then every row is assigned to its nearest one.
+        """
+        n = len(matrix)
+        n_lists = max(1, min(n_lists, n))
+        rng = np.random.default_rng(seed)
+        sample = matrix[np.sort(rng.choice(n, min(n, sample_size), replace=False))].astype(np.float32)
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = sample[assignment == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / (np.linalg.norm(centroid) or 1.0)
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        rows = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        return cls(centroids, rows, offsets, n_probe)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """
+        Row numbers in the probed lists.
+        """
+        lists = top_k(self.centroids @ query, self.n_probe)
+        return np.concatenate([self.rows[self.offsets[i]:self.offsets[i + 1]] for i in lists])
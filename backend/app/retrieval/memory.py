@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .base import Retriever, SearchResult
+from .ivf import IVFIndex, dot_rows, top_k
+from .quantization import Quantizer, create_quantizer
+from .store import EmbeddingStore, write_store
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class InMemoryRetriever(Retriever):
+    """
+    Exact (or IVF-approximate) search over embeddings held in one contiguous
+    matrix of unit-normalized rows.
+
+    Brute-force top-k is a single matrix-vector product plus argpartition,
+    which is fast enough for tens of thousands of chunks. For larger
+    corpora pass `ivf_lists` to only scan the `ivf_probes` nearest clusters.
+
+    `open()` serves a memory-mapped EmbeddingStore without copying it, so
+    startup doesn't depend on index size and worker processes share pages.
+
+    `quantization` ("float16", "int8" or "pq") scans a compressed copy of the
+    vectors instead; the best `rerank` candidates are then rescored with
+    the exact vectors. Served from a store, only those candidate rows of
+    the float32 matrix are read per query, and an IVF index or codes
+    written with the store are mapped instead of built again.
+    """
+
+    def __init__(self, embeddings, documents: Sequence[Dict[str, Any]], ivf_lists: int = 0,
+                 ivf_probes: int = 8, normalized: bool = False, quantization: str = "none",
+                 pq_subspaces: int = 64, rerank: int = 100, quantizer: Optional[Quantizer] = None,
+                 codes: Optional[np.ndarray] = None, index: Optional[IVFIndex] = None):
+        if normalized:
+            self.matrix = embeddings
+        else:
+            self.matrix = np.ascontiguousarray(normalize_rows(np.asarray(embeddings, dtype=np.float32)))
+        if len(self.matrix) != len(documents):
+            raise ValueError(f"{len(self.matrix)} embeddings for {len(documents)} documents")
+        self.documents = documents
+        self.store: Optional[EmbeddingStore] = None
+        self.index: Optional[IVFIndex] = index
+        if index is None and ivf_lists and len(self.matrix):
+            self.index = IVFIndex.build(self.matrix, ivf_lists, ivf_probes)
+        self.rerank = rerank
+        # Codes encoded ahead of time come with their trained quantizer
+        self.quantizer: Optional[Quantizer] = quantizer
+        self.codes: Optional[np.ndarray] = codes
+        if codes is None:
+            self.quantizer = create_quantizer(quantization, pq_subspaces)
+            if self.quantizer is not None and len(self.matrix):
+                self.codes = self.quantizer.encode(self.matrix)
+
+    @classmethod
+    def open(cls, path: str, ivf_lists: int = 0, ivf_probes: int = 8, quantization: str = "none",
+             pq_subspaces: int = 64, **kwargs) -> "InMemoryRetriever":
+        """
+        Serve the embedding store at `path` (see app.retrieval.store).
+        """
+        store = EmbeddingStore(path)
+        index = store.ivf_index(ivf_lists, ivf_probes)
+        if ivf_lists and index is None and len(store):
+            logger.warning(f"{path} has no IVF index with {ivf_lists} lists, clustering it at startup; "
+                           f"rebuild it with --ivf-lists {ivf_lists} to store it")
+        quantizer, codes = store.quantized(quantization, pq_subspaces)
+        if quantization != "none" and codes is None and len(store):
+            logger.warning(f"{path} has no {quantization} codes, encoding them at startup; "
+                           f"rebuild it with --quantization {quantization} to store them")
+        retriever = cls(store.matrix, store.documents, ivf_lists=ivf_lists, ivf_probes=ivf_probes,
+                        normalized=True, quantization=quantization, pq_subspaces=pq_subspaces,
+                        quantizer=quantizer, codes=codes, index=index, **kwargs)
+        retriever.store = store
+        return retriever
+
+    def save(self, path: str, dtype: str = "float32"):
+        options = {}
+        if self.index is not None:
+            options["ivf_lists"] = len(self.index.centroids)
+        if self.quantizer is not None:
+            options["quantization"] = self.quantizer.name
+            options["pq_subspaces"] = getattr(self.quantizer, "subspaces", 64)
+        write_store(path, self.matrix, [self.documents[i] for i in range(len(self.documents))], dtype,
+                    **options)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def index_changed(self):
+        return self.store is not None and self.store.changed()
+
+    def search_sync(self, embedding: Sequence[float], k: int = 5) -> List[SearchResult]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not len(self.documents) or not norm:
+            return []
+        query = query / norm
+        rows = self.index.candidates(query) if self.index is not None else None
+        if self.codes is None:
+            if rows is None:
+                scores = dot_rows(self.matrix, query)
+                return [self.result(row, scores[row]) for row in top_k(scores, k)]
+            scores = dot_rows(self.matrix[rows], query)
+            return [self.result(rows[i], scores[i]) for i in top_k(scores, k)]
+
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = self.quantizer.scores(codes, query)
+        if not self.rerank:
+            best = top_k(scores, k)
+            return [self.result(best[i] if rows is None else rows[best[i]], scores[best[i]])
+                    for i in range(len(best))]
+        best = top_k(scores, max(k, self.rerank))
+        # Exact re-rank; sorted rows keep the reads from the store sequential
+        best = np.sort(best if rows is None else rows[best])
+        exact = dot_rows(self.matrix[best], query)
+        return [self.result(best[i], exact[i]) for i in top_k(exact, k)]
+
+    def result(self, row: int, score: float) -> SearchResult:
+        doc = self.documents[int(row)]
+        return SearchResult(
+            id=doc.get("chunk_id") or doc.get("id") or str(row),
+            score=float(score),
+            content=doc.get("content", ""),
+            title=doc.get("title", ""),
+            url=doc.get("url", ""),
+            section=doc.get("section", ""),
+            metadata=doc,
+        )
+
+    async def search(self, embedding, k=5, text=""):
+        # NumPy releases the GIL, so large scans don't stall the event loop
+        return await asyncio.to_thread(self.search_sync, embedding, k)
+
+    async def close(self):
+        if self.store is not None:
+            self.matrix = self.documents = self.index = self.codes = None
+            self.store.close()
+            self.store = None
@@ -0,0 +1,173 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from .ivf import SCORE_BLOCK_ROWS, dot_rows
+
+
+def _blocks(matrix: np.ndarray):
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        yield start, matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+
+
+class Quantizer:
+    """
+    Compressed in-memory copy of an embedding matrix.
+
+    `encode()` builds the codes from a (possibly memory-mapped) float matrix
+    block by block; `scores()` returns approximate dot products between the
+    query and a subset of those codes. `params()` and `load()` round-trip
+    what `encode()` trained, so codes written to a store can be served
+    without encoding them again.
+    """
+
+    name = "none"
+
+    def encode(self, matrix: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def params(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def load(self, params: Dict[str, np.ndarray]):
+        pass
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class Float16Quantizer(Quantizer):
+    """
+    Half-precision vectors: 2 bytes per dimension, near-lossless for
+    cosine ranking.
+    """
+
+    name = "float16"
+
+    def encode(self, matrix):
+        codes = np.empty(matrix.shape, dtype=np.float16)
+        for start, block in _blocks(matrix):
+            codes[start:start + len(block)] = block
+        return codes
+
+    def scores(self, codes, query):
+        return dot_rows(codes, query)
+
+
+class Int8Quantizer(Quantizer):
+    """
+    Symmetric scalar quantization to int8 with one scale per dimension:
+    1 byte per dimension. The scales are folded into the query, so scoring
+    is a plain int8 x float32 product.
+    """
+
+    name = "int8"
+
+    def __init__(self):
+        self.scale: Optional[np.ndarray] = None
+
+    def encode(self, matrix):
+        peak = np.zeros(matrix.shape[1], dtype=np.float32)
+        for _, block in _blocks(matrix):
+            np.maximum(peak, np.abs(block).max(axis=0), out=peak)
+        peak[peak == 0] = 1.0
+        self.scale = peak / 127.0
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start, block in _blocks(matrix):
+            codes[start:start + len(block)] = np.clip(np.rint(block / self.scale), -127, 127)
+        return codes
+
+    def params(self):
+        return {"scale": self.scale}
+
+    def load(self, params):
+        self.scale = params["scale"]
+
+    def scores(self, codes, query):
+        return dot_rows(codes, query * self.scale)
+
+
+def kmeans(points: np.ndarray, k: int, iterations: int, rng) -> np.ndarray:
+    """
+    Euclidean k-means; returns the (k, dim) centroids.
+    """
+    centroids = points[rng.choice(len(points), k, replace=len(points) < k)].copy()
+    for _ in range(iterations):
+        assignment = nearest(points, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        counts = np.bincount(assignment, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin ||p - c||^2 = argmin ||c||^2 - 2 p.c
+    return np.argmin((centroids ** 2).sum(axis=1) - 2 * points @ centroids.T, axis=1)
+
+
+class ProductQuantizer(Quantizer):
+    """
+    Product quantization: each vector is split into `subspaces` slices and
+    every slice is replaced by the index of its nearest of 256 centroids,
+    so a vector costs `subspaces` bytes. A query is scored against all
+    codes with one (subspaces x 256) lookup table (asymmetric distance).
+
+    PQ scores are coarse; the retriever re-ranks the best candidates with
+    the exact vectors.
+    """
+
+    name = "pq"
+
+    def __init__(self, subspaces: int = 64, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.sample_size = sample_size
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    def encode(self, matrix):
+        n, dim = matrix.shape
+        if dim % self.subspaces:
+            raise ValueError(f"PQ subspaces ({self.subspaces}) must divide the dimension ({dim})")
+        width = dim // self.subspaces
+        rng = np.random.default_rng(self.seed)
+        sample = matrix[np.sort(rng.choice(n, min(n, self.sample_size), replace=False))].astype(np.float32)
+        k = min(256, len(sample))
+        self.codebooks = np.stack([
+            kmeans(sample[:, j * width:(j + 1) * width], k, self.iterations, rng)
+            for j in range(self.subspaces)
+        ])
+
+        codes = np.empty((n, self.subspaces), dtype=np.uint8)
+        for start, block in _blocks(matrix):
+            for j in range(self.subspaces):
+                codes[start:start + len(block), j] = nearest(block[:, j * width:(j + 1) * width], self.codebooks[j])
+        return codes
+
+    def params(self):
+        return {"codebooks": self.codebooks}
+
+    def load(self, params):
+        self.codebooks = params["codebooks"]
+
+    def scores(self, codes, query):
+        # table[j, c] = query slice j . centroid c of subspace j
+        table = np.einsum("jcw,jw->jc", self.codebooks, query.reshape(self.subspaces, -1))
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.subspaces):
+            scores += table[j][codes[:, j]]
+        return scores
+
+
+def create_quantizer(name: str, pq_subspaces: int = 64) -> Optional[Quantizer]:
+    if name == "none":
+        return None
+    if name == "float16":
+        return Float16Quantizer()
+    if name == "int8":
+        return Int8Quantizer()
+    if name == "pq":
+        return ProductQuantizer(pq_subspaces)
+    raise ValueError(f"Unknown quantization: {name}")
@@ -0,0 +1,116 @@
+import asyncio
+import dataclasses
+import time
+from typing import List, Sequence
+
+from .base import SearchResult
+from .terms import tokenize
+
+
+class Scorer:
+    """
+    Relevance of texts to a query, higher is better. `score()` gets one
+    batch at a time and runs on a worker thread.
+    """
+
+    def score(self, query: str, texts: Sequence[str]) -> List[float]:
+        raise NotImplementedError
+
+
+class LexicalOverlapScorer(Scorer):
+    """
+    Share of the query's BM25 terms found in each text, with whole
+    identifiers (e.g. "s3:getobject") counting double. Cheap enough to run
+    on every request on CPU.
+    """
+
+    def score(self, query, texts):
+        terms = set(tokenize(query))
+        if not terms:
+            return [0.0] * len(texts)
+        weights = {term: 2.0 if any(c in term for c in "._:/-") else 1.0 for term in terms}
+        total = sum(weights.values())
+        scores = []
+        for text in texts:
+            found = terms.intersection(tokenize(text))
+            scores.append(sum(weights[term] for term in found) / total)
+        return scores
+
+
+class CrossEncoderScorer(Scorer):
+    """
+    A local cross-encoder from sentence-transformers, which reads the
+    question and each chunk together. Requires the `sentence-transformers`
+    package.
+    """
+
+    def __init__(self, model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise RuntimeError("RERANK_SCORER = 'cross-encoder' requires the sentence-transformers package")
+        self.model = CrossEncoder(model)
+
+    def score(self, query, texts):
+        return [float(s) for s in self.model.predict([(query, text) for text in texts])]
+
+
+class RerankStats:
+    def __init__(self):
+        self.reranked = 0
+        self.skipped = 0
+
+    def as_dict(self):
+        return {"reranked": self.reranked, "skipped": self.skipped}
+
+
+class Reranker:
+    """
+    Re-order retrieved chunks by a Scorer, scoring `batch_size` chunks per
+    call.
+
+    Re-ranking is best effort: if scoring hasn't finished within
+    `budget_ms`, the remaining batches are skipped and the retrieval order
+    is kept, so a slow scorer can't hold up the answer by more than about
+    one batch.
+    """
+
+    def __init__(self, scorer: Scorer, batch_size: int = 16, budget_ms: float = 50.0):
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self.stats = RerankStats()
+
+    async def rerank(self, query: str, results: Sequence[SearchResult], k: int) -> List[SearchResult]:
+        if len(results) <= 1:
+            return list(results)[:k]
+        start = time.perf_counter()
+        scores: List[float] = []
+        for i in range(0, len(results), self.batch_size):
+            if time.perf_counter() - start > self.budget:
+                self.stats.skipped += 1
+                return list(results)[:k]
+            batch = [r.content for r in results[i:i + self.batch_size]]
+            scores.extend(await asyncio.to_thread(self.scorer.score, query, batch))
+        if time.perf_counter() - start > self.budget:
+            self.stats.skipped += 1
+            return list(results)[:k]
+        self.stats.reranked += 1
+        # Stable sort: ties keep their retrieval order
+        order = sorted(range(len(results)), key=lambda i: -scores[i])
+        return [dataclasses.replace(results[i], score=scores[i]) for i in order[:k]]
+
+
+def create_reranker(settings):
+    """
+    Build the re-rank stage described by settings, or None if disabled.
+    """
+    if not settings.RERANK_ENABLED:
+        return None
+    if settings.RERANK_SCORER == "lexical":
+        scorer = LexicalOverlapScorer()
+    elif settings.RERANK_SCORER == "cross-encoder":
+        scorer = CrossEncoderScorer(settings.RERANK_MODEL)
+    else:
+        raise ValueError(f"Unknown RERANK_SCORER: {settings.RERANK_SCORER}")
+    return Reranker(scorer, batch_size=settings.RERANK_BATCH_SIZE, budget_ms=settings.RERANK_BUDGET_MS)
@@ -0,0 +1,236 @@
+# BM25 inverted index over documentation chunks, for exact identifiers
+# (API names, error codes, CLI flags) that embeddings retrieve poorly.
+#
+# Layout (little-endian, sections 8-byte aligned):
+#
+#     header        magic, version, counts and section offsets
+#     vocabulary    sorted terms, newline-separated UTF-8
+#     term offsets  terms + 1 uint64 offsets into the postings arrays
+#     idf           terms float32
+#     doc ids       postings uint32 document numbers, grouped by term
+#     impacts       postings float32 BM25 term weights (tf and length norm)
+#     doc offsets   documents + 1 uint64 byte offsets into the metadata blob
+#     metadata      one UTF-8 JSON object per document, back to back
+#
+# Scoring a query is a gather and a sum over the postings of its terms; the
+# arrays are memory-mapped like the embedding store.
+#
+# The ingestion job writes this file with --sparse-index, using
+# SparseIndexBuilder from this module. For the "memory" backend an index can
+# also be built from the embedding store:
+#
+#     python -m app.retrieval.sparse --store index.emb --out index.bm25
+
+import argparse
+import collections
+import json
+import mmap
+import os
+import shutil
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .base import SearchResult
+from .ivf import top_k
+from .store import StoreDocuments, file_version
+from .terms import tokenize
+
+MAGIC = b"AWSBM25\0"
+VERSION = 1
+# magic, version, documents, terms, postings, then the offsets of the
+# vocabulary, term offsets, idf, posting doc ids, posting impacts, document
+# offsets and metadata sections, and the metadata size
+HEADER = struct.Struct("<8sIIIQQQQQQQQQ")
+
+
+def _pad(f, align=8):
+    f.write(b"\0" * (-f.tell() % align))
+    return f.tell()
+
+
+class SparseIndexBuilder:
+    """
+    Accumulate documents and write them as a sparse index file.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self.lengths: List[int] = []
+        self.offsets = [0]
+        self.metadata = open(path + ".meta.tmp", "w+b")
+
+    def add(self, document: Dict[str, Any], text: str):
+        doc = len(self.lengths)
+        counts = collections.Counter(tokenize(text))
+        for term, tf in counts.items():
+            docs, tfs = self.postings.setdefault(term, ([], []))
+            docs.append(doc)
+            tfs.append(tf)
+        self.lengths.append(sum(counts.values()))
+        self.metadata.write(json.dumps(document, ensure_ascii=False).encode("utf-8"))
+        self.offsets.append(self.metadata.tell())
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def close(self):
+        n = len(self.lengths)
+        lengths = np.asarray(self.lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if n and lengths.sum() else 1.0
+        terms = sorted(self.postings)
+        term_offsets = np.zeros(len(terms) + 1, dtype="<u8")
+        idf = np.empty(len(terms), dtype="<f4")
+        doc_ids, impacts = [], []
+        for i, term in enumerate(terms):
+            docs, tfs = self.postings[term]
+            docs = np.asarray(docs, dtype="<u4")
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf[i] = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[docs] / avgdl)
+            doc_ids.append(docs)
+            impacts.append((tfs * (self.k1 + 1) / (tfs + norm)).astype("<f4"))
+            term_offsets[i + 1] = term_offsets[i] + len(docs)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype="<u4")
+        impacts = np.concatenate(impacts) if impacts else np.empty(0, dtype="<f4")
+
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(b"\0" * HEADER.size)
+            sections = []
+            for blob in ("\n".join(terms).encode("utf-8"), term_offsets, idf, doc_ids, impacts,
+                         np.asarray(self.offsets, dtype="<u8")):
+                sections.append(_pad(f))
+                f.write(blob if isinstance(blob, bytes) else blob.tobytes())
+            metadata_offset = _pad(f)
+            self.metadata.seek(0)
+            shutil.copyfileobj(self.metadata, f)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, n, len(terms), len(doc_ids),
+                                *sections, metadata_offset, self.offsets[-1]))
+            f.flush()
+            os.fsync(f.fileno())
+        self.metadata.close()
+        os.remove(self.path + ".meta.tmp")
+        os.replace(self.path + ".tmp", self.path)
+
+
+class SparseIndex:
+    """
+    A sparse index file opened with mmap. Only the vocabulary is decoded
+    up front (into a term -> number dict); postings and documents are read
+    from the mapping on demand.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = file_version(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            self._mmap.close()
+            raise ValueError(f"{path} is truncated")
+        (magic, version, docs, terms, postings, vocabulary_offset, term_offsets_offset, idf_offset,
+         doc_ids_offset, impacts_offset, doc_offsets_offset, metadata_offset, _) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a sparse index (version {VERSION})")
+
+        vocabulary = self._mmap[vocabulary_offset:term_offsets_offset].rstrip(b"\0").decode("utf-8")
+        self.terms = {term: i for i, term in enumerate(vocabulary.split("\n"))} if terms else {}
+        self.term_offsets = np.frombuffer(self._mmap, "<u8", terms + 1, term_offsets_offset)
+        self.idf = np.frombuffer(self._mmap, "<f4", terms, idf_offset)
+        self.doc_ids = np.frombuffer(self._mmap, "<u4", postings, doc_ids_offset)
+        self.impacts = np.frombuffer(self._mmap, "<f4", postings, impacts_offset)
+        offsets = np.frombuffer(self._mmap, "<u8", docs + 1, doc_offsets_offset)
+        self.documents = StoreDocuments(self._mmap, offsets, metadata_offset)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def changed(self) -> bool:
+        version = file_version(self.path)
+        return version is not None and version != self.version
+
+    def scores(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 scores of every document matching a query term, as (document
+        numbers, scores).
+        """
+        counts = collections.Counter(term for term in tokenize(text) if term in self.terms)
+        if not counts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        docs, weights = [], []
+        for term, repeats in counts.items():
+            i = self.terms[term]
+            start, end = int(self.term_offsets[i]), int(self.term_offsets[i + 1])
+            docs.append(self.doc_ids[start:end])
+            weights.append(self.impacts[start:end] * (self.idf[i] * repeats))
+        if len(docs) == 1:
+            return docs[0].astype(np.int64), weights[0]
+        docs, weights = np.concatenate(docs), np.concatenate(weights)
+        if len(docs) * 8 < len(self):
+            # Few postings: sum per unique document
+            docs, inverse = np.unique(docs, return_inverse=True)
+            return docs.astype(np.int64), np.bincount(inverse, weights).astype(np.float32)
+        # Common terms: a dense accumulator is linear instead of a sort
+        totals = np.bincount(docs, weights, minlength=len(self))
+        docs = np.flatnonzero(totals)
+        return docs, totals[docs].astype(np.float32)
+
+    def search_sync(self, text: str, k: int = 5) -> List[SearchResult]:
+        docs, scores = self.scores(text)
+        return [self.result(docs[i], scores[i]) for i in top_k(scores, k)]
+
+    def result(self, row: int, score: float) -> SearchResult:
+        doc = self.documents[int(row)]
+        return SearchResult(
+            id=doc.get("chunk_id") or doc.get("id") or str(row),
+            score=float(score),
+            content=doc.get("content") or "",
+            title=doc.get("title") or "",
+            url=doc.get("url") or "",
+            section=doc.get("section") or "",
+            metadata=doc,
+        )
+
+    def close(self):
+        self.term_offsets = self.idf = self.doc_ids = self.impacts = self.documents = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+def build_from_store(store_path: str, path: str) -> int:
+    """
+    Write a sparse index over the documents of an embedding store.
+    """
+    from .store import EmbeddingStore
+
+    store = EmbeddingStore(store_path)
+    builder = SparseIndexBuilder(path)
+    try:
+        for i in range(len(store)):
+            document = store.documents[i]
+            builder.add(document, document.get("content") or "")
+        builder.close()
+    finally:
+        store.close()
+    return len(builder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a BM25 index from an embedding store.")
+    parser.add_argument("--store", default="index.emb")
+    parser.add_argument("--out", default="index.bm25")
+    args = parser.parse_args()
+    rows = build_from_store(args.store, args.out)
+    print(f"Indexed {rows} documents to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
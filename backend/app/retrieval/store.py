@@ -0,0 +1,359 @@
+# On-disk embedding store that the retriever memory-maps.
+#
+# Layout (little-endian, sections 64-byte aligned):
+#
+#     header       magic, version, dtype, rows, dim and section offsets
+#     matrix       rows x dim unit-normalized vectors (float32 or float16)
+#     offsets      rows + 1 uint64 byte offsets into the metadata blob
+#     metadata     one UTF-8 JSON object per row, back to back
+#     arrays       optional search structures (IVF lists, quantization
+#                  codes), each section aligned
+#     manifest     JSON naming the options they were built with and the
+#                  dtype, shape and offset of each array
+#
+# Opening a store maps the file read-only: nothing is parsed up front, the
+# OS pages the matrix in as it is scanned, and every worker process that maps
+# the same file shares those pages through the page cache. Document metadata
+# is only decoded for the rows a query returns.
+#
+# The IVF index and quantization codes are trained once, when the store is
+# written, and mapped like the matrix when it is opened, instead of every
+# worker building a private copy at startup.
+#
+# Build one from the Weaviate collection with:
+#
+#     python -m app.retrieval.store --weaviate-url http://localhost:8080 --out index.emb \
+#         --ivf-lists 512 --quantization int8
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from .ivf import IVFIndex
+from .quantization import Quantizer, create_quantizer
+
+MAGIC = b"AWSEMB1\0"
+VERSION = 2
+# magic, version, dtype code, rows, dim, reserved, matrix offset, offsets
+# table offset, metadata offset, metadata size, manifest offset, manifest size
+HEADER = struct.Struct("<8sIIQIIQQQQQQ")
+# Version 1 stores have no arrays or manifest
+HEADER_V1 = struct.Struct("<8sIIQIIQQQQ")
+ALIGN = 64
+DTYPES = {0: np.float32, 1: np.float16}
+DTYPE_CODES = {np.dtype(dtype): code for code, dtype in DTYPES.items()}
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % ALIGN))
+    return f.tell()
+
+
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Identity of the file at `path` (inode, mtime, size), or None if it is
+    missing. Rebuilding a store renames a new file into place, which
+    changes it.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class StoreWriter:
+    """
+    Stream embeddings and their documents into a new store file.
+
+    Rows are written as they are added, so the corpus never has to fit in
+    memory. The file is assembled under a temporary name and renamed into
+    place by `close()`; workers that still map the previous file keep
+    reading it until they reopen.
+
+    With `ivf_lists` or `quantization` set, `close()` also clusters the
+    written rows into an IVF index (see app.retrieval.ivf) or encodes them
+    (see app.retrieval.quantization) and stores the result.
+    """
+
+    def __init__(self, path: str, dim: int, dtype: str = "float32", ivf_lists: int = 0,
+                 quantization: str = "none", pq_subspaces: int = 64):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in DTYPE_CODES:
+            raise ValueError(f"Unsupported store dtype: {dtype}")
+        # Fail before any rows are written
+        create_quantizer(quantization, pq_subspaces)
+        self.ivf_lists = ivf_lists
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        self.rows = 0
+        self.offsets = [0]
+        self.file = open(path + ".tmp", "wb")
+        self.file.write(b"\0" * HEADER.size)
+        self.matrix_offset = _pad(self.file)
+        self.metadata = open(path + ".meta.tmp", "w+b")
+
+    def add(self, embeddings, documents: Sequence[Dict[str, Any]]):
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(matrix) != len(documents):
+            raise ValueError(f"{len(matrix)} embeddings for {len(documents)} documents")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.file.write((matrix / norms).astype(self.dtype).tobytes())
+        for document in documents:
+            self.metadata.write(json.dumps(document, ensure_ascii=False).encode("utf-8"))
+            self.offsets.append(self.metadata.tell())
+        self.rows += len(matrix)
+
+    def build_arrays(self) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """
+        Options and arrays to store after the metadata, built from the rows
+        already written to the temporary file.
+        """
+        options: Dict[str, Any] = {}
+        arrays: Dict[str, np.ndarray] = {}
+        if not self.rows or (not self.ivf_lists and self.quantization == "none"):
+            return options, arrays
+        self.file.flush()
+        matrix = np.memmap(self.path + ".tmp", self.dtype, "r", self.matrix_offset, (self.rows, self.dim))
+        if self.ivf_lists:
+            index = IVFIndex.build(matrix, self.ivf_lists)
+            arrays["ivf.centroids"] = index.centroids
+            arrays["ivf.rows"] = index.rows
+            arrays["ivf.offsets"] = index.offsets
+            options["ivf_lists"] = self.ivf_lists
+        if self.quantization != "none":
+            quantizer = create_quantizer(self.quantization, self.pq_subspaces)
+            arrays["quantization.codes"] = quantizer.encode(matrix)
+            for name, value in quantizer.params().items():
+                arrays[f"quantization.{name}"] = value
+            options["quantization"] = self.quantization
+            if self.quantization == "pq":
+                options["pq_subspaces"] = self.pq_subspaces
+        del matrix
+        return options, arrays
+
+    def close(self):
+        offsets_offset = _pad(self.file)
+        self.file.write(np.asarray(self.offsets, dtype="<u8").tobytes())
+        metadata_offset = _pad(self.file)
+        self.metadata.seek(0)
+        shutil.copyfileobj(self.metadata, self.file)
+        self.metadata.close()
+        os.remove(self.path + ".meta.tmp")
+
+        options, arrays = self.build_arrays()
+        manifest = {"options": options, "arrays": {}}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            manifest["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape),
+                                        "offset": _pad(self.file)}
+            self.file.write(array.tobytes())
+        manifest_offset = self.file.tell()
+        manifest_bytes = json.dumps(manifest).encode("utf-8")
+        self.file.write(manifest_bytes)
+
+        self.file.seek(0)
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, DTYPE_CODES[self.dtype], self.rows, self.dim, 0,
+            self.matrix_offset, offsets_offset, metadata_offset, self.offsets[-1],
+            manifest_offset, len(manifest_bytes),
+        ))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.path + ".tmp", self.path)
+
+
+def write_store(path: str, embeddings, documents: Sequence[Dict[str, Any]], dtype: str = "float32",
+                **options):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    writer = StoreWriter(path, embeddings.shape[1], dtype, **options)
+    writer.add(embeddings, documents)
+    writer.close()
+
+
+class StoreDocuments:
+    """
+    Read-only sequence of a store's documents, decoded on access.
+    """
+
+    def __init__(self, buffer, offsets: np.ndarray, base: int):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.base = base
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        start, end = self.base + int(self.offsets[row]), self.base + int(self.offsets[row + 1])
+        return json.loads(self.buffer[start:end].decode("utf-8"))
+
+
+class EmbeddingStore:
+    """
+    A store file opened with mmap. `matrix` is a read-only NumPy view of
+    the vectors, `documents` decodes metadata lazily and `arrays` holds
+    read-only views of the stored search structures, described by
+    `options`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = file_version(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # A file cut short (e.g. still being written) has no complete header
+        size = len(self._mmap)
+        magic, version = HEADER_V1.unpack_from(self._mmap)[:2] if size >= HEADER_V1.size else (None, None)
+        if magic != MAGIC or version not in (1, VERSION) or (version == VERSION and size < HEADER.size):
+            self._mmap.close()
+            raise ValueError(f"{path} is not an embedding store (version {VERSION})")
+        if version == 1:
+            (_, _, dtype, rows, dim, _, matrix_offset, offsets_offset,
+             metadata_offset, _) = HEADER_V1.unpack_from(self._mmap)
+            manifest_offset = manifest_size = 0
+        else:
+            (_, _, dtype, rows, dim, _, matrix_offset, offsets_offset,
+             metadata_offset, _, manifest_offset, manifest_size) = HEADER.unpack_from(self._mmap)
+        if hasattr(mmap, "MADV_WILLNEED"):
+            # Start reading the file in the background; opening doesn't wait
+            self._mmap.madvise(mmap.MADV_WILLNEED)
+
+        self.dtype = np.dtype(DTYPES[dtype])
+        self.matrix = np.frombuffer(self._mmap, self.dtype, rows * dim, matrix_offset).reshape(rows, dim)
+        offsets = np.frombuffer(self._mmap, "<u8", rows + 1, offsets_offset)
+        self.documents = StoreDocuments(self._mmap, offsets, metadata_offset)
+
+        self.options: Dict[str, Any] = {}
+        self.arrays: Dict[str, np.ndarray] = {}
+        if manifest_size:
+            manifest = json.loads(self._mmap[manifest_offset:manifest_offset + manifest_size].decode("utf-8"))
+            self.options = manifest["options"]
+            for name, spec in manifest["arrays"].items():
+                shape = tuple(spec["shape"])
+                self.arrays[name] = np.frombuffer(
+                    self._mmap, np.dtype(spec["dtype"]), int(np.prod(shape)), spec["offset"]).reshape(shape)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def changed(self) -> bool:
+        """
+        Whether another file has replaced the mapped one at `path`.
+        """
+        version = file_version(self.path)
+        return version is not None and version != self.version
+
+    def ivf_index(self, ivf_lists: int, n_probe: int = 8) -> Optional[IVFIndex]:
+        """
+        The stored IVF index if the store was clustered into `ivf_lists`
+        lists, else None.
+        """
+        if not ivf_lists or self.options.get("ivf_lists") != ivf_lists:
+            return None
+        return IVFIndex(self.arrays["ivf.centroids"], self.arrays["ivf.rows"], self.arrays["ivf.offsets"], n_probe)
+
+    def quantized(self, quantization: str, pq_subspaces: int = 64) -> Tuple[Optional[Quantizer], Optional[np.ndarray]]:
+        """
+        The stored quantizer and codes if the store was written with the
+        same settings, else (None, None).
+        """
+        if quantization == "none" or self.options.get("quantization") != quantization:
+            return None, None
+        if quantization == "pq" and self.options.get("pq_subspaces") != pq_subspaces:
+            return None, None
+        quantizer = create_quantizer(quantization, pq_subspaces)
+        prefix = "quantization."
+        quantizer.load({name[len(prefix):]: array for name, array in self.arrays.items()
+                        if name.startswith(prefix) and name != "quantization.codes"})
+        return quantizer, self.arrays["quantization.codes"]
+
+    def close(self):
+        self.matrix = self.documents = None
+        self.arrays = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays derived from the matrix are still alive; the mapping is
+            # released once they are garbage collected
+            pass
+
+
+def iter_weaviate_objects(url: str, class_name: str, page_size: int = 500) -> Iterable[Dict[str, Any]]:
+    """
+    Page through every object of a Weaviate class, with vectors, using the
+    cursor API.
+    """
+    after: Optional[str] = None
+    with httpx.Client(base_url=url, timeout=60) as client:
+        while True:
+            params = {"class": class_name, "include": "vector", "limit": page_size}
+            if after:
+                params["after"] = after
+            response = client.get("/v1/objects", params=params)
+            response.raise_for_status()
+            objects = response.json().get("objects") or []
+            if not objects:
+                return
+            yield from objects
+            after = objects[-1]["id"]
+
+
+def build_from_weaviate(url: str, path: str, class_name: str = "AWSDocument", dtype: str = "float32",
+                        batch_size: int = 1000, **options) -> int:
+    """
+    Write every object of `class_name` to a store at `path`. `options` are
+    passed to StoreWriter. Returns the number of rows written.
+    """
+    writer = None
+    vectors, documents = [], []
+    for obj in iter_weaviate_objects(url, class_name):
+        if not obj.get("vector"):
+            continue
+        if writer is None:
+            writer = StoreWriter(path, len(obj["vector"]), dtype, **options)
+        vectors.append(obj["vector"])
+        documents.append(obj.get("properties") or {})
+        if len(vectors) >= batch_size:
+            writer.add(vectors, documents)
+            vectors, documents = [], []
+    if writer is None:
+        raise RuntimeError(f"No {class_name} objects with vectors in {url}")
+    if vectors:
+        writer.add(vectors, documents)
+    writer.close()
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a memory-mapped embedding store from Weaviate.")
+    parser.add_argument("--weaviate-url", default=os.getenv("VECTOR_DB_URL", "http://localhost:8080"))
+    parser.add_argument("--class-name", default="AWSDocument")
+    parser.add_argument("--out", default="index.emb")
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    # Defaults match the backend's settings so the server finds the index
+    parser.add_argument("--ivf-lists", type=int, default=int(os.getenv("RETRIEVER_IVF_LISTS", "0")))
+    parser.add_argument("--quantization", choices=["none", "float16", "int8", "pq"],
+                        default=os.getenv("RETRIEVER_QUANTIZATION", "none"))
+    parser.add_argument("--pq-subspaces", type=int, default=int(os.getenv("RETRIEVER_PQ_SUBSPACES", "64")))
+    args = parser.parse_args()
+    rows = build_from_weaviate(args.weaviate_url, args.out, args.class_name, args.dtype,
+                               ivf_lists=args.ivf_lists, quantization=args.quantization, pq_subspaces=args.pq_subspaces)
+    print(f"Wrote {rows} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import re
+from typing import List
+
+# Kept apart from sparse.py (and its numpy import) since the re-rank and
+# prompt stages tokenize on every request without needing the index.
+TOKEN = re.compile(r"[a-z0-9]+(?:[._:/-][a-z0-9]+)*")
+TOKEN_PART = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it its of on or "
+    "that the this to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased BM25 terms of `text`, without stopwords. Identifiers such as
+    "s3:GetObject" are kept whole and their parts are added as well.
+    """
+    terms = []
+    for token in TOKEN.findall((text or "").lower()):
+        parts = TOKEN_PART.findall(token)
+        if len(parts) > 1:
+            terms.append(token)
+        terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
@@ -0,0 +1,52 @@
+import json
+from typing import List, Optional
+
+import httpx
+
+from .base import Retriever, SearchResult
+
+FIELDS = ("title", "content", "url", "section", "chunk_id")
+
+
+class WeaviateRetriever(Retriever):
+    """
+    nearVector search against the Weaviate collection written by the
+    scraper and ingestion job, over Weaviate's GraphQL API with a pooled
+    async HTTP client.
+    """
+
+    def __init__(self, url: str, class_name: str = "AWSDocument", timeout: float = 5.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.class_name = class_name
+        self.http = httpx.AsyncClient(base_url=url, timeout=timeout, transport=transport)
+
+    def query(self, embedding, k):
+        return (
+            f"{{ Get {{ {self.class_name}("
+            f"nearVector: {{vector: {json.dumps([float(x) for x in embedding])}}}, limit: {int(k)}"
+            f") {{ {' '.join(FIELDS)} _additional {{ id distance }} }} }} }}"
+        )
+
+    async def search(self, embedding, k=5, text="") -> List[SearchResult]:
+        response = await self.http.post("/v1/graphql", json={"query": self.query(embedding, k)})
+        response.raise_for_status()
+        body = response.json()
+        if body.get("errors"):
+            raise RuntimeError(f"Weaviate query failed: {body['errors']}")
+        results = []
+        for obj in body["data"]["Get"][self.class_name] or []:
+            extra = obj.get("_additional") or {}
+            results.append(SearchResult(
+                id=obj.get("chunk_id") or extra.get("id"),
+                # Weaviate returns cosine distance
+                score=1.0 - float(extra.get("distance") or 0.0),
+                content=obj.get("content") or "",
+                title=obj.get("title") or "",
+                url=obj.get("url") or "",
+                section=obj.get("section") or "",
+                metadata=obj,
+            ))
+        return results
+
+    async def close(self):
+        await self.http.aclose()
@@ -1,15 +1,75 @@
+import json
+from typing import Optional
+
+import anyio
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from ..services.llm_service import get_answer
+from ..services.llm_client import LLMError, LLMTimeout
+from ..services.llm_service import get_answer, get_answer_cache, single_flight, stream_answer
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     question: str
+    # Ties follow-up questions to the earlier turns of a conversation
+    session_id: Optional[str] = None
 
 @router.post("/chat")
 async def chat_endpoint(chat_request: ChatRequest):
-    answer = get_answer(chat_request.question)
+    try:
+        answer = await get_answer(chat_request.question, chat_request.session_id)
+    except LLMTimeout:
+        raise HTTPException(status_code=504, detail="LLM request timed out")
+    except LLMError:
+        raise HTTPException(status_code=502, detail="LLM request failed")
     if not answer:
         raise HTTPException(status_code=404, detail="Answer not found")
     return {"response": answer}
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def sse_answer(question: str, session_id: Optional[str] = None):
+    """
+    Server-Sent Events for a streamed answer: one `data: {"token": ...}`
+    event per token, then `event: done` (or `event: error`).
+
+    If the client disconnects, Starlette cancels this generator and the
+    `finally` closes the upstream LLM stream with it.
+    """
+    tokens = stream_answer(question, session_id)
+    try:
+        async for token in tokens:
+            yield sse_event({"token": token})
+        yield sse_event({}, event="done")
+    except LLMTimeout:
+        yield sse_event({"detail": "LLM request timed out"}, event="error")
+    except LLMError:
+        yield sse_event({"detail": "LLM request failed"}, event="error")
+    finally:
+        # Shielded: on disconnect we are already cancelled, but the upstream
+        # response still has to be closed
+        with anyio.CancelScope(shield=True):
+            await tokens.aclose()
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(chat_request: ChatRequest):
+    return StreamingResponse(
+        sse_answer(chat_request.question, chat_request.session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/chat/cache/stats")
+async def cache_stats_endpoint():
+    cache = get_answer_cache()
+    coalesced = {"coalesced_requests": single_flight.stats.coalesced}
+    if cache is None:
+        return {"enabled": False, **coalesced}
+    return {"enabled": True, "semantic_entries": len(cache.index), **cache.stats.as_dict(), **coalesced}
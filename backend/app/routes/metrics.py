@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+
+from ..utils.metrics import render
+
+router = APIRouter()
+
+
+# Plain def: in multi-worker mode rendering reads every worker's metric
+# files, so it runs in the thread pool rather than on the event loop
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,104 @@
+# Production server: uvicorn's process manager running one worker per
+# available CPU, each with its own event loop and copy of the app. With
+# HISTORY_BACKEND = "memory" each worker would keep its own conversations,
+# so the server runs a single worker unless history is shared. Workers
+# that die are restarted; on SIGTERM the server stops accepting
+# connections, gives in-flight requests SERVER_GRACEFUL_TIMEOUT seconds and
+# runs each worker's shutdown. Workers share Prometheus metrics through
+# files in PROMETHEUS_MULTIPROC_DIR, a fresh temporary directory unless set.
+#
+#     python main.py
+#
+# The same app runs under gunicorn's process manager with
+#
+#     gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4 --graceful-timeout 30
+
+import glob
+import math
+import os
+import tempfile
+
+import uvicorn
+
+from .utils.config import settings
+
+
+def cpu_count() -> int:
+    """
+    CPUs this process may use: its CPU affinity, capped by a cgroup CPU
+    quota if one is set (a Kubernetes CPU limit), since os.cpu_count()
+    reports the whole node.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, math.ceil(quota)))
+    return count
+
+
+def cgroup_cpu_quota():
+    """
+    CPUs' worth of time allowed by the cgroup, or None if unlimited.
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+
+def prepare_metrics_dir():
+    """
+    Point the workers' metrics at an empty PROMETHEUS_MULTIPROC_DIR. Must
+    run before the workers start (and import prometheus_client).
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+        return
+    os.makedirs(path, exist_ok=True)
+    # Samples of a previous run would be added to this one's
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def worker_count() -> int:
+    """
+    Worker processes to start: SERVER_WORKERS, or one per CPU if it is 0.
+    In-memory history is per process, so it allows a single worker only.
+    """
+    if settings.HISTORY_BACKEND != "memory":
+        return settings.SERVER_WORKERS or cpu_count()
+    if settings.SERVER_WORKERS > 1:
+        raise RuntimeError(
+            f"SERVER_WORKERS = {settings.SERVER_WORKERS} with HISTORY_BACKEND = 'memory' would lose "
+            "follow-up context between workers; use HISTORY_BACKEND = 'postgres' or a single worker")
+    return 1
+
+
+def serve():
+    workers = worker_count()
+    if workers > 1:
+        prepare_metrics_dir()
+    uvicorn.run(
+        "main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT,
+        timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+        proxy_headers=True,
+    )
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..utils.text import normalize_question
+
+
+class CacheBackend:
+    """
+    Storage for cached answers. Values are JSON-serializable dicts; entries
+    expire after `ttl` seconds.
+    """
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any], ttl: float):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InMemoryBackend(CacheBackend):
+    """
+    Per-process LRU dict with expiry, holding at most `max_entries` answers.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key, value, ttl):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisBackend(CacheBackend):
+    """
+    Answers shared by every worker and pod through Redis. Expiry uses Redis
+    TTLs and LRU eviction is left to the server's maxmemory-policy
+    (allkeys-lru). Requires the `redis` package.
+    """
+
+    def __init__(self, url: str, prefix: str = "answer-cache:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("ANSWER_CACHE_BACKEND = 'redis' requires the redis package")
+        self.redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key):
+        value = await self.redis.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value, ttl):
+        await self.redis.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def clear(self):
+        keys = [key async for key in self.redis.scan_iter(match=self.prefix + "*")]
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def close(self):
+        await self.redis.close()
+
+
+class SemanticIndex:
+    """
+    In-process index of question embeddings for near-duplicate lookup.
+
+    Unit-normalized embeddings live in one preallocated float32 matrix, so a
+    lookup is a single matrix-vector product. Each row points at an answer
+    key in the backend; rows are recycled least-recently-used first and
+    ignored once expired.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.matrix: Optional[np.ndarray] = None
+        self.expires = np.zeros(max_entries)
+        self.keys: List[Optional[str]] = [None] * max_entries
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+
+    def add(self, key: str, embedding: Sequence[float], ttl: float):
+        vector = np.asarray(embedding, dtype=np.float32)
+        if self.matrix is None:
+            self.matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        if key in self.slots:
+            slot = self.slots.pop(key)
+        elif len(self.slots) < self.max_entries:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+        norm = np.linalg.norm(vector)
+        self.matrix[slot] = vector / norm if norm else vector
+        self.expires[slot] = time.monotonic() + ttl
+        self.keys[slot] = key
+        self.slots[key] = slot
+
+    def search(self, embedding: Sequence[float], threshold: float):
+        """
+        Return (key, similarity) of the most similar live question with
+        cosine similarity >= `threshold`, or None.
+        """
+        if not self.slots:
+            return None
+        n = len(self.slots)
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        scores = self.matrix[:n] @ (query / norm)
+        scores[self.expires[:n] <= time.monotonic()] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        key = self.keys[best]
+        self.slots.move_to_end(key)
+        return key, float(scores[best])
+
+    def clear(self):
+        self.slots.clear()
+        self.keys = [None] * self.max_entries
+        self.expires[:] = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+
+class CacheStats:
+    def __init__(self):
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "seconds_saved": self.seconds_saved,
+        }
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache: exact match on the normalized question, then
+    semantic match on question embeddings above `similarity_threshold`.
+
+    Answers are stored in a pluggable backend together with how long they
+    took to generate, which is what a hit saves. The SemanticIndex of
+    question embeddings is always in-process: with a shared backend the
+    exact tier is shared between workers but the semantic tier only knows
+    the questions this worker cached. `invalidate()` drops every answer
+    and must be called whenever the document index is rebuilt (see
+    llm_service.check_index).
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 3600.0,
+                 similarity_threshold: float = 0.95, max_entries: int = 10000):
+        self.backend = backend
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.index = SemanticIndex(max_entries)
+        self.stats = CacheStats()
+
+    @staticmethod
+    def key(question: str) -> str:
+        return hashlib.sha256(normalize_question(question).encode()).hexdigest()
+
+    async def get_exact(self, question: str) -> Optional[str]:
+        entry = await self.backend.get(self.key(question))
+        if entry is None:
+            return None
+        self.stats.exact_hits += 1
+        self.stats.seconds_saved += entry["cost"]
+        return entry["answer"]
+
+    async def get_similar(self, embedding: Sequence[float]) -> Optional[str]:
+        match = self.index.search(embedding, self.similarity_threshold)
+        entry = await self.backend.get(match[0]) if match else None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.stats.semantic_hits += 1
+        self.stats.seconds_saved += entry["cost"]
+        return entry["answer"]
+
+    async def set(self, question: str, answer: str, embedding: Optional[Sequence[float]] = None,
+                  cost: float = 0.0):
+        key = self.key(question)
+        await self.backend.set(key, {"answer": answer, "cost": cost}, self.ttl)
+        if embedding is not None:
+            self.index.add(key, embedding, self.ttl)
+
+    async def invalidate(self):
+        self.index.clear()
+        await self.backend.clear()
+
+    async def close(self):
+        await self.backend.close()
+
+
+def create_answer_cache(settings) -> Optional[AnswerCache]:
+    """
+    Build the answer cache described by settings, or None if disabled.
+    """
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    if settings.ANSWER_CACHE_BACKEND == "redis":
+        backend = RedisBackend(settings.ANSWER_CACHE_REDIS_URL)
+    elif settings.ANSWER_CACHE_BACKEND == "memory":
+        backend = InMemoryBackend(settings.ANSWER_CACHE_MAX_ENTRIES)
+    else:
+        raise ValueError(f"Unknown ANSWER_CACHE_BACKEND: {settings.ANSWER_CACHE_BACKEND}")
+    return AnswerCache(
+        backend,
+        ttl=settings.ANSWER_CACHE_TTL,
+        similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    )
@@ -0,0 +1,85 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from ..utils.metrics import EMBEDDING_BATCH_SIZE
+
+
+class BatchStats:
+    def __init__(self):
+        self.requests = 0
+        self.batches = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+    def as_dict(self):
+        return {"requests": self.requests, "batches": self.batches, "mean_batch_size": self.mean_batch_size}
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batch concurrent embedding requests into one upstream call.
+
+    The first text to arrive opens a batch, which is sent once `max_wait`
+    seconds have passed or `max_batch` texts have joined, whichever comes
+    first. `max_wait` bounds the latency added to a lone request; larger
+    values trade that for fewer, bigger upstream calls. Identical texts in
+    a batch are embedded once.
+
+    `embed` is called with a list of texts and must return their
+    embeddings in order; its exceptions are raised to every caller in the
+    batch.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch: int = 64, max_wait: float = 0.005):
+        self.embed_batch = embed
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending: List[Tuple[str, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        # Keeps in-flight batches referenced until they finish
+        self.sending = set()
+        self.stats = BatchStats()
+
+    async def embed(self, text: str) -> List[float]:
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        """
+        Send the pending texts now.
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, batch):
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.stats.requests += len(batch)
+        self.stats.batches += 1
+        EMBEDDING_BATCH_SIZE.observe(len(batch))
+        try:
+            embeddings = await self.embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"{len(embeddings)} embeddings for {len(texts)} texts")
+            embeddings = dict(zip(texts, embeddings))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings[text])
@@ -0,0 +1,365 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..utils.tokens import message_tokens, messages_tokens
+
+logger = logging.getLogger(__name__)
+
+# (message id, {"role": ..., "content": ...})
+StoredMessage = Tuple[int, Dict[str, str]]
+
+
+class Session:
+    """
+    What a prompt needs of a conversation: a running summary of everything
+    up to message `summarized_upto`, and the messages after it. `count` is
+    how many messages after it the store holds, which can be more than
+    were loaded.
+    """
+
+    def __init__(self, summary: str = "", summarized_upto: int = 0,
+                 messages: Optional[List[StoredMessage]] = None, count: Optional[int] = None):
+        self.summary = summary
+        self.summarized_upto = summarized_upto
+        self.messages: List[StoredMessage] = messages or []
+        self.count = len(self.messages) if count is None else count
+        self.lock = asyncio.Lock()
+
+    def state(self) -> Tuple[int, int]:
+        return self.count, self.summarized_upto
+
+
+class HistoryStore:
+    """
+    Persistent conversation storage.
+    """
+
+    async def load(self, session_id: str, limit: int) -> Session:
+        """
+        The session's summary and at most `limit` newest unsummarized messages.
+        """
+        raise NotImplementedError
+
+    async def state(self, session_id: str) -> Tuple[int, int]:
+        """
+        (number of unsummarized messages, summarized_upto), to tell whether
+        a cached Session is still current. Messages are never edited or
+        deleted, so any append or summary changes it.
+        """
+        raise NotImplementedError
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]]) -> List[int]:
+        """
+        Store messages in order; returns their ids.
+        """
+        raise NotImplementedError
+
+    async def save_summary(self, session_id: str, summary: str, summarized_upto: int, previous_upto: int) -> bool:
+        """
+        Replace the summary, unless the stored one no longer ends at
+        `previous_upto` because another worker compacted the session first.
+        Returns whether it was saved.
+        """
+        raise NotImplementedError
+
+    async def open(self):
+        """
+        Connect ahead of the first request. Optional: stores connect on
+        first use otherwise.
+        """
+
+    async def close(self):
+        pass
+
+
+class InMemoryHistoryStore(HistoryStore):
+    """
+    Per-process store, for development and tests. Conversations are lost
+    on restart.
+    """
+
+    def __init__(self):
+        self.messages: Dict[str, List[StoredMessage]] = {}
+        self.summaries: Dict[str, Tuple[str, int]] = {}
+        self.next_id = 1
+
+    async def load(self, session_id, limit):
+        summary, upto = self.summaries.get(session_id, ("", 0))
+        messages = [m for m in self.messages.get(session_id, []) if m[0] > upto]
+        return Session(summary, upto, messages[-limit:], len(messages))
+
+    async def state(self, session_id):
+        upto = self.summaries.get(session_id, ("", 0))[1]
+        return sum(1 for m in self.messages.get(session_id, []) if m[0] > upto), upto
+
+    async def append(self, session_id, messages):
+        ids = list(range(self.next_id, self.next_id + len(messages)))
+        self.next_id += len(messages)
+        self.messages.setdefault(session_id, []).extend(zip(ids, messages))
+        return ids
+
+    async def save_summary(self, session_id, summary, summarized_upto, previous_upto):
+        if self.summaries.get(session_id, ("", 0))[1] != previous_upto:
+            return False
+        self.summaries[session_id] = (summary, summarized_upto)
+        return True
+
+
+class PostgresHistoryStore(HistoryStore):
+    """
+    Conversations in PostgreSQL through an asyncpg connection pool, created
+    (with its tables) on first use. Requires the `asyncpg` package.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id BIGSERIAL PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS chat_messages_session ON chat_messages (session_id, id);
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL DEFAULT '',
+            summarized_upto BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10):
+        try:
+            import asyncpg
+        except ImportError:
+            raise RuntimeError("HISTORY_BACKEND = 'postgres' requires the asyncpg package")
+        self.asyncpg = asyncpg
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = None
+        self._lock = asyncio.Lock()
+
+    async def get_pool(self):
+        async with self._lock:
+            if self.pool is None:
+                pool = await self.asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+                async with pool.acquire() as conn:
+                    await conn.execute(self.SCHEMA)
+                self.pool = pool
+        return self.pool
+
+    async def open(self):
+        await self.get_pool()
+
+    async def load(self, session_id, limit):
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT summary, summarized_upto FROM chat_sessions WHERE session_id = $1", session_id)
+            summary, upto = (row["summary"], row["summarized_upto"]) if row else ("", 0)
+            rows = await conn.fetch(
+                "SELECT id, role, content, count(*) OVER () AS total FROM chat_messages "
+                "WHERE session_id = $1 AND id > $2 ORDER BY id DESC LIMIT $3", session_id, upto, limit)
+        messages = [(r["id"], {"role": r["role"], "content": r["content"]}) for r in reversed(rows)]
+        return Session(summary, upto, messages, rows[0]["total"] if rows else 0)
+
+    async def state(self, session_id):
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "WITH s AS (SELECT COALESCE((SELECT summarized_upto FROM chat_sessions "
+                "WHERE session_id = $1), 0) AS upto) "
+                "SELECT s.upto, (SELECT count(*) FROM chat_messages "
+                "WHERE session_id = $1 AND id > s.upto) AS count FROM s", session_id)
+        return row["count"], row["upto"]
+
+    async def append(self, session_id, messages):
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "INSERT INTO chat_messages (session_id, role, content) "
+                "SELECT $1, m.role, m.content FROM unnest($2::text[], $3::text[]) "
+                "WITH ORDINALITY AS m(role, content, n) ORDER BY m.n RETURNING id",
+                session_id, [m["role"] for m in messages], [m["content"] for m in messages])
+        return sorted(r["id"] for r in rows)
+
+    async def save_summary(self, session_id, summary, summarized_upto, previous_upto):
+        pool = await self.get_pool()
+        async with pool.acquire() as conn:
+            saved = await conn.fetchval(
+                "INSERT INTO chat_sessions (session_id, summary, summarized_upto) VALUES ($1, $2, $3) "
+                "ON CONFLICT (session_id) DO UPDATE SET summary = EXCLUDED.summary, "
+                "summarized_upto = EXCLUDED.summarized_upto, updated_at = now() "
+                "WHERE chat_sessions.summarized_upto = $4 RETURNING true",
+                session_id, summary, summarized_upto, previous_upto)
+        return bool(saved)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+# summarize(previous summary, messages to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+class ConversationHistory:
+    """
+    Session history for prompts, bounded to `token_budget` tokens.
+
+    Recently active sessions are kept in an LRU hot cache of
+    `hot_sessions` entries, so a follow-up question only asks the store
+    for the session's state, and reloads it if another worker has added to
+    or compacted it since. `context()` returns the running summary plus the
+    newest turns that fit the budget; older turns beyond it are dropped
+    from the prompt right away, and once the unsummarized turns outgrow the
+    budget they are folded into the summary by `summarize` in the
+    background.
+
+    Store errors are logged, not raised: the question is then answered
+    without history, or its turn isn't recorded.
+    """
+
+    def __init__(self, store: HistoryStore, summarize: Optional[Summarizer] = None,
+                 token_budget: int = 1500, hot_sessions: int = 1000, load_limit: int = 100):
+        self.store = store
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.hot_sessions = hot_sessions
+        self.load_limit = load_limit
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # session id -> background compaction task
+        self.compacting: Dict[str, asyncio.Task] = {}
+
+    async def session(self, session_id: str) -> Session:
+        cached = self.sessions.get(session_id)
+        if cached is not None and await self.store.state(session_id) == cached.state():
+            self.sessions.move_to_end(session_id)
+            return cached
+        session = await self.store.load(session_id, self.load_limit)
+        # Another request may have reloaded it meanwhile
+        current = self.sessions.get(session_id)
+        if current is not None and current is not cached:
+            session = current
+        self.sessions[session_id] = session
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.hot_sessions:
+            self.sessions.popitem(last=False)
+        return session
+
+    async def context(self, session_id: str) -> List[Dict[str, str]]:
+        """
+        Messages to put between the system prompt and the new question.
+        """
+        try:
+            session = await self.session(session_id)
+        except Exception as e:
+            logger.warning(f"Could not load session {session_id}, answering without history: {e}")
+            return []
+        messages = []
+        budget = self.token_budget
+        if session.summary:
+            summary = {"role": "system", "content": f"Summary of the conversation so far: {session.summary}"}
+            messages.append(summary)
+            budget -= message_tokens(summary)
+        recent = []
+        for _, message in reversed(session.messages):
+            budget -= message_tokens(message)
+            if budget < 0:
+                break
+            recent.append(message)
+        return messages + recent[::-1]
+
+    async def record(self, session_id: str, question: str, answer: str):
+        """
+        Append a question and its answer to the session.
+        """
+        turn = [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        try:
+            session = await self.session(session_id)
+            ids = await self.store.append(session_id, turn)
+        except Exception as e:
+            logger.warning(f"Could not record a turn of session {session_id}: {e}")
+            return
+        session.messages.extend(zip(ids, turn))
+        session.count += len(ids)
+        if (self.summarize is not None and session_id not in self.compacting
+                and messages_tokens(m for _, m in session.messages) > self.token_budget):
+            task = asyncio.ensure_future(self.compact(session_id))
+            self.compacting[session_id] = task
+            task.add_done_callback(lambda _: self.compacting.pop(session_id, None))
+
+    async def compact(self, session_id: str):
+        """
+        Fold the oldest turns into the summary until the rest fit in half
+        the budget.
+
+        The session is revalidated first, so turns other workers appended
+        are folded too rather than skipped, and the summary is only saved
+        if no other worker compacted the session meanwhile.
+        """
+        try:
+            session = await self.session(session_id)
+        except Exception as e:
+            logger.warning(f"Could not summarize session {session_id}: {e}")
+            return
+        async with session.lock:
+            tokens = messages_tokens(m for _, m in session.messages)
+            cut = 0
+            while cut < len(session.messages) and tokens > self.token_budget // 2:
+                tokens -= message_tokens(session.messages[cut][1])
+                cut += 1
+            if not cut:
+                return
+            folded = session.messages[:cut]
+            try:
+                summary = await self.summarize(session.summary, [m for _, m in folded])
+                saved = await self.store.save_summary(session_id, summary, folded[-1][0],
+                                                      session.summarized_upto)
+            except Exception as e:
+                logger.warning(f"Could not summarize session {session_id}: {e}")
+                return
+            if not saved:
+                # The next request reloads the other worker's summary
+                return
+            session.summary = summary
+            session.summarized_upto = folded[-1][0]
+            session.count -= cut
+            del session.messages[:cut]
+
+    async def open(self):
+        await self.store.open()
+
+    async def close(self):
+        for task in list(self.compacting.values()):
+            task.cancel()
+        await self.store.close()
+
+
+def create_history(settings, summarize: Optional[Summarizer] = None) -> Optional[ConversationHistory]:
+    """
+    Build the conversation history described by settings, or None if
+    HISTORY_BACKEND is "none".
+    """
+    if settings.HISTORY_BACKEND == "none":
+        return None
+    if settings.HISTORY_BACKEND == "postgres":
+        store = PostgresHistoryStore(
+            settings.DATABASE_URL,
+            min_size=settings.HISTORY_DB_POOL_MIN_SIZE,
+            max_size=settings.HISTORY_DB_POOL_MAX_SIZE,
+        )
+    elif settings.HISTORY_BACKEND == "memory":
+        store = InMemoryHistoryStore()
+    else:
+        raise ValueError(f"Unknown HISTORY_BACKEND: {settings.HISTORY_BACKEND}")
+    return ConversationHistory(
+        store,
+        summarize=summarize,
+        token_budget=settings.HISTORY_TOKEN_BUDGET,
+        hot_sessions=settings.HISTORY_HOT_SESSIONS,
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from ..utils.metrics import UPSTREAM_ERRORS
+
+
+class LLMError(Exception):
+    """
+    The LLM upstream failed or returned an unusable response.
+    """
+
+
+class LLMTimeout(LLMError):
+    """
+    The LLM upstream did not answer within the request timeout.
+    """
+
+
+class LLMClient:
+    """
+    Async client for an OpenAI-compatible chat completions API.
+
+    Wraps one pooled httpx.AsyncClient so connections are reused across
+    requests, applies per-request timeouts, and caps the number of in-flight
+    upstream calls with a semaphore so a traffic spike queues here instead
+    of overwhelming the API (and our rate limit).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.openai.com/v1",
+        model: str = "gpt-3.5-turbo",
+        embedding_model: str = "text-embedding-ada-002",
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_concurrency: int = 32,
+        max_connections: int = 100,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.model = model
+        self.embedding_model = embedding_model
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+        )
+
+    async def chat(self, messages: List[Dict[str, str]], **params) -> str:
+        """
+        Return the assistant message for a chat completion request.
+        """
+        payload = {"model": self.model, "messages": messages, **params}
+        async with self.semaphore:
+            try:
+                response = await self.http.post("/chat/completions", json=payload)
+                response.raise_for_status()
+            except httpx.TimeoutException as e:
+                UPSTREAM_ERRORS.labels("llm", "chat", "timeout").inc()
+                raise LLMTimeout(f"LLM request timed out: {e!r}") from e
+            except httpx.HTTPError as e:
+                UPSTREAM_ERRORS.labels("llm", "chat", "error").inc()
+                raise LLMError(f"LLM request failed: {e!r}") from e
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            UPSTREAM_ERRORS.labels("llm", "chat", "error").inc()
+            raise LLMError(f"Unexpected LLM response: {e!r}") from e
+
+    async def stream_chat(self, messages: List[Dict[str, str]], **params) -> AsyncIterator[str]:
+        """
+        Yield the assistant message token by token as the API streams it.
+
+        The concurrency slot and the upstream connection are held until the
+        stream ends; closing the generator early (e.g. when the client
+        disconnects) closes the upstream response too.
+        """
+        payload = {"model": self.model, "messages": messages, **params, "stream": True}
+        async with self.semaphore:
+            try:
+                async with self.http.stream("POST", "/chat/completions", json=payload) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            delta = json.loads(data)["choices"][0].get("delta", {})
+                        except (ValueError, KeyError, IndexError) as e:
+                            UPSTREAM_ERRORS.labels("llm", "stream", "error").inc()
+                            raise LLMError(f"Unexpected LLM stream event: {e!r}") from e
+                        if delta.get("content"):
+                            yield delta["content"]
+            except httpx.TimeoutException as e:
+                UPSTREAM_ERRORS.labels("llm", "stream", "timeout").inc()
+                raise LLMTimeout(f"LLM request timed out: {e!r}") from e
+            except httpx.HTTPError as e:
+                UPSTREAM_ERRORS.labels("llm", "stream", "error").inc()
+                raise LLMError(f"LLM request failed: {e!r}") from e
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several texts with one embeddings API call.
+        """
+        payload = {"model": self.embedding_model, "input": texts}
+        async with self.semaphore:
+            try:
+                response = await self.http.post("/embeddings", json=payload)
+                response.raise_for_status()
+            except httpx.TimeoutException as e:
+                UPSTREAM_ERRORS.labels("llm", "embed", "timeout").inc()
+                raise LLMTimeout(f"Embedding request timed out: {e!r}") from e
+            except httpx.HTTPError as e:
+                UPSTREAM_ERRORS.labels("llm", "embed", "error").inc()
+                raise LLMError(f"Embedding request failed: {e!r}") from e
+        try:
+            data = sorted(response.json()["data"], key=lambda d: d["index"])
+            return [d["embedding"] for d in data]
+        except (ValueError, KeyError, TypeError) as e:
+            UPSTREAM_ERRORS.labels("llm", "embed", "error").inc()
+            raise LLMError(f"Unexpected embedding response: {e!r}") from e
+
+    async def aclose(self):
+        await self.http.aclose()
@@ -1,8 +1,435 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Sequence
+
+import httpx
+
+from ..retrieval.base import Retriever, SearchResult
+from ..retrieval.factory import create_retriever
+from ..retrieval.rerank import Reranker, create_reranker
 from ..utils.config import settings
-import openai
+from ..utils.metrics import (
+    CACHE_LOOKUPS, STAGE_SECONDS, TIME_TO_FIRST_TOKEN_SECONDS, UPSTREAM_ERRORS, track_request,
+)
+from ..utils.text import normalize_question
+from ..utils.tokens import get_encoding
+from .embedding_batcher import EmbeddingBatcher
+from .history import ConversationHistory, create_history
+from .llm_client import LLMClient, LLMError
+from .prompt_builder import PromptBuilder
+from .single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    # answer_cache pulls in numpy; it is imported when the cache is created
+    from .answer_cache import AnswerCache
+
+SYSTEM_PROMPT = (
+    "You are an AWS tutor. Answer questions about Amazon Web Services "
+    "clearly and accurately."
+)
+SUMMARY_PROMPT = (
+    "Summarize this conversation between a student and an AWS tutor in a few "
+    "sentences. Keep the AWS services, identifiers and decisions discussed, "
+    "so the tutor can answer follow-up questions."
+)
+
+logger = logging.getLogger(__name__)
+
+# Failures of the embedding call or the retriever, after which a question is
+# answered without context: upstream errors from the LLM client and Weaviate,
+# and ValueError/OSError from in-process indexes that are corrupt or being
+# rebuilt
+RETRIEVAL_ERRORS = (LLMError, httpx.HTTPError, RuntimeError, ValueError, OSError)
+
+_client: Optional[LLMClient] = None
+_answer_cache: Optional["AnswerCache"] = None
+_retriever: Optional[Retriever] = None
+_embedding_batcher: Optional[EmbeddingBatcher] = None
+_history: Optional[ConversationHistory] = None
+_prompt_builder: Optional[PromptBuilder] = None
+_reranker: Optional[Reranker] = None
+# When this worker last checked whether the document index was rebuilt
+_index_checked = 0.0
+# Seconds a replaced retriever stays open for searches already using it
+RETIRED_RETRIEVER_GRACE = 30.0
+# Identical questions in flight at the same time share one answer
+single_flight = SingleFlight()
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Shared LLM client for this worker, created on first use so it binds to
+    the running event loop.
+    """
+    global _client
+    if _client is None:
+        _client = LLMClient(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            model=settings.LLM_MODEL,
+            embedding_model=settings.EMBEDDING_MODEL,
+            timeout=settings.LLM_TIMEOUT,
+            connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+        )
+    return _client
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Shared query embedding batcher for this worker. Batches go through
+    whichever LLM client is current when they are sent.
+    """
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher(
+            lambda texts: get_llm_client().embed(texts),
+            max_batch=settings.EMBEDDING_BATCH_MAX_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000,
+        )
+    return _embedding_batcher
+
+
+def get_reranker() -> Optional[Reranker]:
+    """
+    Shared re-rank stage for this worker, or None if RERANK_ENABLED is off.
+    """
+    global _reranker
+    if _reranker is None and settings.RERANK_ENABLED:
+        _reranker = create_reranker(settings)
+    return _reranker
+
+
+def get_prompt_builder() -> PromptBuilder:
+    global _prompt_builder
+    if _prompt_builder is None:
+        _prompt_builder = PromptBuilder(
+            SYSTEM_PROMPT,
+            context_tokens=settings.PROMPT_CONTEXT_TOKENS,
+            model=settings.LLM_MODEL,
+            dedup_threshold=settings.PROMPT_DEDUP_THRESHOLD,
+            compress=settings.PROMPT_COMPRESS,
+            compress_tokens=settings.PROMPT_COMPRESS_TOKENS,
+        )
+    return _prompt_builder
+
+
+def get_history() -> Optional[ConversationHistory]:
+    """
+    Shared conversation history for this worker, or None if HISTORY_BACKEND
+    is "none".
+    """
+    global _history
+    if _history is None and settings.HISTORY_BACKEND != "none":
+        _history = create_history(settings, summarize_conversation)
+    return _history
+
+
+async def summarize_conversation(summary: str, messages: List[Dict[str, str]]) -> str:
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if summary:
+        transcript = f"Earlier summary: {summary}\n\n{transcript}"
+    return await get_llm_client().chat([
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": transcript},
+    ])
+
+
+def get_answer_cache() -> Optional["AnswerCache"]:
+    """
+    Shared answer cache for this worker, or None if ANSWER_CACHE_ENABLED is
+    off.
+    """
+    global _answer_cache
+    if _answer_cache is None and settings.ANSWER_CACHE_ENABLED:
+        from .answer_cache import create_answer_cache
+        _answer_cache = create_answer_cache(settings)
+    return _answer_cache
+
+
+def get_retriever() -> Optional[Retriever]:
+    """
+    Shared retriever for this worker, or None if RETRIEVER_BACKEND is "none".
+    """
+    global _retriever
+    if _retriever is None and settings.RETRIEVER_BACKEND != "none":
+        _retriever = create_retriever(settings)
+    return _retriever
+
+
+async def reload_retriever():
+    """
+    Reopen the retriever after the document index was rebuilt. Cached
+    answers were generated from the old index, so they are dropped too.
+    """
+    global _retriever
+    # Opened before the old one is dropped, so a failure keeps serving it
+    new = create_retriever(settings) if settings.RETRIEVER_BACKEND != "none" else None
+    old, _retriever = _retriever, new
+    await invalidate_answer_cache()
+    if old is not None:
+        # Requests that already hold the old retriever finish on it
+        asyncio.get_running_loop().call_later(
+            RETIRED_RETRIEVER_GRACE, lambda: asyncio.ensure_future(old.close()))
+
+
+async def check_index():
+    """
+    Reload the retriever if its index files were rebuilt, at most every
+    RETRIEVER_RELOAD_INTERVAL seconds. Every worker checks for itself, so
+    they all pick up a new index and drop their cached answers.
+    """
+    global _index_checked
+    if _retriever is None or settings.RETRIEVER_RELOAD_INTERVAL <= 0:
+        return
+    now = time.monotonic()
+    if now - _index_checked < settings.RETRIEVER_RELOAD_INTERVAL:
+        return
+    _index_checked = now
+    if _retriever.index_changed():
+        logger.info("Document index was rebuilt, reloading it")
+        try:
+            await reload_retriever()
+        except RETRIEVAL_ERRORS as e:
+            logger.warning(f"Could not reload the document index, keeping the current one: {e}")
+
+
+async def close_retriever():
+    global _retriever
+    if _retriever is not None:
+        await _retriever.close()
+        _retriever = None
+
+
+async def close_history():
+    global _history
+    if _history is not None:
+        await _history.close()
+        _history = None
+
+
+async def close_llm_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def close_answer_cache():
+    global _answer_cache
+    if _answer_cache is not None:
+        await _answer_cache.close()
+        _answer_cache = None
+
+
+async def warm_up():
+    """
+    Create this worker's shared clients, caches and indexes and open their
+    connection pools, so the first requests don't pay for it. A store that
+    can't be reached yet is logged and left to connect on first use.
+    """
+    get_llm_client()
+    get_retriever()
+    get_answer_cache()
+    get_embedding_batcher()
+    get_reranker()
+    get_encoding(settings.LLM_MODEL)
+    get_prompt_builder()
+    history = get_history()
+    if history is not None:
+        try:
+            await history.open()
+        except Exception as e:
+            logger.warning(f"Could not connect the history store: {e}")
+
+
+async def shut_down():
+    """
+    Close everything warm_up() opened. In-flight embedding batches and
+    history compactions are finished or cancelled first.
+    """
+    batcher = _embedding_batcher
+    if batcher is not None:
+        batcher.flush()
+        if batcher.sending:
+            await asyncio.wait(set(batcher.sending), timeout=settings.LLM_TIMEOUT)
+    await close_history()
+    await close_answer_cache()
+    await close_retriever()
+    await close_llm_client()
+
+
+async def invalidate_answer_cache():
+    """
+    Drop every cached answer. Call after the document index is rebuilt.
+    """
+    cache = get_answer_cache()
+    if cache is not None:
+        await cache.invalidate()
+
+
+def build_messages(question: str, documents: Sequence[SearchResult] = (),
+                   history: Sequence[Dict[str, str]] = ()):
+    with STAGE_SECONDS.labels(stage="prompt").time():
+        return get_prompt_builder().build(question, documents, history)
+
+
+async def embed_query(question: str) -> List[float]:
+    # Includes the wait for the rest of the batch
+    with STAGE_SECONDS.labels(stage="embedding").time():
+        if settings.EMBEDDING_BATCH_MAX_WAIT_MS <= 0:
+            return (await get_llm_client().embed([question]))[0]
+        return await get_embedding_batcher().embed(question)
+
+
+async def retrieve(question: str, embedding: Optional[List[float]] = None) -> List[SearchResult]:
+    """
+    Top RETRIEVER_TOP_K documentation chunks for the question. With the
+    re-rank stage on, RERANK_CANDIDATES chunks are retrieved and re-ranked
+    first. Retrieval problems are logged and the question is answered
+    without context.
+    """
+    try:
+        retriever = get_retriever()
+    except RETRIEVAL_ERRORS as e:
+        UPSTREAM_ERRORS.labels("retriever", "open", "error").inc()
+        logger.warning(f"Could not open the document index, answering without context: {e}")
+        return []
+    if retriever is None:
+        return []
+    reranker = get_reranker()
+    k = settings.RETRIEVER_TOP_K
+    try:
+        if embedding is None:
+            embedding = await embed_query(question)
+        with STAGE_SECONDS.labels(stage="retrieval").time():
+            results = await retriever.search(embedding, max(k, settings.RERANK_CANDIDATES) if reranker else k,
+                                             question)
+    except RETRIEVAL_ERRORS as e:
+        # Embedding failures are counted by the LLM client
+        if not isinstance(e, LLMError):
+            kind = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+            UPSTREAM_ERRORS.labels("retriever", "search", kind).inc()
+        logger.warning(f"Retrieval failed, answering without context: {e}")
+        return []
+    if reranker is None:
+        return results
+    try:
+        with STAGE_SECONDS.labels(stage="rerank").time():
+            return await reranker.rerank(question, results, k)
+    except Exception as e:
+        logger.warning(f"Re-ranking failed, keeping retrieval order: {e}")
+        return results[:k]
+
+
+async def cached_answer(cache: "AnswerCache", question: str):
+    """
+    Look the question up in both cache tiers. Returns (answer, embedding);
+    the embedding is None when the exact tier hit or embedding failed.
+    """
+    answer = await cache.get_exact(question)
+    if answer is not None:
+        CACHE_LOOKUPS.labels("exact_hit").inc()
+        return answer, None
+    try:
+        embedding = await embed_query(question)
+    except LLMError as e:
+        logger.warning(f"Skipping semantic cache lookup: {e}")
+        cache.stats.misses += 1
+        CACHE_LOOKUPS.labels("miss").inc()
+        return None, None
+    answer = await cache.get_similar(embedding)
+    CACHE_LOOKUPS.labels("semantic_hit" if answer is not None else "miss").inc()
+    return answer, embedding
+
+
+async def session_context(session_id: Optional[str]) -> List[Dict[str, str]]:
+    history = get_history() if session_id else None
+    if history is None:
+        return []
+    return await history.context(session_id)
+
+
+async def record_turn(session_id: Optional[str], question: str, answer: str):
+    history = get_history() if session_id and answer else None
+    if history is not None:
+        await history.record(session_id, question, answer)
+
+
+async def get_answer(question: str, session_id: Optional[str] = None) -> str:
+    """
+    Answer a question, in the context of the session's earlier turns if
+    `session_id` is given. Concurrent requests for the same (normalized)
+    standalone question are coalesced into one retrieval and LLM call when
+    COALESCE_REQUESTS is on.
+    """
+    with track_request("chat"):
+        await check_index()
+        history = await session_context(session_id)
+        if history or not settings.COALESCE_REQUESTS:
+            answer = await generate_answer(question, history)
+        else:
+            answer = await single_flight.do(normalize_question(question), lambda: generate_answer(question))
+        await record_turn(session_id, question, answer)
+    return answer
+
+
+async def generate_answer(question: str, history: Sequence[Dict[str, str]] = ()) -> str:
+    # Follow-up questions depend on the conversation, so only standalone
+    # questions use the answer cache
+    cache = get_answer_cache() if not history else None
+    embedding = None
+    if cache is not None:
+        answer, embedding = await cached_answer(cache, question)
+        if answer is not None:
+            return answer
+
+    start = time.perf_counter()
+    documents = await retrieve(question, embedding)
+    messages = build_messages(question, documents, history)
+    with STAGE_SECONDS.labels(stage="llm").time():
+        answer = await get_llm_client().chat(messages)
+    if cache is not None and answer:
+        await cache.set(question, answer, embedding, cost=time.perf_counter() - start)
+    return answer
+
+
+async def stream_answer(question: str, session_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yield answer tokens as the LLM produces them. A cached answer is
+    yielded in one piece; a fully streamed answer is added to the cache
+    and, with a `session_id`, to the session.
+    """
+    with track_request("stream"):
+        await check_index()
+        history = await session_context(session_id)
+        cache = get_answer_cache() if not history else None
+        embedding = None
+        if cache is not None:
+            answer, embedding = await cached_answer(cache, question)
+            if answer is not None:
+                yield answer
+                await record_turn(session_id, question, answer)
+                return
 
-def get_answer(question: str) -> str:
-    openai.api_key = settings.OPENAI_API_KEY
-    # Implement your LLM logic here. For demonstration, returning a placeholder.
-    response = f"Echoing your question: {question}"
-    return response
+        start = time.perf_counter()
+        documents = await retrieve(question, embedding)
+        parts = []
+        messages = build_messages(question, documents, history)
+        tokens = get_llm_client().stream_chat(messages)
+        sent = time.perf_counter()
+        try:
+            with STAGE_SECONDS.labels(stage="llm").time():
+                async for token in tokens:
+                    if not parts:
+                        TIME_TO_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - sent)
+                    parts.append(token)
+                    yield token
+        finally:
+            # Close the upstream stream right away if our caller stops early
+            await tokens.aclose()
+        if cache is not None and parts:
+            await cache.set(question, "".join(parts), embedding, cost=time.perf_counter() - start)
+        await record_turn(session_id, question, "".join(parts))
@@ -0,0 +1,114 @@
+import dataclasses
+import functools
+import re
+from typing import Dict, FrozenSet, List, Sequence
+
+from ..retrieval.base import SearchResult
+from ..retrieval.terms import tokenize
+from ..utils.tokens import MESSAGE_OVERHEAD, count_tokens
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@functools.lru_cache(maxsize=4096)
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """
+    Hashed word n-grams, for near-duplicate detection. Memoized like token
+    counts, since popular chunks are retrieved again and again.
+    """
+    words = text.lower().split()
+    if len(words) <= size:
+        return frozenset([hash(" ".join(words))])
+    return frozenset(hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class PromptBuilder:
+    """
+    Assemble the chat prompt from the question, retrieved chunks and
+    conversation history, with the documentation context held to
+    `context_tokens` tokens of the model's tokenizer.
+
+    Chunks are taken best score first; a chunk whose word 3-grams overlap an
+    already packed one by `dedup_threshold` or more (Jaccard) is skipped, and
+    chunks that no longer fit are skipped in favour of smaller ones. With
+    `compress`, each chunk is first cut down to its sentences sharing the
+    most terms with the question, at most `compress_tokens` tokens of them,
+    kept in their original order.
+    """
+
+    def __init__(self, system_prompt: str, context_tokens: int = 2000, model: str = "gpt-3.5-turbo",
+                 dedup_threshold: float = 0.8, compress: bool = False, compress_tokens: int = 200):
+        self.system_prompt = system_prompt
+        self.context_tokens = context_tokens
+        self.model = model
+        self.dedup_threshold = dedup_threshold
+        self.compress = compress
+        self.compress_tokens = compress_tokens
+
+    def tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def format(self, n: int, doc: SearchResult) -> str:
+        return f"[{n}] {doc.title} ({doc.url})\n{doc.content}"
+
+    def compress_chunk(self, question: str, content: str) -> str:
+        sentences = [s.strip() for s in SENTENCE_END.split(content) if s.strip()]
+        if len(sentences) <= 1 or self.tokens(content) <= self.compress_tokens:
+            return content
+        terms = set(tokenize(question))
+        ranked = sorted(range(len(sentences)),
+                        key=lambda i: len(terms.intersection(tokenize(sentences[i]))), reverse=True)
+        keep, used = [], 0
+        for i in ranked:
+            size = self.tokens(sentences[i])
+            if keep and used + size > self.compress_tokens:
+                continue
+            keep.append(i)
+            used += size
+        return " ".join(sentences[i] for i in sorted(keep))
+
+    def pack(self, question: str, documents: Sequence[SearchResult]) -> List[SearchResult]:
+        """
+        The chunks that go into the prompt, best first.
+        """
+        packed: List[SearchResult] = []
+        seen: List[FrozenSet[int]] = []
+        budget = self.context_tokens
+        for doc in sorted(documents, key=lambda d: d.score, reverse=True):
+            content = self.compress_chunk(question, doc.content) if self.compress else doc.content
+            fingerprint = shingles(content)
+            if any(jaccard(fingerprint, other) >= self.dedup_threshold for other in seen):
+                continue
+            if content is not doc.content:
+                doc = dataclasses.replace(doc, content=content)
+            # The "[n] " prefix and blank line are left out of the counted
+            # text so the count is memoized per chunk whatever its position
+            size = self.tokens(f"{doc.title} ({doc.url})\n{doc.content}") + 4
+            if size > budget:
+                continue
+            packed.append(doc)
+            seen.append(fingerprint)
+            budget -= size
+        return packed
+
+    def system(self, question: str, documents: Sequence[SearchResult]) -> str:
+        documents = self.pack(question, documents)
+        if not documents:
+            return self.system_prompt
+        context = "\n\n".join(self.format(i, doc) for i, doc in enumerate(documents, 1))
+        return f"{self.system_prompt}\n\nUse these AWS documentation excerpts to answer:\n\n{context}"
+
+    def build(self, question: str, documents: Sequence[SearchResult] = (),
+              history: Sequence[Dict[str, str]] = ()) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system(question, documents)},
+            *history,
+            {"role": "user", "content": question},
+        ]
+
+    def prompt_tokens(self, messages: Sequence[Dict[str, str]]) -> int:
+        return sum(self.tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
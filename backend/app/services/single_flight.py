@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from ..utils.metrics import COALESCED_REQUESTS
+
+
+class SingleFlightStats:
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+
+    def as_dict(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls with the same key: the first caller starts
+    the computation and later callers wait for its result (or exception)
+    instead of starting their own.
+
+    The computation runs in its own task, so one caller disconnecting
+    doesn't cancel it for the others; it is only cancelled once every
+    caller waiting on it is gone.
+    """
+
+    def __init__(self):
+        # key -> (task, number of callers waiting on it)
+        self.calls: Dict[str, Tuple[asyncio.Task, int]] = {}
+        self.stats = SingleFlightStats()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if key in self.calls:
+            task, waiters = self.calls[key]
+            self.calls[key] = (task, waiters + 1)
+            self.stats.coalesced += 1
+            COALESCED_REQUESTS.inc()
+        else:
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = (task, 1)
+            self.stats.leaders += 1
+            task.add_done_callback(lambda _: self._forget(key, task))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if key in self.calls and self.calls[key][0] is task:
+                waiters = self.calls[key][1] - 1
+                self.calls[key] = (task, waiters)
+                if not waiters:
+                    task.cancel()
+            raise
+
+    def _forget(self, key, task):
+        if key in self.calls and self.calls[key][0] is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved when nobody was left to await it
+            task.exception()
+
+    def __len__(self):
+        return len(self.calls)
@@ -1,3 +1,5 @@
+import functools
+
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,4 +7,132 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     VECTOR_DB_URL: str
 
-settings = Settings()
+    # HTTP server (python main.py). SERVER_WORKERS = 0 starts one worker
+    # process per CPU available to the container, or a single one with
+    # HISTORY_BACKEND = "memory", which isn't shared between workers (more
+    # than one is refused). On shutdown, requests in flight get
+    # SERVER_GRACEFUL_TIMEOUT seconds to finish.
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    SERVER_GRACEFUL_TIMEOUT: float = 30.0
+    SERVER_KEEPALIVE_TIMEOUT: float = 5.0
+    SERVER_WARM_UP: bool = True
+
+    # Chat completion upstream. One pooled HTTP client is shared by all
+    # requests in a worker; LLM_MAX_CONCURRENCY caps in-flight calls.
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    LLM_MODEL: str = "gpt-3.5-turbo"
+    LLM_TIMEOUT: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_MAX_CONNECTIONS: int = 100
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    # Question embeddings arriving within EMBEDDING_BATCH_MAX_WAIT_MS of each
+    # other (up to EMBEDDING_BATCH_MAX_SIZE) share one embeddings call; a wait
+    # of 0 embeds every question on its own.
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Retrieval backend: "weaviate" (VECTOR_DB_URL), "memory" (the embedding
+    # store at RETRIEVER_INDEX_PATH, memory-mapped and searched in-process;
+    # see app/retrieval/store.py) or "none". Set
+    # RETRIEVER_IVF_LISTS to cluster large in-memory indexes and scan only
+    # the RETRIEVER_IVF_PROBES nearest clusters per query.
+    # RETRIEVER_QUANTIZATION ("none", "float16", "int8" or "pq") scans a
+    # compressed copy of the vectors and rescores the best
+    # RETRIEVER_EXACT_RERANK candidates with the exact ones. Build the store
+    # with the same IVF lists and quantization so workers map them instead
+    # of clustering and encoding their own at startup.
+    # RETRIEVER_SPARSE_INDEX_PATH (written by ingestion with --sparse-index)
+    # adds BM25 search, fused with the vector results by reciprocal rank over
+    # the top RETRIEVER_FUSION_CANDIDATES of each. Each worker checks at most
+    # every RETRIEVER_RELOAD_INTERVAL seconds (0 never) whether those files
+    # were rebuilt, and then reopens them and drops the cached answers.
+    RETRIEVER_BACKEND: str = "weaviate"
+    RETRIEVER_INDEX_PATH: str = "index.emb"
+    RETRIEVER_TOP_K: int = 5
+    RETRIEVER_IVF_LISTS: int = 0
+    RETRIEVER_IVF_PROBES: int = 8
+    RETRIEVER_QUANTIZATION: str = "none"
+    RETRIEVER_PQ_SUBSPACES: int = 64
+    RETRIEVER_EXACT_RERANK: int = 100
+    RETRIEVER_SPARSE_INDEX_PATH: str = ""
+    RETRIEVER_FUSION_CANDIDATES: int = 50
+    RETRIEVER_RRF_K: int = 60
+    RETRIEVER_RELOAD_INTERVAL: float = 10.0
+    WEAVIATE_CLASS: str = "AWSDocument"
+
+    # Optional re-rank stage between retrieval and the prompt: the top
+    # RERANK_CANDIDATES chunks are rescored in batches of RERANK_BATCH_SIZE by
+    # RERANK_SCORER ("lexical" overlap, or a local "cross-encoder" RERANK_MODEL)
+    # and cut to RETRIEVER_TOP_K. Past RERANK_BUDGET_MS the retrieval order is
+    # kept.
+    RERANK_ENABLED: bool = False
+    RERANK_SCORER: str = "lexical"
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_BUDGET_MS: float = 50.0
+
+    # Retrieved chunks are packed best first into PROMPT_CONTEXT_TOKENS
+    # tokens, skipping near-duplicates (word 3-gram Jaccard >=
+    # PROMPT_DEDUP_THRESHOLD). PROMPT_COMPRESS cuts each chunk down to its
+    # PROMPT_COMPRESS_TOKENS most question-relevant tokens of sentences.
+    PROMPT_CONTEXT_TOKENS: int = 2000
+    PROMPT_DEDUP_THRESHOLD: float = 0.8
+    PROMPT_COMPRESS: bool = False
+    PROMPT_COMPRESS_TOKENS: int = 200
+
+    # Conversation history for requests with a session_id: "postgres"
+    # (DATABASE_URL, through an asyncpg pool; shared by all workers),
+    # "memory" (single worker, for development) or "none". The
+    # HISTORY_HOT_SESSIONS most recent sessions are cached in-process; prompts
+    # carry at most HISTORY_TOKEN_BUDGET tokens of history, older turns being
+    # summarized.
+    HISTORY_BACKEND: str = "postgres"
+    HISTORY_TOKEN_BUDGET: int = 1500
+    HISTORY_HOT_SESSIONS: int = 1000
+    HISTORY_DB_POOL_MIN_SIZE: int = 1
+    HISTORY_DB_POOL_MAX_SIZE: int = 10
+
+    # Concurrent identical /chat questions share one upstream computation.
+    COALESCE_REQUESTS: bool = True
+
+    # Answers are cached on the normalized question and, for near-duplicate
+    # questions, on question-embedding similarity. "memory" keeps the cache
+    # per worker; "redis" shares the answers through ANSWER_CACHE_REDIS_URL,
+    # but the question-embedding index stays per worker, so a worker only
+    # finds near-duplicates of questions it answered itself.
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_BACKEND: str = "memory"
+    ANSWER_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    ANSWER_CACHE_TTL: float = 3600.0
+    ANSWER_CACHE_MAX_ENTRIES: int = 10000
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Settings read from the environment, once per process on first use.
+    """
+    return Settings()
+
+
+class LazySettings:
+    """
+    Stand-in for the Settings object that reads the environment on first
+    attribute access rather than at import, so importing the app (or a tool
+    that only needs part of it) neither pays for nor fails on settings it
+    doesn't use. Attributes can be assigned as on Settings.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = LazySettings()
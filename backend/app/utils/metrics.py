@@ -0,0 +1,92 @@
+# Prometheus metrics for the chat pipeline, served at /metrics.
+#
+# Stage timings use a histogram's .time() (or .observe()) with the stage as
+# label, e.g.
+#
+#     with STAGE_SECONDS.labels(stage="retrieval").time():
+#         results = await retriever.search(...)
+#
+# and the scraper records its embed and store stages the same way (see
+# scraper/aws_tutor_scraper/metrics.py). Under the multi-worker server each
+# worker writes its samples to PROMETHEUS_MULTIPROC_DIR (set up by
+# app/server.py) and /metrics adds them up, whichever worker serves the
+# scrape.
+
+import asyncio
+import contextlib
+import os
+import time
+from typing import Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Seconds; from a memory-mapped index lookup up to a slow completion
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of answering a question: embedding, retrieval, rerank, prompt, llm.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from sending a streamed completion request to its first token.",
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "chat_request_seconds",
+    "Total time to answer a question, by endpoint and outcome.",
+    ["endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "chat_cache_lookups_total",
+    "Answer cache lookups by result (exact_hit, semantic_hit or miss).",
+    ["result"],
+)
+COALESCED_REQUESTS = Counter(
+    "chat_coalesced_requests_total",
+    "Requests that waited for an identical in-flight request instead of computing their own answer.",
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "chat_embedding_batch_size",
+    "Number of embedding requests sent upstream together in one micro-batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+UPSTREAM_ERRORS = Counter(
+    "chat_upstream_errors_total",
+    "Failed calls to upstream services, by upstream, operation and kind (timeout or error).",
+    ["upstream", "operation", "kind"],
+)
+
+
+@contextlib.contextmanager
+def track_request(endpoint: str):
+    """
+    Observe the time spent in the block as one `endpoint` request, with
+    outcome "ok", "error" or "cancelled" (client went away).
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        outcome = "cancelled"
+        raise
+    finally:
+        REQUEST_SECONDS.labels(endpoint, outcome).observe(time.perf_counter() - start)
+
+
+def render() -> Tuple[bytes, str]:
+    """
+    The current metrics in the Prometheus text format, and its content type.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,12 @@
+import re
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase, drop punctuation and collapse whitespace, so "What is AWS
+    Lambda?" and "what is aws lambda" share an exact cache entry.
+    """
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", question.lower())).strip()
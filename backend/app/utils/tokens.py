@@ -0,0 +1,57 @@
+import functools
+import logging
+from typing import Dict, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing tokens of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token), the same estimate the
+    scraper and ingestion job use for chunking.
+    """
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD
+
+
+def messages_tokens(messages: Iterable[Dict[str, str]]) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """
+    The tiktoken encoding for `model`, loaded once per process. None if
+    tiktoken isn't installed or its encoding files can't be loaded.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Falling back to estimated token counts: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """
+    Exact token count with the model's tokenizer when available, else the
+    estimate. Counts are memoized: the same documentation chunks come back
+    for many questions.
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
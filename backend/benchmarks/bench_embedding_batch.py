@@ -0,0 +1,68 @@
+# bench_embedding_batch.py
+# Query embedding latency and upstream call count with and without
+# micro-batching, against the mock server's embeddings endpoint. Questions
+# arrive at a fixed rate; each mode embeds the same stream.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_embedding_batch --rate 500 --requests 2000 --waits 0 2 5 10
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.llm_client import LLMClient
+from benchmarks.mock_llm_server import MockLLMServer
+
+
+async def run(url, requests, rate, max_wait, max_batch, concurrency):
+    client = LLMClient(api_key="bench", base_url=url, max_concurrency=concurrency)
+    batcher = EmbeddingBatcher(client.embed, max_batch=max_batch, max_wait=max_wait / 1000)
+    latencies = []
+
+    async def one(n):
+        start = time.perf_counter()
+        if max_wait > 0:
+            await batcher.embed(f"question {n}")
+        else:
+            await client.embed([f"question {n}"])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tasks = []
+    for n in range(requests):
+        tasks.append(asyncio.ensure_future(one(n)))
+        await asyncio.sleep(1 / rate)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return np.asarray(latencies) * 1000, requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500, help="questions per second")
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 2, 5, 10],
+                        help="batch windows in ms (0 = no batching)")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32, help="LLM client in-flight cap")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="mock seconds per call")
+    args = parser.parse_args()
+
+    with MockLLMServer(embedding_latency=args.embedding_latency) as server:
+        print(f"{'window':<10} {'calls':>7} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+        for wait in args.waits:
+            before = server.app.state.embedding_calls
+            latencies, throughput = asyncio.run(
+                run(server.url, args.requests, args.rate, wait, args.max_batch, args.concurrency))
+            calls = server.app.state.embedding_calls - before
+            label = f"{wait:g} ms" if wait > 0 else "off"
+            print(f"{label:<10} {calls:>7} {np.percentile(latencies, 50):>8.1f} "
+                  f"{np.percentile(latencies, 95):>8.1f} {throughput:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_import.py
+# Cold import time of the backend, the bulk of a worker's startup. Each run
+# imports the module in a fresh interpreter with `python -X importtime` and
+# no settings in the environment, so nothing is read or connected at import.
+# Reports the median and worst run and the top-level packages that cost the
+# most, and exits non-zero when the median is over --threshold-ms, for use
+# as a CI check.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_import --module main --runs 10 --threshold-ms 800
+
+import argparse
+import collections
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Settings the app needs at runtime; left out so an import that reads them
+# fails the benchmark
+REQUIRED_SETTINGS = ("DATABASE_URL", "OPENAI_API_KEY", "VECTOR_DB_URL")
+
+
+def import_times(module):
+    """
+    Microseconds per imported module, cumulative (including what it
+    imports) and self, from one cold import of `module`.
+    """
+    env = {k: v for k, v in os.environ.items() if k not in REQUIRED_SETTINGS}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(cumulative_us), int(self_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=8, help="heaviest top-level packages to list")
+    parser.add_argument("--threshold-ms", type=float, default=800.0)
+    args = parser.parse_args()
+
+    totals = []
+    packages = collections.defaultdict(list)
+    for _ in range(args.runs):
+        times = import_times(args.module)
+        totals.append(times[args.module][0] / 1000)
+        run = collections.Counter()
+        for name, (_, self_us) in times.items():
+            run[name.split(".")[0]] += self_us / 1000
+        for name, ms in run.items():
+            packages[name].append(ms)
+
+    median = float(np.median(totals))
+    print(f"import {args.module}: median {median:.0f} ms, max {max(totals):.0f} ms over {args.runs} runs")
+    print(f"{'package':<24} {'ms':>7}")
+    heaviest = sorted(packages.items(), key=lambda item: -np.median(item[1]))[:args.top]
+    for name, ms in heaviest:
+        print(f"{name:<24} {np.median(ms):>7.1f}")
+    if median > args.threshold_ms:
+        sys.exit(f"median import time {median:.0f} ms is over the {args.threshold_ms:.0f} ms threshold")
+
+
+if __name__ == "__main__":
+    main()
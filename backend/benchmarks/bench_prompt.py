@@ -0,0 +1,76 @@
+# bench_prompt.py
+# Prompt size and build time per query: every retrieved chunk pasted in
+# as is, versus the prompt builder's budgeted packing with near-duplicate
+# removal, with and without extractive compression. Uses synthetic chunks
+# where a share of the results are near-copies of each other, as happens
+# with overlapping chunk windows and pages repeated across guides.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_prompt --queries 200 --chunks 20 --budget 2000
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.retrieval.base import SearchResult
+from app.services.prompt_builder import PromptBuilder
+
+WORDS = ("lambda s3 bucket function instance iam role policy vpc subnet route table api gateway "
+         "request throttling limit region availability zone encryption key kms snapshot volume "
+         "ebs ec2 autoscaling target group load balancer listener certificate cloudwatch alarm "
+         "metric log stream event rule queue sqs topic sns table dynamodb index capacity").split()
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+
+
+def make_results(rng, n, duplicate_rate, sentences=12):
+    results = []
+    for i in range(n):
+        if results and rng.random() < duplicate_rate:
+            # Overlapping window: the same text with one sentence changed
+            base = rng.choice(results).content.split(". ")
+            base[rng.randrange(len(base))] = sentence(rng).rstrip(".")
+            content = ". ".join(base)
+        else:
+            content = " ".join(sentence(rng) for _ in range(sentences))
+        results.append(SearchResult(id=str(i), score=1.0 - i / n, content=content,
+                                    title=f"Page {i}", url=f"https://docs.aws.amazon.com/page{i}.html"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=20, help="retrieved chunks per query")
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of near-duplicate chunks")
+    parser.add_argument("--budget", type=int, default=2000, help="context tokens")
+    parser.add_argument("--compress-tokens", type=int, default=120)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    queries = [(sentence(rng), make_results(rng, args.chunks, args.duplicates)) for _ in range(args.queries)]
+    modes = [
+        ("all chunks", PromptBuilder("system", context_tokens=10 ** 9, dedup_threshold=1.01)),
+        ("packed", PromptBuilder("system", context_tokens=args.budget)),
+        ("packed+compressed", PromptBuilder("system", context_tokens=args.budget, compress=True,
+                                            compress_tokens=args.compress_tokens)),
+    ]
+    print(f"{'mode':<18} {'tokens p50':>10} {'tokens max':>10} {'chunks':>7} {'build ms p50':>13} {'p95':>7}")
+    for label, builder in modes:
+        sizes, chunks, times = [], [], []
+        for question, results in queries:
+            start = time.perf_counter()
+            messages = builder.build(question, results)
+            times.append((time.perf_counter() - start) * 1000)
+            sizes.append(builder.prompt_tokens(messages))
+            chunks.append(messages[0]["content"].count("\n["))
+        print(f"{label:<18} {np.percentile(sizes, 50):>10.0f} {max(sizes):>10} {np.mean(chunks):>7.1f} "
+              f"{np.percentile(times, 50):>13.2f} {np.percentile(times, 95):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
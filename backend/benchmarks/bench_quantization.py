@@ -0,0 +1,55 @@
+# bench_quantization.py
+# Memory, query latency and recall@k of the in-process retriever for each
+# vector quantization mode, on synthetic clustered embeddings.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_quantization --docs 50000 --dim 1536
+
+import argparse
+import time
+
+from app.retrieval.memory import InMemoryRetriever
+
+from .bench_retrieval import make_corpus, measure
+
+MODES = [
+    ("float32", "none", 0),
+    ("float16", "float16", 0),
+    ("int8", "int8", 0),
+    ("int8+rerank", "int8", 100),
+    ("pq", "pq", 0),
+    ("pq+rerank", "pq", 100),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0, help="noise around cluster centers")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--subspaces", type=int, default=64, help="PQ subspaces (bytes per vector)")
+    parser.add_argument("--rerank", type=int, default=100, help="exact re-rank depth for the +rerank modes")
+    args = parser.parse_args()
+
+    embeddings, documents, queries = make_corpus(args.docs, args.dim, args.clusters, args.spread)
+    truth = None
+    print(f"{'mode':<14} {'scan MB':>9} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>10}")
+    for label, quantization, rerank in MODES:
+        start = time.perf_counter()
+        retriever = InMemoryRetriever(embeddings, documents, quantization=quantization,
+                                      pq_subspaces=args.subspaces, rerank=rerank and args.rerank)
+        build = time.perf_counter() - start
+        # What each query scans; with a memory-mapped store this is also
+        # what has to stay resident, the float32 rows are only read to re-rank
+        scanned = retriever.codes if retriever.codes is not None else retriever.matrix
+        p50, p95, recall, results = measure(retriever, queries, args.k, truth)
+        if truth is None:
+            truth = results
+        extra = f" (+{args.rerank} exact rows/query)" if rerank else ""
+        print(f"{label:<14} {scanned.nbytes / 2**20:>9.1f} {build:>8.1f} {p50:>8.2f} {p95:>8.2f} {recall:>10.3f}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_retrieval.py
+# Query latency and recall@k of the in-process retriever: brute force versus
+# IVF at several probe counts, on synthetic clustered embeddings.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_retrieval --docs 50000 --dim 1536
+
+import argparse
+import time
+
+import numpy as np
+
+from app.retrieval.memory import InMemoryRetriever
+
+
+def make_corpus(n, dim, clusters, spread, seed=0):
+    """
+    Embeddings drawn around `clusters` random centers, like chunks of many
+    pages about a smaller number of topics.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    embeddings = centers[labels] + spread * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, clusters, 200)] + spread * rng.standard_normal((200, dim)).astype(np.float32)
+    documents = [{"chunk_id": str(i)} for i in range(n)]
+    return embeddings, documents, queries
+
+
+def measure(retriever, queries, k, truth=None):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        found = retriever.search_sync(query, k)
+        latencies.append(time.perf_counter() - start)
+        results.append({r.id for r in found})
+    recall = 1.0
+    if truth is not None:
+        recall = float(np.mean([len(r & t) / k for r, t in zip(results, truth)]))
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 95) * 1000, recall, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=2.0, help="noise around cluster centers")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=256, help="IVF lists")
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    embeddings, documents, queries = make_corpus(args.docs, args.dim, args.clusters, args.spread)
+    brute = InMemoryRetriever(embeddings, documents)
+    p50, p95, _, truth = measure(brute, queries, args.k)
+    print(f"{'mode':<16} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(args.k):>10}")
+    print(f"{'brute force':<16} {p50:>8.2f} {p95:>8.2f} {1.0:>10.3f}")
+
+    start = time.perf_counter()
+    ivf = InMemoryRetriever(embeddings, documents, ivf_lists=args.lists)
+    print(f"(IVF build with {args.lists} lists: {time.perf_counter() - start:.1f} s)")
+    for probes in args.probes:
+        ivf.index.n_probe = probes
+        p50, p95, recall, _ = measure(ivf, queries, args.k, truth)
+        print(f"{'IVF probe=' + str(probes):<16} {p50:>8.2f} {p95:>8.2f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
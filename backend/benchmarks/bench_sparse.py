@@ -0,0 +1,62 @@
+# bench_sparse.py
+# Latency of the BM25 path of hybrid retrieval (tokenize, postings lookup,
+# scoring and top-k), which should stay under 5 ms per query, on a synthetic
+# corpus with a Zipf-distributed vocabulary.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_sparse --docs 200000
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.retrieval.sparse import SparseIndex, SparseIndexBuilder
+
+
+def make_corpus(n, vocabulary, words, seed=0):
+    rng = np.random.default_rng(seed)
+    terms = [f"term{i}" for i in range(vocabulary)]
+    for i in range(n):
+        yield i, " ".join(terms[j] for j in np.minimum(rng.zipf(1.2, words), vocabulary) - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=200000)
+    parser.add_argument("--vocabulary", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=300, help="words per chunk")
+    parser.add_argument("--query-terms", type=int, default=6)
+    parser.add_argument("--k", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.bm25")
+        start = time.perf_counter()
+        builder = SparseIndexBuilder(path)
+        for i, text in make_corpus(args.docs, args.vocabulary, args.words):
+            builder.add({"chunk_id": str(i)}, text)
+        builder.close()
+        print(f"Built {args.docs} docs in {time.perf_counter() - start:.1f} s, "
+              f"{os.path.getsize(path) / 2**20:.1f} MB")
+
+        index = SparseIndex(path)
+        rng = np.random.default_rng(1)
+        # Mix of common and rare terms, like a question naming an API
+        queries = [" ".join(f"term{j}" for j in rng.integers(0, args.vocabulary, args.query_terms) // rng.integers(1, 1000))
+                   for _ in range(500)]
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search_sync(query, args.k)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.asarray(latencies) * 1000
+        print(f"sparse top-{args.k}: p50 {np.percentile(latencies, 50):.2f} ms, "
+              f"p95 {np.percentile(latencies, 95):.2f} ms, max {latencies.max():.2f} ms")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_store_open.py
+# Index load time at backend startup: deserializing rows from JSON lines
+# versus opening the memory-mapped embedding store, plus the first query on
+# each (which pays for any pages the store hasn't read yet).
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.bench_store_open --docs 100000 --dim 1536
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.retrieval.memory import InMemoryRetriever
+from app.retrieval.store import StoreWriter
+
+
+def write_corpus(directory, n, dim, dtype):
+    rng = np.random.default_rng(0)
+    jsonl = os.path.join(directory, "index.jsonl")
+    store = os.path.join(directory, "index.emb")
+    writer = StoreWriter(store, dim, dtype)
+    with open(jsonl, "w") as f:
+        for start in range(0, n, 10000):
+            vectors = rng.standard_normal((min(10000, n - start), dim)).astype(np.float32)
+            documents = [{"chunk_id": str(start + i), "content": f"chunk {start + i}"} for i in range(len(vectors))]
+            writer.add(vectors, documents)
+            for vector, document in zip(vectors, documents):
+                f.write(json.dumps({"vector": vector.tolist(), **document}) + "\n")
+    writer.close()
+    return jsonl, store
+
+
+def load_jsonl(path):
+    vectors, documents = [], []
+    with open(path) as f:
+        for line in f:
+            row = json.loads(line)
+            vectors.append(row.pop("vector"))
+            documents.append(row)
+    return InMemoryRetriever(np.array(vectors, dtype=np.float32), documents)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    query = np.random.default_rng(1).standard_normal(args.dim)
+    with tempfile.TemporaryDirectory() as directory:
+        jsonl, store = write_corpus(directory, args.docs, args.dim, args.dtype)
+        print(f"{args.docs} x {args.dim} {args.dtype}: store is {os.path.getsize(store) / 1e6:.0f} MB")
+
+        rows, load = timed(load_jsonl, jsonl)
+        _, first = timed(rows.search_sync, query, 10)
+        print(f"{'json rows':<10} load {load * 1000:9.1f} ms   first query {first * 1000:8.1f} ms")
+
+        mapped, load = timed(InMemoryRetriever.open, store)
+        _, first = timed(mapped.search_sync, query, 10)
+        print(f"{'mmap store':<10} load {load * 1000:9.1f} ms   first query {first * 1000:8.1f} ms")
+        del rows, mapped
+
+
+if __name__ == "__main__":
+    main()
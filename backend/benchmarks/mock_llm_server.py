@@ -0,0 +1,128 @@
+# mock_llm_server.py
+# Local OpenAI-compatible chat completions and embeddings server with fixed
+# latencies, for load testing the backend without calling (or paying for)
+# the real API.
+#
+# Usage (from the backend directory):
+#     python -m benchmarks.mock_llm_server --port 8100 --latency 0.2
+
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+def create_mock_app(latency=0.2, token_latency=0.02, embedding_latency=0.05, embedding_dim=1536):
+    """
+    `latency` is the delay before the first token; answers are then
+    generated at one word every `token_latency` seconds, streamed or not.
+    Embedding requests take `embedding_latency` seconds whatever their size
+    and are counted in `app.state.embedding_calls`.
+    """
+
+    async def stream(answer):
+        for word in answer.split(" "):
+            await asyncio.sleep(token_latency)
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def chat_completions(request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        question = body["messages"][-1]["content"] if body.get("messages") else ""
+        answer = f"Mock answer to: {question}"
+        if body.get("stream"):
+            return StreamingResponse(stream(answer), media_type="text/event-stream")
+        await asyncio.sleep(token_latency * len(answer.split(" ")))
+        return JSONResponse({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+        })
+
+    async def embeddings(request):
+        body = await request.json()
+        request.app.state.embedding_calls += 1
+        await asyncio.sleep(embedding_latency)
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(texts):
+            vector = [0.0] * embedding_dim
+            vector[hash(text) % embedding_dim] = 1.0
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        return JSONResponse({"object": "list", "model": body.get("model"), "data": data})
+
+    app = Starlette(routes=[
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+    ])
+    app.state.embedding_calls = 0
+    return app
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    """
+    Serve an ASGI app with uvicorn on a background thread for the duration
+    of a `with` block.
+    """
+
+    def __init__(self, app, port=None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class MockLLMServer(ServerThread):
+    """
+    The mock completions server on a background thread. `url` is the
+    OpenAI-style base URL (ending in /v1).
+    """
+
+    def __init__(self, latency=0.2, token_latency=0.02, port=None, embedding_latency=0.05):
+        self.app = create_mock_app(latency, token_latency, embedding_latency)
+        super().__init__(self.app, port)
+        self.url += "/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions and embeddings server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per streamed token")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="seconds per embeddings call")
+    args = parser.parse_args()
+    uvicorn.run(create_mock_app(args.latency, args.token_latency, args.embedding_latency), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 # main.py
-# Entry point for your Python backend (FastAPI, Flask, etc.)
+# Entry point for the backend. `main:app` is the ASGI application; run
+#
+#     python main.py
+#
+# to serve it with one worker process per CPU (see app/server.py).
+
+from app.main import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
-    print("Backend entry point. Implement your app logic here.")
+    from app.server import serve
+
+    serve()
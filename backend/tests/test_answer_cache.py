@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import llm_service
+from app.services.answer_cache import (
+    AnswerCache,
+    InMemoryBackend,
+    SemanticIndex,
+    normalize_question,
+)
+from app.services.llm_client import LLMClient
+from app.utils.config import settings
+
+# Toy embeddings: questions about the same service point the same way
+VECTORS = {
+    "lambda": [1.0, 0.0, 0.0],
+    "s3": [0.0, 1.0, 0.0],
+    "ec2": [0.0, 0.0, 1.0],
+}
+
+
+def toy_embedding(text):
+    for word, vector in VECTORS.items():
+        if word in text.lower():
+            return vector
+    return [0.577, 0.577, 0.577]
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.chats = 0
+        self.embeddings = 0
+
+    def __call__(self, request):
+        body = json.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            self.embeddings += 1
+            data = [{"index": i, "embedding": toy_embedding(t)} for i, t in enumerate(body["input"])]
+            return httpx.Response(200, json={"data": data})
+        self.chats += 1
+        question = body["messages"][-1]["content"]
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"About {question}"}}]})
+
+
+@pytest.fixture
+def upstream():
+    upstream = FakeUpstream()
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(upstream))
+    settings.ANSWER_CACHE_ENABLED = True
+    with patch.object(llm_service, "_client", client):
+        yield upstream
+
+
+def test_normalize_question():
+    assert normalize_question("  What is AWS   Lambda?? ") == "what is aws lambda"
+    assert AnswerCache.key("What is AWS Lambda?") == AnswerCache.key("what is aws lambda")
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_ttl_and_lru():
+    backend = InMemoryBackend(max_entries=2)
+    await backend.set("a", {"v": 1}, ttl=60)
+    await backend.set("b", {"v": 2}, ttl=60)
+    assert await backend.get("a") == {"v": 1}
+    await backend.set("c", {"v": 3}, ttl=60)
+    assert await backend.get("b") is None
+    assert len(backend) == 2
+
+    await backend.set("d", {"v": 4}, ttl=0)
+    assert await backend.get("d") is None
+
+
+def test_semantic_index_threshold_and_eviction():
+    index = SemanticIndex(max_entries=2)
+    index.add("lambda", [1.0, 0.0], ttl=60)
+    index.add("s3", [0.0, 1.0], ttl=60)
+
+    assert index.search([0.9, 0.1], threshold=0.95)[0] == "lambda"
+    assert index.search([0.7, 0.7], threshold=0.95) is None
+
+    # "lambda" was just used, so "s3" is the one evicted
+    index.add("ec2", [-1.0, 0.0], ttl=60)
+    assert index.search([0.0, 1.0], threshold=0.95) is None
+    assert index.search([1.0, 0.0], threshold=0.95)[0] == "lambda"
+    assert index.search([-1.0, 0.0], threshold=0.95)[0] == "ec2"
+
+    index.add("old", [0.0, -1.0], ttl=0)
+    assert index.search([0.0, -1.0], threshold=0.95) is None
+
+
+@pytest.mark.asyncio
+async def test_exact_and_semantic_hits(upstream):
+    first = await llm_service.get_answer("What is AWS Lambda?")
+    assert await llm_service.get_answer("what is aws lambda") == first
+    assert await llm_service.get_answer("Explain Lambda functions") == first
+    assert upstream.chats == 1
+
+    await llm_service.get_answer("What is S3?")
+    assert upstream.chats == 2
+
+    stats = llm_service.get_answer_cache().stats
+    assert (stats.exact_hits, stats.semantic_hits, stats.misses) == (1, 1, 2)
+    assert stats.hit_rate == 0.5
+    assert stats.seconds_saved > 0
+
+
+@pytest.mark.asyncio
+async def test_exact_hit_skips_embedding(upstream):
+    await llm_service.get_answer("What is EC2?")
+    embeddings = upstream.embeddings
+    await llm_service.get_answer("What is EC2?")
+    assert upstream.embeddings == embeddings
+
+
+@pytest.mark.asyncio
+async def test_invalidate_on_index_rebuild(upstream):
+    await llm_service.get_answer("What is AWS Lambda?")
+    await llm_service.invalidate_answer_cache()
+    await llm_service.get_answer("What is AWS Lambda?")
+    assert upstream.chats == 2
+
+
+@pytest.mark.asyncio
+async def test_streamed_answers_are_cached(upstream):
+    async def stream_chat(messages):
+        for token in ["Lambda ", "runs ", "code."]:
+            await asyncio.sleep(0)
+            yield token
+
+    with patch.object(llm_service._client, "stream_chat", stream_chat):
+        tokens = [t async for t in llm_service.stream_answer("What is AWS Lambda?")]
+    assert "".join(tokens) == "Lambda runs code."
+
+    assert await llm_service.get_answer("What is AWS Lambda?") == "Lambda runs code."
+    cached = [t async for t in llm_service.stream_answer("Tell me about Lambda")]
+    assert cached == ["Lambda runs code."]
+    assert upstream.chats == 0
+
+
+@pytest.mark.asyncio
+async def test_embedding_failure_still_answers(upstream):
+    def chat_only(request):
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(500)
+        return upstream(request)
+
+    llm_service._client.http._transport = httpx.MockTransport(chat_only)
+    assert await llm_service.get_answer("What is S3?") == "About What is S3?"
+    assert await llm_service.get_answer("What is S3?") == "About What is S3?"
+    assert upstream.chats == 1
@@ -1,12 +1,43 @@
+import httpx
+import pytest
+from unittest.mock import patch
 from fastapi.testclient import TestClient
+
+from app.services import llm_service
+from app.services.llm_client import LLMClient
 from main import app
 
-client = TestClient(app)
 
-def test_chat_endpoint():
+def fake_upstream(request):
+    if request.url.path.endswith("/embeddings"):
+        return httpx.Response(200, json={"data": [{"index": 0, "embedding": [0.1, 0.2, 0.3]}]})
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": "A compute service."}}]})
+
+
+@pytest.fixture
+def client():
+    llm = LLMClient(api_key="test-key", transport=httpx.MockTransport(fake_upstream))
+    with patch.object(llm_service, "_client", llm):
+        # Entering the client runs the app's startup and shutdown
+        with TestClient(app) as client:
+            yield client
+
+
+def test_chat_endpoint(client):
     response = client.post(
         "/chat",
         json={"question": "What is AWS Lambda?"}
     )
     assert response.status_code == 200
     assert "response" in response.json()
+
+
+def test_lifespan_warms_up_and_closes_shared_services():
+    llm = LLMClient(api_key="test-key", transport=httpx.MockTransport(fake_upstream))
+    with patch.object(llm_service, "_client", llm):
+        with TestClient(app):
+            assert llm_service._client is llm
+            assert llm_service._history is not None
+            assert llm_service._prompt_builder is not None
+        assert llm_service._client is None
+        assert llm_service._history is None
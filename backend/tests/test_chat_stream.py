@@ -0,0 +1,149 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import chat
+from app.services import llm_service
+from app.services.llm_client import LLMClient, LLMError
+
+
+def sse_chunk(content):
+    return f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': content}}]})}\n\n".encode()
+
+
+def streaming_client(tokens, delay=0.0):
+    """
+    LLMClient whose upstream streams `tokens` with `delay` seconds before each.
+    """
+    async def body():
+        for token in tokens:
+            await asyncio.sleep(delay)
+            yield sse_chunk(token)
+        yield b"data: [DONE]\n\n"
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+
+    return LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+
+
+def parse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_yields_tokens():
+    client = streaming_client(["Lambda ", "is ", "serverless."])
+    tokens = [token async for token in client.stream_chat([])]
+    await client.aclose()
+    assert "".join(tokens) == "Lambda is serverless."
+
+
+@pytest.mark.asyncio
+async def test_time_to_first_token():
+    client = streaming_client(["t"] * 10, delay=0.02)
+    with patch.object(llm_service, "_client", client):
+        start = time.perf_counter()
+        first = None
+        async for _ in llm_service.stream_answer("What is S3?"):
+            if first is None:
+                first = time.perf_counter() - start
+        total = time.perf_counter() - start
+
+    assert first < total / 3
+
+
+@pytest.mark.asyncio
+async def test_malformed_stream_raises():
+    def handler(request):
+        return httpx.Response(200, content=b"data: not-json\n\n")
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    with pytest.raises(LLMError):
+        [token async for token in client.stream_chat([])]
+
+
+def test_stream_endpoint_sends_sse_events():
+    app = FastAPI()
+    app.include_router(chat.router)
+    with patch.object(llm_service, "_client", streaming_client(["Hello ", "AWS"])):
+        response = TestClient(app).post("/chat/stream", json={"question": "Hi"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert parse_events(response.text) == [
+        (None, {"token": "Hello "}),
+        (None, {"token": "AWS"}),
+        ("done", {}),
+    ]
+
+
+def test_stream_endpoint_reports_upstream_errors():
+    async def failing(question, session_id=None):
+        yield "partial"
+        raise LLMError("boom")
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    with patch.object(chat, "stream_answer", failing):
+        response = TestClient(app).post("/chat/stream", json={"question": "Hi"})
+    assert parse_events(response.text)[-1] == ("error", {"detail": "LLM request failed"})
+
+
+class FakeUpstream:
+    def __init__(self):
+        self.closed = False
+        self.produced = 0
+
+    async def stream(self, question, session_id=None):
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                self.produced += 1
+                yield "token "
+        finally:
+            self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_upstream():
+    upstream = FakeUpstream()
+    received = asyncio.Event()
+
+    async def client():
+        async for _ in chat.sse_answer("What is EC2?"):
+            received.set()
+
+    with patch.object(chat, "stream_answer", upstream.stream):
+        task = asyncio.create_task(client())
+        await received.wait()
+        # What Starlette does when the client goes away
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert upstream.closed
+    produced = upstream.produced
+    await asyncio.sleep(0.05)
+    assert upstream.produced == produced
+
+
+@pytest.mark.asyncio
+async def test_closing_stream_early_closes_upstream():
+    upstream = FakeUpstream()
+    with patch.object(chat, "stream_answer", upstream.stream):
+        events = chat.sse_answer("What is EC2?")
+        await events.__anext__()
+        await events.aclose()
+    assert upstream.closed
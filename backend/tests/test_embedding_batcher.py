@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import llm_service
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.llm_client import LLMClient, LLMError
+
+
+def recording_embedder(calls, delay=0.0):
+    async def embed(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(delay)
+        return [[float(len(text))] for text in texts]
+    return embed
+
+
+@pytest.mark.asyncio
+async def test_concurrent_texts_share_one_call():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embedder(calls), max_batch=10, max_wait=0.01)
+    results = await asyncio.gather(*(batcher.embed("x" * n) for n in range(1, 6)))
+    assert results == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert len(calls) == 1
+    assert batcher.stats.as_dict() == {"requests": 5, "batches": 1, "mean_batch_size": 5.0}
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_without_waiting():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embedder(calls), max_batch=3, max_wait=10)
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.embed(str(n)) for n in range(6))), 1)
+    assert len(results) == 6
+    assert [len(batch) for batch in calls] == [3, 3]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_texts_are_embedded_once():
+    calls = []
+    batcher = EmbeddingBatcher(recording_embedder(calls))
+    results = await asyncio.gather(batcher.embed("s3"), batcher.embed("s3"), batcher.embed("ec2"))
+    assert results == [[2.0], [2.0], [3.0]]
+    assert calls == [["s3", "ec2"]]
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    async def fail(texts):
+        raise LLMError("upstream down")
+
+    batcher = EmbeddingBatcher(fail)
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, LLMError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_query_embeddings_are_batched_upstream():
+    inputs = []
+
+    def handler(request):
+        texts = json.loads(request.content)["input"]
+        inputs.append(texts)
+        return httpx.Response(200, json={"data": [{"index": i, "embedding": [float(i)]} for i in range(len(texts))]})
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    with patch.object(llm_service, "_client", client):
+        embeddings = await asyncio.gather(*(llm_service.embed_query(f"question {n}") for n in range(4)))
+    assert embeddings == [[0.0], [1.0], [2.0], [3.0]]
+    assert inputs == [[f"question {n}" for n in range(4)]]
@@ -0,0 +1,182 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import llm_service
+from app.services.history import ConversationHistory, InMemoryHistoryStore, PostgresHistoryStore
+from app.services.llm_client import LLMClient, LLMError
+from app.utils.tokens import estimate_tokens, messages_tokens
+
+
+class CountingStore(InMemoryHistoryStore):
+    def __init__(self):
+        super().__init__()
+        self.loads = 0
+
+    async def load(self, session_id, limit):
+        self.loads += 1
+        return await super().load(session_id, limit)
+
+
+async def fake_summarize(summary, messages):
+    return (summary + " " if summary else "") + " / ".join(m["content"][:10] for m in messages)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1 and estimate_tokens("abcde") == 2
+
+
+@pytest.mark.asyncio
+async def test_context_returns_recent_turns_in_order():
+    history = ConversationHistory(InMemoryHistoryStore())
+    await history.record("s1", "What is S3?", "Object storage.")
+    await history.record("s1", "Is it durable?", "Eleven nines.")
+    await history.record("s2", "What is EC2?", "Virtual servers.")
+
+    context = await history.context("s1")
+    assert [m["content"] for m in context] == ["What is S3?", "Object storage.", "Is it durable?", "Eleven nines."]
+    assert [m["role"] for m in context] == ["user", "assistant", "user", "assistant"]
+    assert await history.context("new") == []
+
+
+@pytest.mark.asyncio
+async def test_context_is_truncated_to_the_budget():
+    history = ConversationHistory(InMemoryHistoryStore(), token_budget=100)
+    for n in range(20):
+        await history.record("s", f"question {n} " + "x" * 80, f"answer {n} " + "y" * 80)
+
+    context = await history.context("s")
+    assert messages_tokens(context) <= 100
+    assert context[-1]["content"].startswith("answer 19")
+
+
+@pytest.mark.asyncio
+async def test_hot_cache_avoids_store_reads():
+    store = CountingStore()
+    history = ConversationHistory(store, hot_sessions=1)
+    await history.record("a", "q", "a")
+    await history.context("a")
+    await history.context("a")
+    assert store.loads == 1
+
+    await history.context("b")
+    await history.context("a")
+    assert store.loads == 3
+    # Evicted sessions come back from the store intact
+    assert [m["content"] for m in await history.context("a")] == ["q", "a"]
+
+
+@pytest.mark.asyncio
+async def test_long_conversations_are_summarized():
+    store = InMemoryHistoryStore()
+    history = ConversationHistory(store, summarize=fake_summarize, token_budget=200)
+    for n in range(10):
+        await history.record("s", f"question {n} " + "x" * 100, f"answer {n} " + "y" * 100)
+        await asyncio.gather(*history.compacting.values())
+
+    context = await history.context("s")
+    assert context[0]["role"] == "system" and "question 0" in context[0]["content"]
+    assert messages_tokens(context) <= 200
+    assert context[-1]["content"].startswith("answer 9")
+    # The summary is persisted with the store
+    summary, upto = store.summaries["s"]
+    reloaded = ConversationHistory(store, token_budget=200)
+    assert (await reloaded.context("s"))[0]["content"].endswith(summary)
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_keeps_truncating():
+    async def fail(summary, messages):
+        raise LLMError("down")
+
+    history = ConversationHistory(InMemoryHistoryStore(), summarize=fail, token_budget=100)
+    for n in range(5):
+        await history.record("s", "q" * 200, "a" * 200)
+        await asyncio.gather(*history.compacting.values())
+    context = await history.context("s")
+    assert messages_tokens(context) <= 100
+
+
+@pytest.mark.asyncio
+async def test_sessions_are_revalidated_across_workers():
+    store = CountingStore()
+    first, second = ConversationHistory(store), ConversationHistory(store)
+    await first.record("s", "What is S3?", "Object storage.")
+    assert len(await second.context("s")) == 2
+    await second.record("s", "Is it durable?", "Eleven nines.")
+
+    loads = store.loads
+    assert [m["content"] for m in await first.context("s")][-1] == "Eleven nines."
+    assert store.loads == loads + 1
+    await first.context("s")
+    assert store.loads == loads + 1
+
+
+@pytest.mark.asyncio
+async def test_compaction_folds_turns_from_other_workers():
+    store = InMemoryHistoryStore()
+    first = ConversationHistory(store, summarize=fake_summarize, token_budget=200)
+    second = ConversationHistory(store, token_budget=200)
+    await first.record("s", "question 0 " + "x" * 150, "answer 0 " + "y" * 150)
+    # Appended by another worker after the first one cached the session
+    await second.record("s", "question 1 " + "x" * 150, "answer 1 " + "y" * 150)
+    await second.record("s", "question 2 " + "x" * 150, "answer 2 " + "y" * 150)
+    await first.compact("s")
+
+    summary, upto = store.summaries["s"]
+    assert "question 1" in summary and "question 2" not in summary
+    assert (await store.load("s", 100)).messages[0][1]["content"].startswith("question 2")
+    # A compaction based on an outdated summary is not saved
+    assert not await store.save_summary("s", "stale", upto + 10, 0)
+    assert store.summaries["s"] == (summary, upto)
+
+
+@pytest.mark.asyncio
+async def test_store_errors_do_not_fail_answers():
+    class BrokenStore(InMemoryHistoryStore):
+        async def load(self, session_id, limit):
+            raise ConnectionError("database is down")
+
+        async def append(self, session_id, messages):
+            raise ConnectionError("database is down")
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})))
+    history = ConversationHistory(BrokenStore())
+    assert await history.context("s") == []
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "_history", history):
+        assert await llm_service.get_answer("What is S3?", session_id="s") == "ok"
+
+
+def test_postgres_store_requires_asyncpg():
+    try:
+        import asyncpg  # noqa: F401
+    except ImportError:
+        with pytest.raises(RuntimeError):
+            PostgresHistoryStore("postgresql://localhost/test")
+    else:
+        pytest.skip("asyncpg is installed")
+
+
+@pytest.mark.asyncio
+async def test_follow_up_questions_include_earlier_turns():
+    prompts = []
+
+    def handler(request):
+        messages = json.loads(request.content)["messages"]
+        prompts.append(messages)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"answer {len(prompts)}"}}]})
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    history = ConversationHistory(InMemoryHistoryStore())
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "_history", history):
+        assert await llm_service.get_answer("What is S3?", session_id="s") == "answer 1"
+        assert await llm_service.get_answer("How much does it cost?", session_id="s") == "answer 2"
+        await llm_service.get_answer("What is S3?")
+
+    assert [m["content"] for m in prompts[1][1:]] == ["What is S3?", "answer 1", "How much does it cost?"]
+    assert len(prompts[2]) == 2
@@ -1,6 +1,115 @@
+import asyncio
+
+import httpx
 import pytest
 from unittest.mock import Mock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes.chat import router
+from app.services import llm_service
+from app.services.llm_client import LLMClient, LLMError, LLMTimeout
+
+
+def completion(content):
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def make_client(handler, **kwargs):
+    return LLMClient(api_key="test-key", transport=httpx.MockTransport(handler), **kwargs)
+
 
 def test_placeholder():
     # Add your LLM chain tests here
     assert True
+
+
+@pytest.mark.asyncio
+async def test_chat_returns_assistant_message():
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(200, json=completion("Lambda runs code without servers."))
+
+    client = make_client(handler, model="test-model")
+    answer = await client.chat([{"role": "user", "content": "What is AWS Lambda?"}])
+    await client.aclose()
+
+    assert answer == "Lambda runs code without servers."
+    assert seen[0].url.path.endswith("/chat/completions")
+    assert seen[0].headers["authorization"] == "Bearer test-key"
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json=completion("ok"))
+
+    client = make_client(handler, max_concurrency=3)
+    answers = await asyncio.gather(*(client.chat([]) for _ in range(10)))
+    await client.aclose()
+
+    assert answers == ["ok"] * 10
+    assert peak == 3
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_raise_llm_error():
+    def timeout(request):
+        raise httpx.ReadTimeout("slow", request=request)
+
+    client = make_client(timeout)
+    with pytest.raises(LLMTimeout):
+        await client.chat([])
+
+    client = make_client(lambda request: httpx.Response(500))
+    with pytest.raises(LLMError):
+        await client.chat([])
+
+    client = make_client(lambda request: httpx.Response(200, json={"choices": []}))
+    with pytest.raises(LLMError):
+        await client.chat([])
+
+
+def chat_app():
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def test_chat_route_awaits_answer():
+    async def get_answer(question, session_id=None):
+        await asyncio.sleep(0)
+        return f"Answer to {question}"
+
+    with patch("app.routes.chat.get_answer", get_answer):
+        response = TestClient(chat_app()).post("/chat", json={"question": "What is S3?"})
+    assert response.status_code == 200
+    assert response.json() == {"response": "Answer to What is S3?"}
+
+
+def test_chat_route_maps_upstream_errors():
+    async def get_answer(question, session_id=None):
+        raise LLMTimeout("slow")
+
+    with patch("app.routes.chat.get_answer", get_answer):
+        response = TestClient(chat_app()).post("/chat", json={"question": "What is S3?"})
+    assert response.status_code == 504
+
+
+@pytest.mark.asyncio
+async def test_get_answer_uses_shared_client():
+    client = make_client(lambda request: httpx.Response(200, json=completion("shared")))
+    with patch.object(llm_service, "_client", client):
+        assert llm_service.get_llm_client() is client
+        assert await llm_service.get_answer("What is EC2?") == "shared"
+        await llm_service.close_llm_client()
+        assert llm_service._client is None
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.services import llm_service
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.llm_client import LLMClient, LLMError
+from app.services.single_flight import SingleFlight
+from app.utils.config import settings
+from main import app
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def stage_count(stage):
+    return sample("chat_stage_seconds_count", stage=stage)
+
+
+def upstream(request):
+    payload = json.loads(request.content)
+    if request.url.path.endswith("/embeddings"):
+        return httpx.Response(200, json={"data": [{"index": 0, "embedding": [1.0, 0.1, 0.0]}]})
+    if payload.get("stream"):
+        body = "".join(f"data: {json.dumps({'choices': [{'delta': {'content': t}}]})}\n\n" for t in ("A ", "service."))
+        return httpx.Response(200, content=body + "data: [DONE]\n\n", headers={"content-type": "text/event-stream"})
+    return httpx.Response(200, json={"choices": [{"message": {"role": "assistant", "content": "A service."}}]})
+
+
+@pytest.fixture
+def llm():
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(upstream))
+    with patch.object(llm_service, "_client", client):
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_each_stage_is_timed(llm, mock_vector_store):
+    stages = ("embedding", "retrieval", "rerank", "prompt", "llm")
+    before = {stage: stage_count(stage) for stage in stages}
+    requests = sample("chat_request_seconds_count", endpoint="chat", outcome="ok")
+    saved = settings.RERANK_ENABLED
+    settings.RERANK_ENABLED = True
+    try:
+        with patch.object(llm_service, "_retriever", mock_vector_store):
+            assert await llm_service.get_answer("What is AWS Lambda?") == "A service."
+    finally:
+        settings.RERANK_ENABLED = saved
+    assert {stage: stage_count(stage) - before[stage] for stage in stages} == dict.fromkeys(stages, 1)
+    assert sample("chat_request_seconds_count", endpoint="chat", outcome="ok") == requests + 1
+
+
+@pytest.mark.asyncio
+async def test_time_to_first_token_is_observed_once_per_stream(llm):
+    before = sample("chat_time_to_first_token_seconds_count")
+    tokens = [token async for token in llm_service.stream_answer("What is S3?")]
+    assert tokens == ["A ", "service."]
+    assert sample("chat_time_to_first_token_seconds_count") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_cache_lookups_are_counted_by_result(llm):
+    settings.ANSWER_CACHE_ENABLED = True
+    before = {result: sample("chat_cache_lookups_total", result=result) for result in ("miss", "exact_hit")}
+    await llm_service.get_answer("What is Amazon S3?")
+    await llm_service.get_answer("what is amazon s3")
+    assert sample("chat_cache_lookups_total", result="miss") == before["miss"] + 1
+    assert sample("chat_cache_lookups_total", result="exact_hit") == before["exact_hit"] + 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_are_counted():
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    errors = sample("chat_upstream_errors_total", upstream="llm", operation="chat", kind="error")
+    failed = sample("chat_request_seconds_count", endpoint="chat", outcome="error")
+    with patch.object(llm_service, "_client", client):
+        with pytest.raises(LLMError):
+            await llm_service.get_answer("What is EC2?")
+    assert sample("chat_upstream_errors_total", upstream="llm", operation="chat", kind="error") == errors + 1
+    assert sample("chat_request_seconds_count", endpoint="chat", outcome="error") == failed + 1
+
+
+@pytest.mark.asyncio
+async def test_coalesced_requests_and_batch_sizes_are_recorded():
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def embed(texts):
+        return [[1.0] for _ in texts]
+
+    coalesced = sample("chat_coalesced_requests_total")
+    flight = SingleFlight()
+    await asyncio.gather(*(flight.do("q", compute) for _ in range(3)))
+    assert sample("chat_coalesced_requests_total") == coalesced + 2
+
+    batches, sizes = sample("chat_embedding_batch_size_count"), sample("chat_embedding_batch_size_sum")
+    batcher = EmbeddingBatcher(embed, max_batch=4, max_wait=10)
+    await asyncio.gather(*(batcher.embed(str(n)) for n in range(4)))
+    assert sample("chat_embedding_batch_size_count") == batches + 1
+    assert sample("chat_embedding_batch_size_sum") == sizes + 4
+
+
+def test_metrics_endpoint(llm):
+    with TestClient(app) as client:
+        client.post("/chat", json={"question": "What is AWS Lambda?"})
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'chat_stage_seconds_count{stage="llm"}' in response.text
+    assert "chat_request_seconds_bucket" in response.text
@@ -0,0 +1,64 @@
+from app.retrieval.base import SearchResult
+from app.services.prompt_builder import PromptBuilder, jaccard, shingles
+from app.utils.tokens import count_tokens, estimate_tokens
+
+
+def doc(id, content, score):
+    return SearchResult(id=id, score=score, content=content, title=id, url=f"https://docs.aws.amazon.com/{id}")
+
+
+LAMBDA = ("AWS Lambda runs your code without provisioning servers. You pay only for compute time. "
+          "Functions can be triggered by S3 events. Lambda scales automatically with requests.")
+
+
+def test_count_tokens_is_memoized():
+    count_tokens.cache_clear()
+    assert count_tokens("What is AWS Lambda?") == count_tokens("What is AWS Lambda?") > 0
+    assert count_tokens.cache_info().hits == 1
+
+
+def test_near_duplicates_are_detected():
+    a = shingles(LAMBDA)
+    assert jaccard(a, shingles(LAMBDA + " More.")) > 0.9
+    assert jaccard(a, shingles("Amazon S3 stores objects in buckets across availability zones.")) == 0
+
+
+def test_pack_keeps_best_chunks_within_budget():
+    documents = [doc(f"d{i}", f"chunk {i} " + "word " * 100, score=i / 10) for i in range(10)]
+    builder = PromptBuilder("system", context_tokens=300)
+    packed = builder.pack("question", documents)
+    assert [d.id for d in packed] == ["d9", "d8"]
+    used = sum(count_tokens(f"{d.title} ({d.url})\n{d.content}") + 4 for d in packed)
+    assert used <= 300
+
+
+def test_pack_skips_near_duplicates():
+    documents = [doc("a", LAMBDA, 0.9), doc("b", LAMBDA + " Extra.", 0.8), doc("c", "Amazon S3 stores objects.", 0.7)]
+    packed = PromptBuilder("system").pack("What is Lambda?", documents)
+    assert [d.id for d in packed] == ["a", "c"]
+
+
+def test_pack_fills_gaps_with_smaller_chunks():
+    documents = [doc("big", "word " * 400, 0.9), doc("small", "AWS Lambda is serverless.", 0.5)]
+    packed = PromptBuilder("system", context_tokens=100).pack("question", documents)
+    assert [d.id for d in packed] == ["small"]
+
+
+def test_compression_keeps_relevant_sentences_in_order():
+    builder = PromptBuilder("system", compress=True, compress_tokens=15)
+    compressed = builder.compress_chunk("What do I pay for with Lambda compute?", LAMBDA)
+    assert "pay only for compute time" in compressed
+    assert estimate_tokens(compressed) < estimate_tokens(LAMBDA)
+    assert builder.compress_chunk("anything", "Short chunk.") == "Short chunk."
+
+
+def test_build_messages_layout():
+    builder = PromptBuilder("You are an AWS tutor.")
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello"}]
+    messages = builder.build("What is Lambda?", [doc("lambda", LAMBDA, 0.9)], history)
+    assert messages[0]["content"].startswith("You are an AWS tutor.\n\nUse these AWS documentation excerpts")
+    assert "[1] lambda (https://docs.aws.amazon.com/lambda)\nAWS Lambda runs" in messages[0]["content"]
+    assert messages[1:3] == history and messages[-1] == {"role": "user", "content": "What is Lambda?"}
+    assert builder.build("Hi") == [{"role": "system", "content": "You are an AWS tutor."},
+                                   {"role": "user", "content": "Hi"}]
+    assert builder.prompt_tokens(messages) > count_tokens(LAMBDA)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.retrieval.memory import InMemoryRetriever
+from app.retrieval.quantization import Int8Quantizer, ProductQuantizer, create_quantizer
+from app.retrieval.store import EmbeddingStore, write_store
+
+
+def clustered_corpus(n=2000, dim=32, clusters=50, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    documents = [{"chunk_id": str(i)} for i in range(n)]
+    return embeddings, documents
+
+
+def recall(retriever, exact, queries, k=10):
+    hits = []
+    for query in queries:
+        expected = {r.id for r in exact.search_sync(query, k)}
+        hits.append(len(expected & {r.id for r in retriever.search_sync(query, k)}) / k)
+    return float(np.mean(hits))
+
+
+def test_int8_codes_approximate_dot_products():
+    embeddings, _ = clustered_corpus()
+    quantizer = Int8Quantizer()
+    codes = quantizer.encode(embeddings)
+    assert codes.dtype == np.int8 and codes.shape == embeddings.shape
+
+    query = embeddings[3]
+    np.testing.assert_allclose(quantizer.scores(codes, query), embeddings @ query, rtol=0.05, atol=0.5)
+
+
+def test_pq_codes_are_one_byte_per_subspace():
+    embeddings, _ = clustered_corpus()
+    quantizer = ProductQuantizer(subspaces=8)
+    codes = quantizer.encode(embeddings)
+    assert codes.dtype == np.uint8 and codes.shape == (len(embeddings), 8)
+    assert quantizer.scores(codes, embeddings[0]).shape == (len(embeddings),)
+
+    with pytest.raises(ValueError):
+        ProductQuantizer(subspaces=5).encode(embeddings)
+
+
+def test_unknown_quantization():
+    assert create_quantizer("none") is None
+    with pytest.raises(ValueError):
+        create_quantizer("int4")
+
+
+@pytest.mark.parametrize("quantization,rerank,minimum", [
+    ("float16", 0, 0.99),
+    ("int8", 0, 0.9),
+    ("int8", 50, 0.99),
+    ("pq", 100, 0.95),
+])
+def test_quantized_recall(quantization, rerank, minimum):
+    embeddings, documents = clustered_corpus()
+    exact = InMemoryRetriever(embeddings, documents)
+    quantized = InMemoryRetriever(embeddings, documents, quantization=quantization, pq_subspaces=8, rerank=rerank)
+    queries = np.random.default_rng(1).standard_normal((20, 32)) + embeddings[:20]
+    assert recall(quantized, exact, queries) >= minimum
+
+
+def test_rerank_returns_exact_scores():
+    embeddings, documents = clustered_corpus()
+    exact = InMemoryRetriever(embeddings, documents)
+    quantized = InMemoryRetriever(embeddings, documents, quantization="pq", pq_subspaces=8)
+    query = embeddings[5]
+    expected = {r.id: r.score for r in exact.search_sync(query, 5)}
+    for result in quantized.search_sync(query, 5):
+        assert result.score == pytest.approx(expected[result.id])
+
+
+def test_quantized_ivf_over_store(tmp_path):
+    embeddings, documents = clustered_corpus()
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents)
+    exact = InMemoryRetriever(embeddings, documents)
+    retriever = InMemoryRetriever.open(path, quantization="int8", ivf_lists=16, ivf_probes=16)
+    queries = embeddings[:10] + 0.1
+    assert recall(retriever, exact, queries) >= 0.99
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq"])
+def test_codes_written_with_the_store_are_mapped(tmp_path, quantization):
+    embeddings, documents = clustered_corpus()
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents, quantization=quantization, pq_subspaces=8)
+    built = InMemoryRetriever(embeddings, documents, quantization=quantization, pq_subspaces=8)
+
+    with patch.object(type(built.quantizer), "encode", side_effect=AssertionError("encoded at open")):
+        retriever = InMemoryRetriever.open(path, quantization=quantization, pq_subspaces=8)
+    assert not retriever.codes.flags["OWNDATA"] and not retriever.codes.flags["WRITEABLE"]
+    np.testing.assert_array_equal(retriever.codes, built.codes)
+    query = embeddings[7]
+    assert [r.id for r in retriever.search_sync(query, 5)] == [r.id for r in built.search_sync(query, 5)]
+
+
+def test_codes_are_encoded_when_the_store_settings_differ(tmp_path):
+    embeddings, documents = clustered_corpus(n=300)
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents, quantization="pq", pq_subspaces=8)
+    assert EmbeddingStore(path).quantized("pq", 4) == (None, None)
+
+    retriever = InMemoryRetriever.open(path, quantization="pq", pq_subspaces=4)
+    assert retriever.codes.shape == (300, 4) and retriever.codes.flags["OWNDATA"]
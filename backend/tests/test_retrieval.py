@@ -0,0 +1,208 @@
+import json
+
+import httpx
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.retrieval.ivf import IVFIndex, top_k
+from app.retrieval.memory import InMemoryRetriever
+from app.retrieval.weaviate_backend import WeaviateRetriever
+from app.services import llm_service
+from app.services.llm_client import LLMClient
+
+
+def random_corpus(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    documents = [{"chunk_id": str(i), "content": f"chunk {i}"} for i in range(n)]
+    return embeddings, documents
+
+
+def exact_ids(embeddings, query, k):
+    normed = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return [str(i) for i in np.argsort(-(normed @ (query / np.linalg.norm(query))))[:k]]
+
+
+def test_top_k():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert list(top_k(scores, 2)) == [1, 3]
+    assert list(top_k(scores, 10)) == [1, 3, 2, 0]
+    assert list(top_k(scores, 0)) == []
+
+
+def test_brute_force_matches_exact_search():
+    embeddings, documents = random_corpus()
+    retriever = InMemoryRetriever(embeddings, documents)
+    query = embeddings[7] + 0.1
+
+    results = retriever.search_sync(query, k=10)
+    assert [r.id for r in results] == exact_ids(embeddings, query, 10)
+    assert results[0].score >= results[-1].score
+    assert retriever.matrix.dtype == np.float32 and retriever.matrix.flags["C_CONTIGUOUS"]
+
+
+def test_ivf_recall():
+    embeddings, documents = random_corpus()
+    full = InMemoryRetriever(embeddings, documents, ivf_lists=16, ivf_probes=16)
+    partial = InMemoryRetriever(embeddings, documents, ivf_lists=16, ivf_probes=4)
+
+    rng = np.random.default_rng(1)
+    recall = []
+    for query in rng.standard_normal((20, 32)):
+        expected = exact_ids(embeddings, query, 10)
+        # Probing every list is exact
+        assert [r.id for r in full.search_sync(query, 10)] == expected
+        found = {r.id for r in partial.search_sync(query, 10)}
+        recall.append(len(found & set(expected)) / 10)
+    assert np.mean(recall) > 0.3
+
+
+def test_ivf_lists_cover_every_row():
+    embeddings, _ = random_corpus(n=500)
+    matrix = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    index = IVFIndex.build(matrix, n_lists=8)
+    assert sorted(index.rows) == list(range(500))
+    assert index.offsets[0] == 0 and index.offsets[-1] == 500
+
+
+def test_mismatched_documents_raise():
+    with pytest.raises(ValueError):
+        InMemoryRetriever(np.zeros((2, 3)), [{}])
+
+
+@pytest.mark.asyncio
+async def test_weaviate_retriever_parses_graphql():
+    queries = []
+
+    def handler(request):
+        queries.append(json.loads(request.content)["query"])
+        return httpx.Response(200, json={"data": {"Get": {"AWSDocument": [
+            {"title": "Lambda", "content": "Runs code.", "url": "u", "section": "s", "chunk_id": "u#s/0",
+             "_additional": {"id": "uuid-1", "distance": 0.25}},
+        ]}}})
+
+    retriever = WeaviateRetriever("http://weaviate:8080", transport=httpx.MockTransport(handler))
+    results = await retriever.search([0.1, 0.2], k=3)
+    await retriever.close()
+
+    assert "nearVector: {vector: [0.1, 0.2]}, limit: 3" in queries[0]
+    assert results[0].id == "u#s/0" and results[0].score == 0.75
+
+
+@pytest.mark.asyncio
+async def test_weaviate_errors_raise():
+    def handler(request):
+        return httpx.Response(200, json={"errors": [{"message": "no such class"}]})
+
+    retriever = WeaviateRetriever("http://weaviate:8080", transport=httpx.MockTransport(handler))
+    with pytest.raises(RuntimeError):
+        await retriever.search([0.1], k=1)
+
+
+@pytest.mark.asyncio
+async def test_answer_uses_retrieved_context(mock_vector_store):
+    prompts = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(200, json={"data": [{"index": 0, "embedding": [0.0, 1.0, 0.0]}]})
+        prompts.append(body["messages"][0]["content"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": "S3 stores objects."}}]})
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "_retriever", mock_vector_store):
+        assert await llm_service.get_answer("What is S3?") == "S3 stores objects."
+
+    assert "Amazon S3 is object storage." in prompts[0]
+    assert prompts[0].index("What is Amazon S3?") < prompts[0].index("What is AWS Lambda?")
+
+
+@pytest.mark.asyncio
+async def test_retrieval_failure_answers_without_context(mock_vector_store):
+    prompts = []
+
+    def handler(request):
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(503)
+        prompts.append(json.loads(request.content)["messages"][0]["content"])
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "_retriever", mock_vector_store):
+        assert await llm_service.get_answer("What is S3?") == "ok"
+    assert prompts == [llm_service.SYSTEM_PROMPT]
+
+
+@pytest.mark.asyncio
+async def test_broken_index_answers_without_context(tmp_path, mock_vector_store):
+    from app.utils.config import settings
+
+    def handler(request):
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(200, json={"data": [{"index": 0, "embedding": [1.0, 0.1, 0.0]}]})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    async def fail(*args):
+        raise ValueError("shapes (3,) and (4,) not aligned")
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "_retriever", mock_vector_store), \
+            patch.object(mock_vector_store, "search", fail):
+        assert await llm_service.get_answer("What is S3?") == "ok"
+
+    # A store truncated while it is being rebuilt
+    path = tmp_path / "index.emb"
+    path.write_bytes(b"AWSEMB")
+    settings.RETRIEVER_BACKEND = "memory"
+    settings.RETRIEVER_INDEX_PATH = str(path)
+    with patch.object(llm_service, "_client", client):
+        assert await llm_service.get_answer("What is EC2?") == "ok"
+
+
+@pytest.mark.asyncio
+async def test_reload_retriever_invalidates_answers(tmp_path, mock_vector_store):
+    from app.utils.config import settings
+
+    path = str(tmp_path / "index.emb")
+    mock_vector_store.save(path)
+    settings.RETRIEVER_BACKEND = "memory"
+    settings.RETRIEVER_INDEX_PATH = path
+    settings.ANSWER_CACHE_ENABLED = True
+
+    old = llm_service.get_retriever()
+    cache = llm_service.get_answer_cache()
+    await cache.set("What is S3?", "cached", [0.0, 1.0, 0.0])
+
+    await llm_service.reload_retriever()
+    assert llm_service.get_retriever() is not old
+    assert len(llm_service.get_retriever()) == len(mock_vector_store)
+    assert await cache.get_exact("What is S3?") is None
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_index_is_reloaded(tmp_path, mock_vector_store):
+    from app.utils.config import settings
+
+    path = str(tmp_path / "index.emb")
+    mock_vector_store.save(path)
+    settings.RETRIEVER_BACKEND = "memory"
+    settings.RETRIEVER_INDEX_PATH = path
+    settings.ANSWER_CACHE_ENABLED = True
+
+    old = llm_service.get_retriever()
+    cache = llm_service.get_answer_cache()
+    await cache.set("What is S3?", "cached", [0.0, 1.0, 0.0])
+    llm_service._index_checked = float("-inf")
+    await llm_service.check_index()
+    assert llm_service.get_retriever() is old
+
+    # The index is rebuilt by another process
+    mock_vector_store.save(path)
+    await llm_service.check_index()
+    assert llm_service.get_retriever() is old
+    llm_service._index_checked = float("-inf")
+    await llm_service.check_index()
+    assert llm_service.get_retriever() is not old
+    assert await cache.get_exact("What is S3?") is None
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from unittest.mock import patch
+
+from app.services import llm_service
+from app.services.llm_client import LLMClient
+from app.services.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(flight.do("q", compute) for _ in range(5)))
+    assert results == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats.as_dict() == {"leaders": 1, "coalesced": 4}
+    assert len(flight) == 0
+
+    # Once finished, the next call computes again
+    assert await flight.do("q", compute) == "answer" and calls == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream")
+
+    results = await asyncio.gather(*(flight.do("q", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_keeps_the_others():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def compute():
+        started.set()
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    first = asyncio.ensure_future(flight.do("q", compute))
+    second = asyncio.ensure_future(flight.do("q", compute))
+    await started.wait()
+    first.cancel()
+    assert await second == "answer"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_computation_is_cancelled_with_its_last_caller():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def compute():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(flight.do("q", compute))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_identical_questions_make_one_llm_call():
+    requests = []
+
+    async def handler(request):
+        requests.append(json.loads(request.content))
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Lambda runs code."}}]})
+
+    client = LLMClient(api_key="test-key", transport=httpx.MockTransport(handler))
+    flight = SingleFlight()
+    with patch.object(llm_service, "_client", client), patch.object(llm_service, "single_flight", flight):
+        answers = await asyncio.gather(
+            llm_service.get_answer("What is AWS Lambda?"),
+            llm_service.get_answer("what is aws lambda"),
+            llm_service.get_answer("What is AWS Lambda?"),
+            llm_service.get_answer("What is Amazon S3?"),
+        )
+    assert answers == ["Lambda runs code."] * 4
+    assert len(requests) == 2
+    assert flight.stats.coalesced == 2
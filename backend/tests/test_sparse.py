@@ -0,0 +1,93 @@
+import pytest
+
+from app.retrieval.base import SearchResult
+from app.retrieval.hybrid import HybridRetriever, rrf_fuse
+from app.retrieval.sparse import SparseIndex, SparseIndexBuilder, tokenize
+
+DOCUMENTS = [
+    ("iam/0", "Grant s3:GetObject on the bucket to read objects."),
+    ("s3/0", "Amazon S3 stores objects in buckets."),
+    ("ec2/0", "Pass --instance-type t3.micro to run-instances."),
+    ("errors/0", "ThrottlingException means the request rate is too high."),
+    ("lambda/0", "AWS Lambda runs code without servers. Lambda scales automatically."),
+]
+
+
+def build_index(path, documents=DOCUMENTS):
+    builder = SparseIndexBuilder(str(path))
+    for chunk_id, text in documents:
+        builder.add({"chunk_id": chunk_id, "content": text, "title": chunk_id}, text)
+    builder.close()
+    return SparseIndex(str(path))
+
+
+def result(id):
+    return SearchResult(id=id, score=0.0, content=id)
+
+
+def test_tokenize_keeps_identifiers():
+    assert tokenize("What does s3:GetObject do?") == ["s3:getobject", "s3", "getobject"]
+    assert "instance-type" in tokenize("--instance-type")
+    assert tokenize("How is the weather") == ["weather"]
+
+
+def test_bm25_finds_exact_identifiers(tmp_path):
+    index = build_index(tmp_path / "index.bm25")
+    assert len(index) == 5
+    assert index.search_sync("Which action is s3:GetObject?", 1)[0].id == "iam/0"
+    assert index.search_sync("ThrottlingException", 1)[0].id == "errors/0"
+    assert index.search_sync("--instance-type", 1)[0].content.startswith("Pass")
+    assert index.search_sync("nonexistentterm", 5) == []
+    index.close()
+
+
+def test_bm25_scores_term_frequency_and_rarity(tmp_path):
+    index = build_index(tmp_path / "index.bm25")
+    docs, scores = index.scores("lambda objects")
+    by_doc = dict(zip(docs.tolist(), scores.tolist()))
+    # "lambda" appears twice in one chunk, "objects" once in each of two
+    assert by_doc[4] > by_doc[0]
+    assert sorted(by_doc) == [0, 1, 4]
+
+
+def test_empty_index(tmp_path):
+    index = build_index(tmp_path / "index.bm25", documents=[])
+    assert len(index) == 0 and index.search_sync("s3", 5) == []
+
+
+def test_rrf_fuse_rewards_agreement():
+    dense = [result("a"), result("b"), result("c")]
+    sparse = [result("c"), result("d")]
+    fused = rrf_fuse([dense, sparse], k=3, rrf_k=60)
+    assert [r.id for r in fused] == ["c", "a", "b"]
+    assert fused[0].score == pytest.approx(1 / 63 + 1 / 61)
+
+
+@pytest.mark.asyncio
+async def test_hybrid_surfaces_lexical_matches(tmp_path, mock_vector_store):
+    documents = [(doc["chunk_id"], doc["content"]) for doc in mock_vector_store.documents]
+    hybrid = HybridRetriever(mock_vector_store, build_index(tmp_path / "index.bm25", documents), candidates=4)
+
+    # The embedding points at Lambda; the question names EC2
+    results = await hybrid.search([1.0, 0.0, 0.0], k=2, text="virtual servers on EC2")
+    assert {r.id for r in results} == {"lambda#intro/0", "ec2#intro/0"}
+    # Without the question it is plain dense search
+    results = await hybrid.search([1.0, 0.0, 0.0], k=1)
+    assert results[0].id == "lambda#intro/0"
+    await hybrid.close()
+
+
+def test_factory_builds_hybrid_retriever(tmp_path, mock_vector_store):
+    from app.retrieval.factory import create_retriever
+    from app.utils.config import settings
+
+    mock_vector_store.save(str(tmp_path / "index.emb"))
+    build_index(tmp_path / "index.bm25").close()
+    saved = settings.RETRIEVER_SPARSE_INDEX_PATH
+    settings.RETRIEVER_BACKEND = "memory"
+    settings.RETRIEVER_INDEX_PATH = str(tmp_path / "index.emb")
+    settings.RETRIEVER_SPARSE_INDEX_PATH = str(tmp_path / "index.bm25")
+    try:
+        assert isinstance(create_retriever(settings), HybridRetriever)
+    finally:
+        settings.RETRIEVER_SPARSE_INDEX_PATH = saved
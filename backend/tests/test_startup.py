@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code):
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("DATABASE_URL", "OPENAI_API_KEY", "VECTOR_DB_URL", "HISTORY_BACKEND", "SERVER_WORKERS")}
+    return subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env,
+                          capture_output=True, text=True)
+
+
+def test_import_reads_no_settings_and_defers_heavy_modules():
+    proc = run_python(
+        "import sys\n"
+        "import main\n"
+        "print(sorted(m for m in ('numpy', 'tiktoken', 'asyncpg', 'redis', 'sentence_transformers')"
+        " if m in sys.modules))"
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "[]"
+
+
+def test_settings_are_read_on_first_use():
+    proc = run_python(
+        "import os\n"
+        "from app.utils.config import get_settings, settings\n"
+        "os.environ.update(DATABASE_URL='db', OPENAI_API_KEY='key', VECTOR_DB_URL='url')\n"
+        "settings.LLM_MODEL = 'test-model'\n"
+        "print(settings.OPENAI_API_KEY, get_settings().LLM_MODEL, get_settings() is get_settings())"
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "key test-model True"
+
+
+def test_default_settings_run_a_worker_per_cpu():
+    proc = run_python(
+        "import os\n"
+        "from app import server\n"
+        "os.environ.update(DATABASE_URL='db', OPENAI_API_KEY='key', VECTOR_DB_URL='url')\n"
+        "server.cpu_count = lambda: 4\n"
+        "print(server.worker_count())"
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip() == "4"
+
+
+def test_memory_history_runs_a_single_worker():
+    from app import server
+    from app.utils.config import settings
+
+    saved = settings.HISTORY_BACKEND, settings.SERVER_WORKERS
+    try:
+        settings.HISTORY_BACKEND, settings.SERVER_WORKERS = "memory", 0
+        assert server.worker_count() == 1
+        settings.SERVER_WORKERS = 4
+        with pytest.raises(RuntimeError):
+            server.worker_count()
+        settings.HISTORY_BACKEND = "postgres"
+        assert server.worker_count() == 4
+        settings.SERVER_WORKERS = 0
+        assert server.worker_count() == server.cpu_count()
+    finally:
+        settings.HISTORY_BACKEND, settings.SERVER_WORKERS = saved
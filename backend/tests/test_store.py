@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.retrieval.ivf import IVFIndex
+from app.retrieval.memory import InMemoryRetriever
+from app.retrieval.store import EmbeddingStore, StoreWriter, write_store
+
+
+def corpus(n=50, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    documents = [{"chunk_id": f"doc/{i}", "content": f"chunk {i} – ünïcode"} for i in range(n)]
+    return embeddings, documents
+
+
+def test_round_trip(tmp_path):
+    embeddings, documents = corpus()
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents)
+
+    store = EmbeddingStore(path)
+    assert len(store) == 50
+    assert store.matrix.shape == (50, 8) and store.matrix.dtype == np.float32
+    expected = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    assert np.allclose(store.matrix, expected, atol=1e-6)
+    assert store.documents[49] == documents[49]
+    with pytest.raises(IndexError):
+        store.documents[50]
+    store.close()
+
+
+def test_matrix_is_mapped_not_copied(tmp_path):
+    embeddings, documents = corpus()
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents)
+
+    retriever = InMemoryRetriever.open(path)
+    assert not retriever.matrix.flags["WRITEABLE"]
+    assert not retriever.matrix.flags["OWNDATA"]
+    assert retriever.matrix.ctypes.data % 64 == 0
+
+
+def test_streamed_writes_and_float16(tmp_path):
+    embeddings, documents = corpus(n=100)
+    path = str(tmp_path / "index.emb")
+    writer = StoreWriter(path, dim=8, dtype="float16")
+    for start in range(0, 100, 30):
+        writer.add(embeddings[start:start + 30], documents[start:start + 30])
+    writer.close()
+    assert not (tmp_path / "index.emb.tmp").exists()
+
+    f32 = InMemoryRetriever(embeddings, documents)
+    f16 = InMemoryRetriever.open(path)
+    assert f16.matrix.dtype == np.float16
+    for query in embeddings[:10]:
+        assert [r.id for r in f16.search_sync(query, 5)][:3] == [r.id for r in f32.search_sync(query, 5)][:3]
+
+
+def test_ivf_over_mapped_store(tmp_path):
+    embeddings, documents = corpus(n=400, dim=16)
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents)
+
+    exact = InMemoryRetriever.open(path)
+    ivf = InMemoryRetriever.open(path, ivf_lists=8, ivf_probes=8)
+    query = embeddings[3]
+    assert [r.id for r in ivf.search_sync(query, 5)] == [r.id for r in exact.search_sync(query, 5)]
+
+
+def test_ivf_written_with_the_store_is_mapped(tmp_path):
+    embeddings, documents = corpus(n=400, dim=16)
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents, ivf_lists=8)
+    built = InMemoryRetriever(embeddings, documents, ivf_lists=8, ivf_probes=2)
+
+    with patch.object(IVFIndex, "build", side_effect=AssertionError("clustered at open")):
+        retriever = InMemoryRetriever.open(path, ivf_lists=8, ivf_probes=2)
+    assert not retriever.index.rows.flags["OWNDATA"]
+    np.testing.assert_array_equal(retriever.index.rows, built.index.rows)
+    assert retriever.index.n_probe == 2
+    for query in embeddings[:10]:
+        assert [r.id for r in retriever.search_sync(query, 5)] == [r.id for r in built.search_sync(query, 5)]
+
+    # Other list counts are clustered at open, as for stores without an index
+    assert len(InMemoryRetriever.open(path, ivf_lists=4).index.centroids) == 4
+    assert InMemoryRetriever.open(path).index is None
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "index.emb"
+    path.write_bytes(b"\0" * 128)
+    with pytest.raises(ValueError):
+        EmbeddingStore(str(path))
+
+
+@pytest.mark.asyncio
+async def test_close_releases_store(tmp_path):
+    embeddings, documents = corpus()
+    path = str(tmp_path / "index.emb")
+    write_store(path, embeddings, documents)
+    retriever = InMemoryRetriever.open(path)
+    assert (await retriever.search(embeddings[0], 1))[0].id == "doc/0"
+    await retriever.close()
+    assert retriever.store is None
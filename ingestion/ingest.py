@@ -1,8 +1,590 @@
 # ingest.py
-# Script or module to scrape and embed AWS docs, store in vector DB
+# Embed the pages exported by the scraper and store them in the vector DB.
+#
+# The scraper's ShardExportPipeline streams items to gzipped JSONL (or
+# Parquet) shards. This job reads those shards, cleans and chunks records in
+# a process pool, embeds chunk batches on a thread pool and writes them to
+# Weaviate, so crawling and embedding can be scaled and rerun independently.
+#
+# Progress is checkpointed per shard, so a killed job resumes where it
+# stopped. Records that could not be embedded or stored (after retries) are
+# listed in the checkpoint and retried by the next run. Object UUIDs are
+# derived from chunk IDs, which makes re-ingesting a partly written batch
+# after a restart harmless.
+#
+# With --sparse-index the job also writes a BM25 inverted index over every
+# chunk, which the backend fuses with vector search for exact identifiers
+# (API names, error codes, CLI flags). It is written with the backend's own
+# builder (backend/app/retrieval/sparse.py), so writer and reader can't
+# disagree on the file format or the tokenizer.
+
+import argparse
+import collections
+import functools
+import glob
+import gzip
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import openai
+import weaviate
+from weaviate.util import generate_uuid5
+
+# Records the scraper exported unchunked are chunked with the scraper's own
+# chunker, so their chunks and IDs match those of chunked records
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scraper"))
+from aws_tutor_scraper.chunking import estimate_tokens, iter_chunks  # noqa: E402
+from aws_tutor_scraper.weaviate_schema import delete_stale_chunks, ensure_class  # noqa: E402
+
+# The sparse index is built by the backend's own module; appended, so the
+# backend's top-level packages don't shadow this job's
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+logger = logging.getLogger("ingest")
+
+SHARD_PATTERNS = ("*.jsonl.gz", "*.jsonl", "*.parquet")
+HORIZONTAL_SPACE = re.compile(r"[ \t\r\f\v\u00a0]+")
+
+# Embedding errors worth retrying after a pause
+RETRYABLE_OPENAI_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+
+def find_shards(paths):
+    """
+    Expand files and directories into a sorted list of shard files.
+    Unfinished ".part" shards are never matched.
+    """
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in SHARD_PATTERNS:
+                shards.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            shards.append(path)
+    return sorted(set(shards))
+
+
+def read_shard(path):
+    """
+    Yield the records of one JSONL, gzipped JSONL or Parquet shard.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def clean_text(text):
+    """
+    Collapse runs of horizontal whitespace and drop blank lines.
+    """
+    lines = (HORIZONTAL_SPACE.sub(" ", line).strip() for line in (text or "").split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def prepare_record(record, max_tokens=512, overlap_tokens=64):
+    """
+    Clean a record's chunks, chunking the page first if the scraper did not.
+    Returns the record without its page-level `content` and `sections`, so
+    only what gets embedded travels back from the process pool.
+    """
+    chunks = record.get('chunks')
+    if not chunks:
+        sections = record.get('sections') or [{"heading": record.get('section'), "text": record.get('content')}]
+        sections = [{"heading": section.get('heading') or "", "text": clean_text(section.get('text'))}
+                    for section in sections]
+        chunks = list(iter_chunks(record['url'], sections, max_tokens, overlap_tokens))
+
+    cleaned, seen = [], set()
+    for chunk in chunks:
+        text = clean_text(chunk['text'])
+        if text and chunk['id'] not in seen:
+            seen.add(chunk['id'])
+            cleaned.append(dict(chunk, text=text))
+
+    prepared = {key: value for key, value in record.items() if key not in ('content', 'sections')}
+    prepared['chunks'] = cleaned
+    return prepared
+
+
+def chunk_document(record, chunk):
+    """
+    The properties stored for a chunk, in Weaviate and the sparse index.
+    """
+    return {
+        "title": record.get('title'),
+        "content": chunk['text'],
+        "url": record['url'],
+        "section": chunk.get('heading') or record.get('section'),
+        "chunk_id": chunk['id'],
+        "chunk_index": chunk['index'],
+        "timestamp": record.get('timestamp'),
+        "source": "AWS Documentation"
+    }
+
+
+def build_sparse_index(shards, path, max_tokens=512, overlap_tokens=64):
+    """
+    Write a BM25 index over the chunks of every shard to `path`. It always
+    covers all shards, not only those ingested by a resumed run. Returns
+    the number of chunks indexed.
+    """
+    from app.retrieval.sparse import SparseIndexBuilder
+
+    builder = SparseIndexBuilder(path)
+    seen = set()
+    for shard in shards:
+        for record in read_shard(shard):
+            record = prepare_record(record, max_tokens, overlap_tokens)
+            for chunk in record['chunks']:
+                if chunk['id'] not in seen:
+                    seen.add(chunk['id'])
+                    builder.add(chunk_document(record, chunk), chunk['text'])
+    builder.close()
+    return len(builder)
+
+
+class Checkpoint:
+    """
+    Per-shard ingestion progress, saved atomically as JSON.
+
+    For each shard (keyed by file name) it records `offset`, the number of
+    leading records that have been processed, `failed`, the numbers of
+    records before `offset` that still have chunks to write, and `done`,
+    which is set once every record has been written.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.shards = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.shards = json.load(f).get("shards", {})
+
+    def offset(self, shard):
+        return self.shards.get(shard, {}).get("offset", 0)
+
+    def failed(self, shard):
+        return set(self.shards.get(shard, {}).get("failed", ()))
+
+    def is_done(self, shard):
+        return self.shards.get(shard, {}).get("done", False)
+
+    def update(self, shard, offset, done, failed=()):
+        self.shards[shard] = {"offset": offset, "done": done, "failed": sorted(failed)}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.shards}, f)
+        os.replace(tmp, self.path)
+
+
+class ShardProgress:
+    """
+    Tracks which records of one shard still have chunks in flight, so the
+    checkpoint offset only moves past records that are fully processed even
+    though batches complete out of order.
+
+    Records with a chunk that failed are kept in `failed` for the next run
+    to retry. Records failed by an earlier run are retried first and stay
+    in `failed` until they succeed.
+    """
+
+    def __init__(self, name, offset=0, failed=()):
+        self.name = name
+        self.read = offset
+        self.remaining = {}
+        self.failed = set(failed)
+        self.failing = set()
+        self.exhausted = False
+
+    def add(self, n, chunks):
+        self.read = max(self.read, n + 1)
+        if chunks:
+            self.remaining[n] = chunks
+        else:
+            self.failed.discard(n)
+
+    def complete(self, n, ok=True):
+        """
+        Mark one chunk of record `n` as processed, successfully or not.
+        Returns True when that was the record's last chunk.
+        """
+        if not ok:
+            self.failing.add(n)
+        self.remaining[n] -= 1
+        if self.remaining[n]:
+            return False
+        del self.remaining[n]
+        if n in self.failing:
+            self.failing.discard(n)
+            self.failed.add(n)
+        else:
+            self.failed.discard(n)
+        return True
+
+    @property
+    def offset(self):
+        # Records are added in order and dicts keep insertion order, so the
+        # first key not being retried is the oldest unfinished new record
+        return next((n for n in self.remaining if n not in self.failed), self.read)
+
+    @property
+    def done(self):
+        return self.exhausted and not self.remaining and not self.failed
+
+
+class Progress:
+    """
+    Running totals and throughput of an ingestion run.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.docs = 0
+        self.chunks = 0
+        self.tokens = 0
+
+    def rates(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return self.docs / elapsed, self.tokens / elapsed
+
+    def __str__(self):
+        docs_rate, tokens_rate = self.rates()
+        return (
+            f"{self.docs} docs ({docs_rate:.1f} docs/s), {self.chunks} chunks, "
+            f"{self.tokens} tokens ({tokens_rate:.0f} tokens/s)"
+        )
+
+
+class Ingestor:
+    """
+    Parallel shard ingestion.
+
+    Records are cleaned and chunked on `processes` worker processes (inline
+    when 0), chunk batches are embedded on `workers` threads with at most
+    `max_pending` batches in flight, and results are written to Weaviate
+    from the calling thread, which also owns the checkpoint. Rate-limited or
+    failed embedding requests and failed Weaviate batches are retried up to
+    `max_retries` times with exponential backoff from `retry_backoff`
+    seconds.
+    """
+
+    def __init__(self, client, embedding_model="text-embedding-ada-002", workers=4,
+                 max_pending=None, processes=0, batch_size=64, max_batch_tokens=50000,
+                 max_tokens=512, overlap_tokens=64, checkpoint=None,
+                 checkpoint_interval=10.0, progress_interval=10.0, class_name="AWSDocument",
+                 max_retries=5, retry_backoff=1.0):
+        self.client = client
+        self.embedding_model = embedding_model
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.prepare = functools.partial(prepare_record, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        self.checkpoint = checkpoint or Checkpoint()
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval = progress_interval
+        self.class_name = class_name
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.progress = Progress()
+        self.shards = []
+        self.stored = 0
+        self.failed = 0
+        self.delete_stale = False
+        self._pending = {}
+        self._last_checkpoint = self._last_report = time.monotonic()
+
+    def run(self, shards):
+        """
+        Ingest every shard not already marked done in the checkpoint.
+        Returns (stored, failed) chunk counts.
+        """
+        self.progress = Progress()
+        self.delete_stale = ensure_class(self.client, self.class_name)
+        pool = ProcessPoolExecutor(self.processes) if self.processes else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                batch, tokens = [], 0
+                for progress, n, record in self.iter_prepared(shards, pool):
+                    chunks = record['chunks']
+                    progress.add(n, len(chunks))
+                    if not chunks:
+                        self.progress.docs += 1
+                    for chunk in chunks:
+                        chunk_tokens = estimate_tokens(chunk['text'])
+                        if batch and (len(batch) >= self.batch_size or tokens + chunk_tokens > self.max_batch_tokens):
+                            self.submit(executor, batch)
+                            batch, tokens = [], 0
+                        batch.append((progress, n, record, chunk))
+                        tokens += chunk_tokens
+                if batch:
+                    self.submit(executor, batch)
+                self._drain()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            self.save_checkpoint()
+        logger.info(f"Finished: {self.progress}")
+        return self.stored, self.failed
+
+    def iter_prepared(self, shards, pool):
+        """
+        Yield (shard progress, record number, prepared record) for the
+        records a previous run failed and every record past each shard's
+        checkpoint offset. One slab of records is prepared ahead in the
+        process pool while the previous one is batched.
+        """
+        slab_size = max(self.batch_size, 1) * max(self.processes, 1)
+        if pool is not None:
+            prepare = functools.partial(pool.map, chunksize=max(1, slab_size // (self.processes * 4)))
+        else:
+            prepare = map
+        for shard in shards:
+            name = os.path.basename(shard)
+            if self.checkpoint.is_done(name):
+                logger.info(f"Skipping {name}: already ingested")
+                continue
+            retry = self.checkpoint.failed(name)
+            progress = ShardProgress(name, self.checkpoint.offset(name), retry)
+            self.shards.append(progress)
+            logger.info(f"Reading {name} from record {progress.read}, retrying {len(retry)} failed records")
+
+            start = min(retry, default=progress.read)
+            records = ((n, record) for n, record in enumerate(itertools.islice(read_shard(shard), start, None), start)
+                       if n >= progress.read or n in retry)
+            ahead = collections.deque()
+            while True:
+                slab = list(itertools.islice(records, slab_size))
+                if slab:
+                    ahead.append(([n for n, _ in slab], prepare(self.prepare, [record for _, record in slab])))
+                if not ahead:
+                    break
+                if slab and len(ahead) < 2:
+                    continue
+                numbers, prepared = ahead.popleft()
+                for n, record in zip(numbers, prepared):
+                    yield progress, n, record
+            progress.exhausted = True
+
+    def submit(self, executor, batch):
+        if len(self._pending) >= self.max_pending:
+            self._drain(FIRST_COMPLETED)
+        self._pending[executor.submit(self.embed, batch)] = batch
+
+    def _drain(self, return_when="ALL_COMPLETED"):
+        done, _ = wait(self._pending, return_when=return_when)
+        for future in done:
+            batch = self._pending.pop(future)
+            stored = self.store(batch, future.result())
+            for (progress, n, record, chunk), ok in zip(batch, stored):
+                self.progress.tokens += estimate_tokens(chunk['text'])
+                if progress.complete(n, ok):
+                    self.progress.docs += 1
+                    if n not in progress.failed and not self.remove_stale_chunks(record):
+                        progress.failed.add(n)
+            self.progress.chunks += len(batch)
+        self.tick()
+
+    def remove_stale_chunks(self, record):
+        """
+        Delete the objects of chunks a fully written record's page no longer
+        has, as WeaviatePipeline does for crawled pages. Returns False if
+        that failed, so the record is retried by the next run.
+        """
+        if not self.delete_stale:
+            return True
+        try:
+            deleted = delete_stale_chunks(self.client, self.class_name, record['url'],
+                                          {chunk['id'] for chunk in record['chunks']})
+        except Exception as e:
+            logger.error(f"Could not delete stale chunks of {record['url']}: {e}")
+            return False
+        if deleted:
+            logger.info(f"Deleted {deleted} stale chunks of {record['url']}")
+        return True
+
+    def tick(self):
+        """
+        Save the checkpoint and report throughput when their intervals have
+        passed.
+        """
+        now = time.monotonic()
+        if now - self._last_checkpoint >= self.checkpoint_interval:
+            self.save_checkpoint()
+            self._last_checkpoint = now
+        if now - self._last_report >= self.progress_interval:
+            logger.info(f"Progress: {self.progress}, {len(self._pending)} batches in flight")
+            self._last_report = now
+
+    def save_checkpoint(self):
+        for progress in self.shards:
+            self.checkpoint.update(progress.name, progress.offset, progress.done, progress.failed)
+        self.checkpoint.save()
+
+    def backoff(self, attempt):
+        time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def embed(self, batch):
+        """
+        Embed a batch of chunks with a single OpenAI API call, retrying
+        rate limits and transient API errors. Runs on a worker thread.
+        Returns a list aligned with the batch, with None for failures.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = openai.Embedding.create(
+                    input=[chunk['text'] for *_, chunk in batch],
+                    model=self.embedding_model
+                )
+                data = sorted(response['data'], key=lambda d: d['index'])
+                return [d['embedding'] for d in data]
+            except RETRYABLE_OPENAI_ERRORS as e:
+                if attempt == self.max_retries:
+                    logger.error(f"OpenAI API error after {attempt} retries: {e}")
+                    break
+                logger.warning(f"OpenAI API error, retrying: {e}")
+                self.backoff(attempt)
+            except Exception as e:
+                logger.error(f"OpenAI API error: {e}")
+                break
+        return [None] * len(batch)
+
+    def store(self, batch, embeddings):
+        """
+        Write an embedded batch to Weaviate in one request, retrying it if
+        the request fails. Returns a list aligned with the batch, True for
+        the chunks that were written.
+        """
+        sent = {}
+        for i, ((_, _, record, chunk), embedding) in enumerate(zip(batch, embeddings)):
+            if not embedding:
+                logger.error(f"Embedding generation failed for URL: {record['url']}")
+                continue
+            sent[generate_uuid5(chunk['id'])] = i
+        stored = [False] * len(batch)
+        for attempt in range(self.max_retries + 1):
+            if not sent:
+                break
+            try:
+                for uuid, i in sent.items():
+                    _, _, record, chunk = batch[i]
+                    self.client.batch.add_data_object(
+                        chunk_document(record, chunk),
+                        self.class_name,
+                        uuid=uuid,
+                        vector=embeddings[i],
+                    )
+                results = self.client.batch.create_objects() or []
+            except Exception as e:
+                self.client.batch.empty_objects()
+                if attempt == self.max_retries:
+                    logger.error(f"Weaviate batch error after {attempt} retries: {e}")
+                    break
+                logger.warning(f"Weaviate batch error, retrying: {e}")
+                self.backoff(attempt)
+                continue
+            for uuid, result in zip(list(sent), results):
+                errors = (result.get('result') or {}).get('errors')
+                if errors:
+                    logger.warning(f"Weaviate rejected {result.get('id', uuid)}: {errors}")
+                else:
+                    stored[sent.get(result.get('id'), sent[uuid])] = True
+            # Rejected objects are not retried here; their records are
+            # retried by the next run
+            break
+        self.stored += sum(stored)
+        self.failed += len(batch) - sum(stored)
+        return stored
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Embed exported scraper shards into Weaviate.")
+    parser.add_argument("paths", nargs="*", default=[os.getenv("EXPORT_DIR", "export")],
+                        help="Shard files or directories (default: $EXPORT_DIR or ./export)")
+    parser.add_argument("--workers", type=int, default=4, help="Embedding threads")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Embedding batches in flight (default: 2 x workers)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Cleaning/chunking processes (0 to prepare records inline)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding request")
+    parser.add_argument("--max-batch-tokens", type=int, default=50000,
+                        help="Estimated tokens per embedding request")
+    parser.add_argument("--chunk-max-tokens", type=int, default=512,
+                        help="Chunk size for records exported without chunks")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=64)
+    parser.add_argument("--checkpoint", default=os.getenv("INGEST_CHECKPOINT", "ingest_checkpoint.json"),
+                        help="Checkpoint file used to resume an interrupted run")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--checkpoint-interval", type=float, default=10.0, help="Seconds between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--max-retries", type=int, default=5,
+                        help="Retries of a rate-limited embedding request or failed Weaviate batch")
+    parser.add_argument("--retry-backoff", type=float, default=1.0, help="Seconds before the first retry, doubling")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002"))
+    parser.add_argument("--weaviate-url", default=os.getenv("VECTOR_DB_URL"))
+    parser.add_argument("--sparse-index", default=os.getenv("SPARSE_INDEX_PATH"),
+                        help="Also write a BM25 index over every shard to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = parse_args(argv)
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+
+    shards = find_shards(args.paths)
+    if not shards:
+        logger.warning(f"No shards found in {', '.join(args.paths)}")
+        return
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    ingestor = Ingestor(
+        weaviate.Client(args.weaviate_url),
+        embedding_model=args.model,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        max_batch_tokens=args.max_batch_tokens,
+        max_tokens=args.chunk_max_tokens,
+        overlap_tokens=args.chunk_overlap_tokens,
+        checkpoint=Checkpoint(args.checkpoint),
+        checkpoint_interval=args.checkpoint_interval,
+        progress_interval=args.progress_interval,
+        max_retries=args.max_retries,
+        retry_backoff=args.retry_backoff,
+    )
+    stored, failed = ingestor.run(shards)
+    logger.info(f"Ingested {len(shards)} shards: {stored} chunks stored, {failed} failed")
+    if args.sparse_index:
+        indexed = build_sparse_index(shards, args.sparse_index, args.chunk_max_tokens, args.chunk_overlap_tokens)
+        logger.info(f"Wrote BM25 index over {indexed} chunks to {args.sparse_index}")
 
-def main():
-    print("Document ingestion logic goes here.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,110 @@
+import os
+import sys
+
+import pytest
+
+# The scraper lives in its own Scrapy project; make it importable here.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../scraper'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def sample_pages():
+    return [
+        {
+            "title": f"Page {i}",
+            "content": f"AWS documentation page number {i}",
+            "url": f"https://docs.aws.amazon.com/page{i}.html",
+            "section": "Overview",
+            "timestamp": "2024-01-01T00:00:00",
+        }
+        for i in range(7)
+    ]
+
+
+class FakeBatch:
+    """
+    Stand-in for weaviate.Client.batch that stores objects in memory.
+    Objects whose URL is in `reject` fail that many times before succeeding.
+    """
+
+    def __init__(self, reject=None):
+        self.reject = dict(reject or {})
+        self.objects = {}
+        self.pending = []
+        self.calls = 0
+        self.deletes = 0
+
+    def add_data_object(self, data_object, class_name, uuid=None, vector=None):
+        self.pending.append((uuid, data_object, vector))
+
+    def create_objects(self):
+        self.calls += 1
+        results = []
+        for uuid, data_object, vector in self.pending:
+            url = data_object.get("url")
+            if self.reject.get(url):
+                self.reject[url] -= 1
+                results.append({"id": uuid, "result": {"errors": {"error": [{"message": "rejected"}]}}})
+            else:
+                self.objects[uuid] = (data_object, vector)
+                results.append({"id": uuid, "result": {}})
+        self.pending = []
+        return results
+
+    def empty_objects(self):
+        self.pending = []
+
+    def delete_objects(self, class_name, where, output="minimal"):
+        """
+        Delete the objects matching an And of exact (field-tokenized) Equal
+        and NotEqual filters.
+        """
+        self.deletes += 1
+
+        def matches(obj, condition):
+            value = obj.get(condition["path"][0])
+            return (value == condition["valueText"]) == (condition["operator"] == "Equal")
+
+        deleted = [uuid for uuid, (obj, _) in self.objects.items()
+                   if all(matches(obj, condition) for condition in where["operands"])]
+        for uuid in deleted:
+            del self.objects[uuid]
+        return {"results": {"matches": len(deleted), "successful": len(deleted), "failed": 0}}
+
+
+class FakeSchema:
+    """
+    Stand-in for weaviate.Client.schema. `tokenization` is what auto-schema
+    would give url and chunk_id in a class created elsewhere.
+    """
+
+    def __init__(self, tokenization=None):
+        self.classes = []
+        if tokenization is not None:
+            self.classes.append({"class": "AWSDocument", "properties": [
+                {"name": name, "dataType": ["text"], "tokenization": tokenization}
+                for name in ("url", "chunk_id")
+            ]})
+
+    def get(self):
+        return {"classes": self.classes}
+
+    def create_class(self, schema):
+        self.classes.append(schema)
+
+
+class FakeWeaviateClient:
+    def __init__(self, reject=None, tokenization=None):
+        self.batch = FakeBatch(reject)
+        self.schema = FakeSchema(tokenization)
+
+
+@pytest.fixture
+def make_weaviate_client():
+    return FakeWeaviateClient
+
+
+@pytest.fixture
+def weaviate_client(make_weaviate_client):
+    return make_weaviate_client()
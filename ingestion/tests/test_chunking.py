@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from aws_tutor_scraper.chunking import chunk_document, estimate_tokens, iter_chunks
+from aws_tutor_scraper.pipelines import ChunkingPipeline
+
+URL = "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html"
+
+
+def make_sections():
+    return [
+        {"heading": "What is AWS Lambda?", "text": "\n".join(f"Lambda line {i} " * 5 for i in range(40))},
+        {"heading": "Example", "text": "Short example."},
+        {"heading": "Example", "text": "Another example."},
+    ]
+
+
+def test_chunks_respect_token_budget_and_headings():
+    chunks = list(iter_chunks(URL, make_sections(), max_tokens=100, overlap_tokens=20))
+    assert len(chunks) > 3
+    assert all(estimate_tokens(c["text"]) <= 100 + estimate_tokens(c["heading"]) + 1 for c in chunks)
+    assert [c["index"] for c in chunks] == list(range(len(chunks)))
+    assert chunks[-1]["text"] == "Example\nAnother example."
+
+
+def test_consecutive_chunks_overlap():
+    chunks = chunk_document(URL, make_sections()[:1], max_tokens=100, overlap_tokens=20)
+    first_lines = chunks[0]["text"].split("\n")
+    second_lines = chunks[1]["text"].split("\n")
+    assert second_lines[1] == first_lines[-1]
+
+
+def test_chunk_ids_are_stable_per_section():
+    chunks = chunk_document(URL, make_sections(), max_tokens=100)
+    assert chunks[-2]["id"] == f"{URL}#example/0"
+    assert chunks[-1]["id"] == f"{URL}#example-2/0"
+
+    edited = make_sections()
+    edited[0]["text"] += "\nOne more line about Lambda."
+    edited_ids = [c["id"] for c in chunk_document(URL, edited, max_tokens=100)]
+    assert edited_ids[-2:] == [c["id"] for c in chunks[-2:]]
+
+
+def test_long_lines_are_split():
+    sections = [{"heading": "", "text": "word " * 2000}]
+    chunks = chunk_document(URL, sections, max_tokens=100, overlap_tokens=0)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c["text"]) <= 100 for c in chunks)
+
+
+def test_chunk_document_runs_in_process_pool():
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        chunks = executor.submit(chunk_document, URL, make_sections(), 100, 20).result()
+    assert chunks == chunk_document(URL, make_sections(), 100, 20)
+
+
+def test_pipeline_chunks_small_pages_inline(sample_pages):
+    pipeline = ChunkingPipeline(max_tokens=100)
+    item = pipeline.process_item(dict(sample_pages[0]), spider=None)
+    assert item["chunks"][0]["id"] == f"{item['url']}#overview/0"
+    assert item["chunks"][0]["text"] == "Overview\n" + item["content"]
@@ -0,0 +1,273 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import ingest
+from aws_tutor_scraper.chunking import chunk_document
+from aws_tutor_scraper.pipelines import ShardExportPipeline
+
+
+def fake_embedding_response(input, model):
+    return {"data": [{"index": i, "embedding": [float(i)]} for i in range(len(input))]}
+
+
+def export(pages, export_dir, **kwargs):
+    pipeline = ShardExportPipeline(str(export_dir), **kwargs)
+    pipeline.open_spider(SimpleNamespace(name="aws_docs"))
+    for page in pages:
+        pipeline.process_item(page, spider=None)
+    pipeline.close_spider(spider=None)
+    return pipeline
+
+
+def test_export_rotates_shards(tmp_path, sample_pages):
+    export(sample_pages, tmp_path, shard_items=3)
+
+    shards = ingest.find_shards([str(tmp_path)])
+    assert len(shards) == 3
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+    records = [record for shard in shards for record in ingest.read_shard(shard)]
+    assert [r['url'] for r in records] == [p['url'] for p in sample_pages]
+
+
+def test_pages_are_reported_when_their_shard_is_published(tmp_path, sample_pages):
+    sent = []
+    signals = SimpleNamespace(send_catch_log=lambda signal, url, spider: sent.append(url))
+    pipeline = ShardExportPipeline(str(tmp_path), shard_items=4, signals=signals)
+    pipeline.open_spider(SimpleNamespace(name="aws_docs"))
+    for page in sample_pages[:5]:
+        pipeline.process_item(page, spider=None)
+    assert sent == [page['url'] for page in sample_pages[:4]]
+    pipeline.close_spider(spider=None)
+    assert sent == [page['url'] for page in sample_pages[:5]]
+
+
+def test_partial_shard_is_not_visible(tmp_path, sample_pages):
+    pipeline = ShardExportPipeline(str(tmp_path), shard_items=10)
+    pipeline.open_spider(SimpleNamespace(name="aws_docs"))
+    pipeline.process_item(sample_pages[0], spider=None)
+
+    assert ingest.find_shards([str(tmp_path)]) == []
+    pipeline.close_spider(spider=None)
+    assert len(ingest.find_shards([str(tmp_path)])) == 1
+
+
+def test_parquet_export(tmp_path, sample_pages):
+    pytest.importorskip("pyarrow")
+    pages = [dict(page, chunks=[{"id": page['url'], "heading": "", "index": 0, "text": "x"}])
+             for page in sample_pages]
+    export(pages, tmp_path, export_format="parquet", shard_items=5)
+
+    shards = ingest.find_shards([str(tmp_path)])
+    assert [s.endswith(".parquet") for s in shards] == [True, True]
+    records = [record for shard in shards for record in ingest.read_shard(shard)]
+    assert records[0]['chunks'][0]['id'] == sample_pages[0]['url']
+
+
+def test_prepare_chunks_and_cleans_records():
+    record = {
+        "url": "https://docs.aws.amazon.com/lambda/",
+        "content": "ignored",
+        "sections": [
+            {"heading": "Intro", "text": "alpha   beta\n\n  gamma " * 40},
+            {"heading": "", "text": "   "},
+        ],
+    }
+    prepared = ingest.prepare_record(record, max_tokens=50, overlap_tokens=10)
+
+    assert 'content' not in prepared and 'sections' not in prepared
+    chunks = prepared['chunks']
+    assert len(chunks) > 1
+    assert [c['index'] for c in chunks] == list(range(len(chunks)))
+    assert chunks[0]['id'] == "https://docs.aws.amazon.com/lambda/#intro/0"
+    assert chunks[0]['text'].startswith("Intro\nalpha beta\ngamma alpha beta")
+    assert all(ingest.estimate_tokens(c['text']) <= 55 for c in chunks)
+
+
+def test_prepare_keeps_sections_with_the_same_heading():
+    sections = [{"heading": "Example", "text": "first"}, {"heading": "Example", "text": "second"}]
+    prepared = ingest.prepare_record({"url": "u", "sections": sections})
+    assert [(c['id'], c['text']) for c in prepared['chunks']] == [
+        ("u#example/0", "Example\nfirst"),
+        ("u#example-2/0", "Example\nsecond"),
+    ]
+    assert prepared['chunks'] == chunk_document("u", sections)
+
+
+def test_prepare_keeps_scraper_chunks():
+    chunks = [{"id": "a", "heading": "", "index": 0, "text": "x \t y"},
+              {"id": "a", "heading": "", "index": 1, "text": "dup"},
+              {"id": "b", "heading": "", "index": 2, "text": " "}]
+    prepared = ingest.prepare_record({"url": "u", "chunks": chunks})
+    assert prepared['chunks'] == [{"id": "a", "heading": "", "index": 0, "text": "x y"}]
+
+
+def run_ingest(paths, client, **kwargs):
+    kwargs.setdefault("workers", 2)
+    kwargs.setdefault("batch_size", 3)
+    kwargs.setdefault("retry_backoff", 0)
+    with patch.object(ingest.openai.Embedding, "create", side_effect=fake_embedding_response) as create:
+        ingestor = ingest.Ingestor(client, **kwargs)
+        result = ingestor.run(ingest.find_shards(paths))
+    return ingestor, result, create
+
+
+def test_ingest_shards(tmp_path, sample_pages, weaviate_client):
+    export(sample_pages, tmp_path, shard_items=4)
+    ingestor, result, create = run_ingest([str(tmp_path)], weaviate_client, max_pending=1)
+
+    assert create.call_count == 3
+    assert result == (len(sample_pages), 0)
+    assert len(weaviate_client.batch.objects) == len(sample_pages)
+    assert ingestor.progress.docs == len(sample_pages)
+    assert ingestor.progress.tokens > 0
+
+
+def test_ingest_with_process_pool(tmp_path, sample_pages, weaviate_client):
+    export(sample_pages, tmp_path, shard_items=4)
+    _, result, _ = run_ingest([str(tmp_path)], weaviate_client, processes=2)
+    assert result == (len(sample_pages), 0)
+
+
+def test_ingest_counts_failures(tmp_path, sample_pages, make_weaviate_client):
+    export(sample_pages, tmp_path)
+    client = make_weaviate_client(reject={sample_pages[0]['url']: 1})
+    _, result, _ = run_ingest([str(tmp_path)], client)
+    assert result == (6, 1)
+
+    with patch.object(ingest.openai.Embedding, "create", side_effect=RuntimeError("boom")):
+        assert ingest.Ingestor(client).run(ingest.find_shards([str(tmp_path)])) == (0, 7)
+
+
+def test_checkpoint_resumes_after_crash(tmp_path, sample_pages, make_weaviate_client):
+    export_dir = tmp_path / "export"
+    export(sample_pages, export_dir, shard_items=4)
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    client = make_weaviate_client()
+    calls = []
+
+    def create_objects():
+        calls.append(1)
+        if len(calls) == 2:
+            # The job is killed mid-run
+            raise KeyboardInterrupt
+        return type(client.batch).create_objects(client.batch)
+
+    client.batch.create_objects = create_objects
+    with pytest.raises(KeyboardInterrupt):
+        run_ingest([str(export_dir)], client, workers=1, max_pending=1,
+                   checkpoint=ingest.Checkpoint(checkpoint_path))
+
+    checkpoint = ingest.Checkpoint(checkpoint_path)
+    first, second = ingest.find_shards([str(export_dir)])
+    assert checkpoint.offset(os.path.basename(first)) == 3
+    assert not checkpoint.is_done(os.path.basename(first))
+
+    resumed = make_weaviate_client()
+    ingestor, result, _ = run_ingest([str(export_dir)], resumed, workers=1,
+                                     checkpoint=ingest.Checkpoint(checkpoint_path))
+    assert result == (4, 0)
+    assert ingestor.progress.docs == 4
+    checkpoint = ingest.Checkpoint(checkpoint_path)
+    assert checkpoint.is_done(os.path.basename(first)) and checkpoint.is_done(os.path.basename(second))
+
+    _, result, create = run_ingest([str(export_dir)], resumed, checkpoint=ingest.Checkpoint(checkpoint_path))
+    assert result == (0, 0)
+    assert not create.called
+
+
+def test_failed_records_are_retried_by_the_next_run(tmp_path, sample_pages, make_weaviate_client):
+    export_dir = tmp_path / "export"
+    export(sample_pages[:5], export_dir)
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    (shard,) = ingest.find_shards([str(export_dir)])
+    name = os.path.basename(shard)
+
+    client = make_weaviate_client(reject={sample_pages[3]['url']: 1})
+    with patch.object(ingest.openai.Embedding, "create", side_effect=ingest.openai.error.RateLimitError("slow down")):
+        ingestor = ingest.Ingestor(client, batch_size=2, max_retries=2, retry_backoff=0,
+                                   checkpoint=ingest.Checkpoint(checkpoint_path))
+        assert ingestor.run([shard]) == (0, 5)
+    checkpoint = ingest.Checkpoint(checkpoint_path)
+    assert not checkpoint.is_done(name)
+    assert checkpoint.failed(name) == {0, 1, 2, 3, 4}
+
+    _, result, create = run_ingest([shard], client, checkpoint=ingest.Checkpoint(checkpoint_path))
+    assert result == (4, 1)
+    checkpoint = ingest.Checkpoint(checkpoint_path)
+    assert checkpoint.failed(name) == {3} and not checkpoint.is_done(name)
+
+    _, result, create = run_ingest([shard], client, checkpoint=ingest.Checkpoint(checkpoint_path))
+    assert result == (1, 0)
+    assert ingest.Checkpoint(checkpoint_path).is_done(name)
+    assert len(client.batch.objects) == 5
+
+
+def test_reingested_pages_lose_chunks_they_no_longer_have(tmp_path, sample_pages, weaviate_client):
+    def page(url, *headings):
+        return dict(sample_pages[0], url=url, chunks=[
+            {"id": f"{url}#{heading}/0", "heading": heading, "index": i, "text": heading}
+            for i, heading in enumerate(headings)])
+
+    url = "https://docs.aws.amazon.com/s3/"
+    export([page(url, "intro", "pricing"), page(url + "faq.html", "faq")], tmp_path / "first")
+    run_ingest([str(tmp_path / "first")], weaviate_client)
+    export([page(url, "intro")], tmp_path / "second")
+    _, result, _ = run_ingest([str(tmp_path / "second")], weaviate_client)
+
+    assert result == (1, 0)
+    stored = sorted(obj["chunk_id"] for obj, _ in weaviate_client.batch.objects.values())
+    assert stored == [url + "#intro/0", url + "faq.html#faq/0"]
+
+
+def test_transient_errors_are_retried(tmp_path, sample_pages, make_weaviate_client):
+    export(sample_pages, tmp_path)
+    client = make_weaviate_client()
+    create_objects, calls = client.batch.create_objects, []
+
+    def flaky_create_objects():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("weaviate went away")
+        return create_objects()
+
+    client.batch.create_objects = flaky_create_objects
+    responses = [ingest.openai.error.RateLimitError("slow down")] + [fake_embedding_response] * 10
+
+    def embedding_create(input, model):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response(input, model)
+
+    with patch.object(ingest.openai.Embedding, "create", side_effect=embedding_create):
+        result = ingest.Ingestor(client, batch_size=3, retry_backoff=0).run(ingest.find_shards([str(tmp_path)]))
+    assert result == (len(sample_pages), 0)
+
+
+def test_sparse_index_readable_by_backend(tmp_path, sample_pages):
+    pytest.importorskip("numpy")
+    from app.retrieval import sparse
+
+    pages = sample_pages + [dict(sample_pages[0], url="https://docs.aws.amazon.com/iam.html",
+                                 content="Allow s3:GetObject to read objects")]
+    export(pages, tmp_path / "export")
+    path = str(tmp_path / "index.bm25")
+    assert ingest.build_sparse_index(ingest.find_shards([str(tmp_path / "export")]), path) == len(pages)
+
+    builder = sparse.SparseIndexBuilder(str(tmp_path / "expected.bm25"))
+    for shard in ingest.find_shards([str(tmp_path / "export")]):
+        for record in map(ingest.prepare_record, ingest.read_shard(shard)):
+            for chunk in record['chunks']:
+                builder.add(ingest.chunk_document(record, chunk), chunk['text'])
+    builder.close()
+    assert (tmp_path / "index.bm25").read_bytes() == (tmp_path / "expected.bm25").read_bytes()
+
+    index = sparse.SparseIndex(path)
+    best = index.search_sync("s3:GetObject", 1)[0]
+    assert best.url == "https://docs.aws.amazon.com/iam.html"
+    assert best.metadata["chunk_id"].startswith(best.url)
+    index.close()
@@ -1,5 +1,202 @@
 import pytest
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from aws_tutor_scraper.crawl_state import CrawlState
+from aws_tutor_scraper.dedup import BloomFilter, CanonicalBloomDupeFilter
+from aws_tutor_scraper.extraction import extract_content, extract_page
+from aws_tutor_scraper.links import DocsLinkExtractor
+from aws_tutor_scraper.middlewares import IncrementalCrawlMiddleware
+from aws_tutor_scraper.signals import item_stored
+from aws_tutor_scraper.spiders.aws_docs_spider import AwsDocsSpider
+from aws_tutor_scraper.urls import canonicalize_url
+
+PAGE = b"""
+<html><head><title> Getting started with Amazon S3 </title></head>
+<body>
+<div class="main-content">
+  <h1>Getting started</h1>
+  <p>Create a bucket.</p>
+  <h2>Step 1: Create a bucket</h2>
+  <p>Open the console.</p><p>Choose <b>Create bucket</b>.</p>
+  <a href="s3-upload.html">Next</a>
+</div>
+</body></html>
+"""
+
+
+def make_response(body=PAGE, url="https://docs.aws.amazon.com/AmazonS3/latest/userguide/start.html"):
+    return HtmlResponse(url=url, body=body, encoding="utf-8")
+
 
 def test_scraper():
     # Add your scraper tests here
     assert True
+
+
+def test_parse_docs_extracts_sections():
+    item, request = list(AwsDocsSpider().parse_docs(make_response()))
+    assert item["title"] == "Getting started with Amazon S3"
+    assert item["section"] == "Getting started"
+    assert item["sections"] == [
+        {"heading": "Getting started", "text": "Create a bucket."},
+        {"heading": "Step 1: Create a bucket", "text": "Open the console.\nChoose\nCreate bucket\n.\nNext"},
+    ]
+    assert request.url == "https://docs.aws.amazon.com/AmazonS3/latest/userguide/s3-upload.html"
+
+
+def test_extract_content_skips_scripts_and_comments():
+    root = make_response(b"""
+        <html><body><div class="main-content">
+        intro<!-- note -->after comment<script>var x = 1;</script>after script
+        <h2>Errors <code>4xx</code></h2><p>Throttling</p>
+        </div></body></html>""").css("div.main-content")[0].root
+    extracted = extract_content(root)
+    assert extracted["text"] == "intro\nafter comment\nafter script\nErrors\n4xx\nThrottling"
+    assert extracted["section"] == "Errors 4xx"
+    assert extracted["sections"] == [
+        {"heading": "", "text": "intro\nafter comment\nafter script"},
+        {"heading": "Errors 4xx", "text": "Throttling"},
+    ]
+
+
+@pytest.fixture
+def incremental_spider(tmp_path):
+    crawler = get_crawler(AwsDocsSpider, {
+        "INCREMENTAL_CRAWL": True,
+        "CRAWL_STATE_PATH": str(tmp_path / "state.sqlite3"),
+    })
+    spider = AwsDocsSpider.from_crawler(crawler)
+    yield spider
+    spider.crawl_state.close()
+
+
+def test_crawl_state_tracks_frontier_and_content(tmp_path):
+    state = CrawlState(str(tmp_path / "state.sqlite3"))
+    state.discover_many(["https://docs.aws.amazon.com/a", "https://docs.aws.amazon.com/b"])
+    state.discover_many(["https://docs.aws.amazon.com/a"])
+    assert sorted(state.known_urls()) == ["https://docs.aws.amazon.com/a", "https://docs.aws.amazon.com/b"]
+
+    assert state.content_hash("https://docs.aws.amazon.com/a") is None
+    state.record_page("https://docs.aws.amazon.com/a", "h1", '"v1"', None)
+    assert state.content_hash("https://docs.aws.amazon.com/a") == "h1"
+    assert state.validators("https://docs.aws.amazon.com/a") == ('"v1"', None)
+    state.close()
+
+
+def page_stored(spider, url):
+    spider.crawler.signals.send_catch_log(signal=item_stored, url=url, spider=spider)
+
+
+def test_incremental_crawl_sends_conditional_requests(incremental_spider):
+    middleware = IncrementalCrawlMiddleware.from_crawler(incremental_spider.crawler)
+    url = "https://docs.aws.amazon.com/AmazonS3/latest/userguide/start.html"
+    response = HtmlResponse(url=url, body=PAGE, headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"})
+    assert middleware.process_response(Request(url), response, incremental_spider) is response
+    list(incremental_spider.parse_docs(response))
+
+    # Validators are only used once the page has been stored
+    request = Request(url)
+    middleware.process_request(request, incremental_spider)
+    assert "If-None-Match" not in request.headers
+    page_stored(incremental_spider, url)
+
+    request = Request(url)
+    middleware.process_request(request, incremental_spider)
+    assert request.headers["If-None-Match"] == b'"v1"'
+    assert request.headers["If-Modified-Since"] == b"Mon, 01 Jan 2024 00:00:00 GMT"
+
+    with pytest.raises(IgnoreRequest):
+        middleware.process_response(request, HtmlResponse(url=url, status=304), incremental_spider)
+
+
+def test_incremental_crawl_skips_unchanged_pages(incremental_spider):
+    first = list(incremental_spider.parse_docs(make_response()))
+    # Not stored yet, so the page is still changed
+    assert len(list(incremental_spider.parse_docs(make_response()))) == 2
+    page_stored(incremental_spider, first[0]["url"])
+    second = list(incremental_spider.parse_docs(make_response()))
+    assert len(first) == 2 and len(second) == 1
+    assert isinstance(second[0], Request)
+    assert incremental_spider.crawler.stats.get_value("incremental/unchanged") == 1
+
+    seeds = [r.url for r in incremental_spider.start_requests()]
+    assert "https://docs.aws.amazon.com/AmazonS3/latest/userguide/s3-upload.html" in seeds
+
+
+@pytest.mark.parametrize("url", [
+    "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html",
+    "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html#intro",
+    "http://DOCS.aws.amazon.com/lambda/latest/dg/welcome.html?icmpid=docs_homepage",
+    "https://docs.aws.amazon.com/lambda//2015-03-31/dg/welcome.html",
+    "https://docs.aws.amazon.com/lambda/latest/api/../dg/./welcome.html",
+])
+def test_canonicalize_url(url):
+    assert canonicalize_url(url) == "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html"
+
+
+def test_bloom_filter_has_no_false_negatives(tmp_path):
+    path = str(tmp_path / "requests.bloom")
+    bloom = BloomFilter(10000, error_rate=0.01, path=path)
+    keys = [f"https://docs.aws.amazon.com/{i}" for i in range(5000)]
+    assert not any(bloom.add(key) for key in keys)
+    bloom.close()
+
+    reopened = BloomFilter(10000, error_rate=0.01, path=path)
+    assert all(key in reopened for key in keys)
+    false_positives = sum(f"https://docs.aws.amazon.com/other/{i}" in reopened for i in range(5000))
+    assert false_positives < 100
+    reopened.close()
+
+
+def test_dupefilter_matches_canonical_urls():
+    dupefilter = CanonicalBloomDupeFilter(capacity=1000)
+    assert not dupefilter.request_seen(Request("https://docs.aws.amazon.com/s3/latest/index.html"))
+    assert dupefilter.request_seen(Request("https://docs.aws.amazon.com/s3/latest/index.html#top"))
+    assert not dupefilter.request_seen(Request("https://docs.aws.amazon.com/s3/latest/other.html"))
+
+
+def test_link_extractor_filters_before_joining():
+    extractor = DocsLinkExtractor()
+    base = "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html"
+    links = extractor.extract(base, [
+        "getting-started.html", "getting-started.html#invoke", "#top", "mailto:docs@example.com",
+        "javascript:void(0)", "/assets/css/awsdocs.css", "images/diagram.png?v=2",
+        "https://aws.amazon.com/lambda/", "/lambda/2015-03-31/api/API_Invoke.html",
+    ])
+    assert links == [
+        "https://docs.aws.amazon.com/lambda/latest/dg/getting-started.html",
+        "https://docs.aws.amazon.com/lambda/latest/api/API_Invoke.html",
+    ]
+
+
+def test_link_extractor_resolves_dot_segments():
+    extractor = DocsLinkExtractor()
+    base = "https://docs.aws.amazon.com/lambda/latest/dg/welcome.html"
+    links = extractor.extract(base, [
+        "/lambda/latest/dg/../api/x.html", "../api/y.html", "./z.html",
+        "https://docs.aws.amazon.com/lambda/latest/dg/./../api/x.html",
+    ])
+    assert links == [
+        "https://docs.aws.amazon.com/lambda/latest/api/x.html",
+        "https://docs.aws.amazon.com/lambda/latest/api/y.html",
+        "https://docs.aws.amazon.com/lambda/latest/dg/z.html",
+    ]
+
+
+def test_link_extractor_restricts_sections():
+    extractor = DocsLinkExtractor(sections=["lambda"])
+    links = extractor.extract("https://docs.aws.amazon.com/", ["/lambda/latest/dg/a.html", "/AmazonS3/latest/b.html"])
+    assert links == ["https://docs.aws.amazon.com/lambda/latest/dg/a.html"]
+
+
+def test_extract_page_collects_links_outside_content():
+    page = extract_page(make_response(b"""
+        <html><head><title>T</title></head><body>
+        <nav><a href="nav.html">Nav</a></nav>
+        <div class="main-content"><h1>Head</h1><p>Body <a href="in.html">link</a></p></div>
+        <footer><a href="foot.html">Foot</a></footer></body></html>""").selector.root)
+    assert page["title"] == "T"
+    assert page["hrefs"] == ["nav.html", "in.html", "foot.html"]
+    assert page["content"]["text"] == "Head\nBody\nlink"
@@ -0,0 +1,65 @@
+import threading
+
+from aws_tutor_scraper.weaviate_writer import WeaviateBatchWriter
+
+
+def make_writer(client, **kwargs):
+    kwargs.setdefault("batch_size", 4)
+    kwargs.setdefault("retry_backoff", 0)
+    return WeaviateBatchWriter(client, **kwargs)
+
+
+def add_pages(writer, n):
+    for i in range(n):
+        writer.add({"url": f"https://docs.aws.amazon.com/{i}"}, vector=[0.0], uuid=str(i))
+
+
+def test_writes_in_batches(weaviate_client):
+    writer = make_writer(weaviate_client)
+    add_pages(writer, 10)
+    writer.close()
+    assert len(weaviate_client.batch.objects) == 10
+    assert weaviate_client.batch.calls == 3
+    assert writer.written == 10
+
+
+def test_only_failed_objects_are_retried(make_weaviate_client):
+    client = make_weaviate_client(reject={"https://docs.aws.amazon.com/1": 2})
+    sent = []
+    add = client.batch.add_data_object
+    client.batch.add_data_object = lambda obj, *a, **kw: (sent.append(obj["url"]), add(obj, *a, **kw))
+
+    writer = make_writer(client)
+    add_pages(writer, 4)
+    writer.close()
+
+    assert len(client.batch.objects) == 4
+    assert sent.count("https://docs.aws.amazon.com/1") == 3
+    assert sent.count("https://docs.aws.amazon.com/0") == 1
+
+
+def test_gives_up_after_max_retries(make_weaviate_client):
+    client = make_weaviate_client(reject={"https://docs.aws.amazon.com/0": 10})
+    writer = make_writer(client, max_retries=2)
+    add_pages(writer, 2)
+    writer.close()
+    assert writer.failed == 1
+    assert writer.written == 1
+
+
+def test_add_blocks_when_queue_is_full(weaviate_client):
+    client = weaviate_client
+    release = threading.Event()
+    create = client.batch.create_objects
+    client.batch.create_objects = lambda: (release.wait(), create())[1]
+
+    writer = make_writer(client, batch_size=1, max_pending=2)
+    producer = threading.Thread(target=add_pages, args=(writer, 6))
+    producer.start()
+    producer.join(timeout=0.2)
+    assert producer.is_alive()
+
+    release.set()
+    producer.join()
+    writer.close()
+    assert len(client.batch.objects) == 6
@@ -0,0 +1,91 @@
+# Split documentation pages into embedding-sized chunks.
+#
+# Chunks never cross a section heading, are sized by estimated token count
+# with a configurable overlap, and carry IDs that stay the same across crawls
+# as long as the page URL and section layout don't change.
+
+import re
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token for English text).
+    """
+    return max(1, len(text) // 4)
+
+
+def slugify(heading):
+    return re.sub(r"[^a-z0-9]+", "-", heading.lower()).strip("-") or "section"
+
+
+def split_long_line(line, max_tokens):
+    """
+    Break a single line that is over the token budget on word boundaries.
+    """
+    piece = []
+    for word in line.split():
+        if piece and estimate_tokens(" ".join(piece + [word])) > max_tokens:
+            yield " ".join(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        yield " ".join(piece)
+
+
+def iter_section_chunks(text, max_tokens, overlap_tokens):
+    """
+    Yield chunk texts for one section, packing whole lines up to `max_tokens`
+    and repeating up to `overlap_tokens` of trailing lines in the next chunk.
+    """
+    lines, tokens = [], 0
+    for raw in text.split("\n"):
+        for line in split_long_line(raw, max_tokens) if estimate_tokens(raw) > max_tokens else [raw]:
+            line_tokens = estimate_tokens(line)
+            if lines and tokens + line_tokens > max_tokens:
+                yield "\n".join(lines)
+                # Carry trailing lines over as overlap, but never a full chunk
+                overlap, overlap_size = [], 0
+                for prev in reversed(lines):
+                    prev_tokens = estimate_tokens(prev)
+                    if overlap_size + prev_tokens > overlap_tokens or overlap_size + prev_tokens + line_tokens > max_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_size += prev_tokens
+                lines, tokens = overlap, overlap_size
+            lines.append(line)
+            tokens += line_tokens
+    if lines:
+        yield "\n".join(lines)
+
+
+def iter_chunks(url, sections, max_tokens=512, overlap_tokens=64):
+    """
+    Stream chunks for a page given its sections as dicts with `heading` and
+    `text`. Each chunk is a dict with `id`, `heading`, `index` and `text`.
+
+    IDs have the form `<url>#<heading-slug>/<n>`, so editing one section only
+    changes the IDs of that section's chunks.
+    """
+    slugs = {}
+    index = 0
+    for section in sections:
+        heading = section.get('heading', "")
+        slug = slugify(heading)
+        slugs[slug] = slugs.get(slug, 0) + 1
+        if slugs[slug] > 1:
+            slug = f"{slug}-{slugs[slug]}"
+        for n, text in enumerate(iter_section_chunks(section['text'], max_tokens, overlap_tokens)):
+            yield {
+                "id": f"{url}#{slug}/{n}",
+                "heading": heading,
+                "index": index,
+                "text": f"{heading}\n{text}" if heading else text,
+            }
+            index += 1
+
+
+def chunk_document(url, sections, max_tokens=512, overlap_tokens=64):
+    """
+    Chunk a whole page. Top-level so it can be sent to a process pool.
+    """
+    return list(iter_chunks(url, sections, max_tokens, overlap_tokens))
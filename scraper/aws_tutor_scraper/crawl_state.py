@@ -0,0 +1,87 @@
+# Persistent crawl state for incremental re-crawls.
+#
+# Remembers every documentation URL seen so far (the frontier), the HTTP
+# validators each page was last served with, and a hash of its extracted
+# text, so a refresh only downloads and processes what changed.
+
+import sqlite3
+import time
+
+
+class CrawlState:
+    """
+    SQLite-backed URL frontier and page validator store.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_hash TEXT,"
+            " last_seen REAL,"
+            " last_changed REAL)"
+        )
+
+    def discover_many(self, urls):
+        """
+        Add URLs to the frontier. Already known URLs are left untouched.
+        """
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR IGNORE INTO pages (url) VALUES (?)", [(url,) for url in urls])
+        self.conn.execute("COMMIT")
+
+    def known_urls(self):
+        """
+        Iterate over every URL in the frontier.
+        """
+        for (url,) in self.conn.execute("SELECT url FROM pages"):
+            yield url
+
+    def validators(self, url):
+        """
+        Return the (etag, last_modified) the page was last served with.
+        """
+        row = self.conn.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        return row or (None, None)
+
+    def record_validators(self, url, etag, last_modified):
+        self.conn.execute(
+            "INSERT INTO pages (url, etag, last_modified, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET etag = excluded.etag,"
+            " last_modified = excluded.last_modified, last_seen = excluded.last_seen",
+            (url, etag, last_modified, time.time())
+        )
+
+    def touch(self, url):
+        self.conn.execute("UPDATE pages SET last_seen = ? WHERE url = ?", (time.time(), url))
+
+    def content_hash(self, url):
+        """
+        Return the hash of the page's text as last stored, or None.
+        """
+        row = self.conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def record_page(self, url, content_hash, etag, last_modified):
+        """
+        Record a changed page once it has been stored: its new content hash
+        and the validators it was served with.
+        """
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO pages (url, etag, last_modified, content_hash, last_seen, last_changed)"
+            " VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,"
+            " content_hash = excluded.content_hash, last_seen = excluded.last_seen,"
+            " last_changed = excluded.last_changed",
+            (url, etag, last_modified, content_hash, now, now)
+        )
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,123 @@
+# Request deduplication for multi-million URL crawls.
+#
+# Scrapy's default RFPDupeFilter keeps every request fingerprint in a Python
+# set, which grows without bound and doesn't know that two URLs are the same
+# docs page. This filter canonicalizes URLs first and records them in a
+# fixed-size Bloom filter, optionally backed by a memory-mapped file.
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.job import job_dir
+
+from .urls import canonicalize_url
+
+_HEADER = struct.Struct("<4sQI")
+_MAGIC = b"BLM1"
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter sized for `capacity` keys at `error_rate` false
+    positives. With a `path`, the bit array lives in a memory-mapped file and
+    survives restarts; otherwise it is an in-memory bytearray.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, path=None):
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.path = path
+        self._file = None
+        size = math.ceil(self.num_bits / 8)
+        if path is None:
+            self.bits = bytearray(size)
+            return
+
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            magic, self.num_bits, self.num_hashes = _HEADER.unpack(self._file.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+            size = math.ceil(self.num_bits / 8)
+        else:
+            self._file.write(_HEADER.pack(_MAGIC, self.num_bits, self.num_hashes))
+            self._file.truncate(_HEADER.size + size)
+        self._mmap = mmap.mmap(self._file.fileno(), _HEADER.size + size)
+        self.bits = memoryview(self._mmap)[_HEADER.size:]
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key):
+        """
+        Add a key. Returns True if it was (probably) already present.
+        """
+        bits = self.bits
+        seen = True
+        for p in self._positions(key):
+            byte, mask = p >> 3, 1 << (p & 7)
+            if not bits[byte] & mask:
+                seen = False
+                bits[byte] |= mask
+        return seen
+
+    def close(self):
+        if self._file is not None:
+            self.bits.release()
+            self._mmap.flush()
+            self._mmap.close()
+            self._file.close()
+            self._file = None
+
+
+class CanonicalBloomDupeFilter(BaseDupeFilter):
+    """
+    Dupefilter keyed on the request method and canonical URL, stored in a
+    BloomFilter. Memory use is fixed by DUPEFILTER_CAPACITY and
+    DUPEFILTER_ERROR_RATE; the filter is file-backed (and so resumable) under
+    JOBDIR or at DUPEFILTER_BLOOM_PATH.
+    """
+
+    def __init__(self, capacity=5000000, error_rate=0.001, path=None, stats=None, debug=False):
+        self.bloom = BloomFilter(capacity, error_rate, path)
+        self.stats = stats
+        self.debug = debug
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get("DUPEFILTER_BLOOM_PATH")
+        if not path and job_dir(settings):
+            path = os.path.join(job_dir(settings), "requests.bloom")
+        return cls(
+            capacity=settings.getint("DUPEFILTER_CAPACITY", 5000000),
+            error_rate=settings.getfloat("DUPEFILTER_ERROR_RATE", 0.001),
+            path=path,
+            stats=crawler.stats,
+            debug=settings.getbool("DUPEFILTER_DEBUG"),
+        )
+
+    def request_seen(self, request):
+        return self.bloom.add(f"{request.method} {canonicalize_url(request.url)}")
+
+    def close(self, reason):
+        self.bloom.close()
+
+    def log(self, request, spider):
+        if self.debug:
+            self.logger.debug(f"Filtered duplicate request: {request}")
+        if self.stats is not None:
+            self.stats.inc_value("dupefilter/filtered")
@@ -0,0 +1,108 @@
+# Persistent embedding cache for the item pipelines.
+#
+# Embeddings are keyed by a hash of the normalized page text and the model
+# name, so a re-crawl only pays for pages whose content actually changed.
+
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+
+# SQLite's default limit on host parameters in one statement is 999
+_MAX_PARAMS = 500
+
+
+def normalize_text(text):
+    """
+    Collapse whitespace so cosmetic HTML changes don't invalidate the cache.
+    """
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed embedding cache with least-recently-used eviction.
+
+    Vectors are stored as packed float32 blobs. Once the cache holds more than
+    `max_entries` embeddings, the least recently used ones are deleted.
+    Safe to use from several worker threads.
+    """
+
+    def __init__(self, path, max_entries=500000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def key(text, model):
+        digest = hashlib.sha256()
+        digest.update(model.encode())
+        digest.update(b"\0")
+        digest.update(normalize_text(text).encode())
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once. Returns a dict of the keys that were found.
+        """
+        found = {}
+        now = time.time()
+        with self.lock:
+            for start in range(0, len(keys), _MAX_PARAMS):
+                chunk = keys[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array('f', blob).tolist()
+                if rows:
+                    self.conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [now, *chunk]
+                    )
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, entries):
+        """
+        Store a dict of key -> embedding, evicting old entries if needed.
+        """
+        now = time.time()
+        rows = [(key, array('f', vector).tobytes(), now) for key, vector in entries.items()]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._evict()
+            self.conn.execute("COMMIT")
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT count(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,147 @@
+# Text, section and link extraction from documentation pages.
+#
+# Works directly on the lxml tree Scrapy has already parsed for the response
+# (Selector.root), so a page is parsed once instead of being re-serialized
+# and parsed again with BeautifulSoup, and walked once for its title, links
+# and content.
+
+from lxml import etree
+
+SECTION_HEADINGS = {'h1', 'h2', 'h3'}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+WALK_EVENTS = ("start", "end", "comment", "pi")
+
+
+def _clean(text):
+    return text.strip() if text else ""
+
+
+def heading_text(element):
+    return " ".join(t.strip() for t in element.itertext() if t.strip())
+
+
+def is_main_content(element):
+    return element.tag == 'div' and 'main-content' in (element.get('class') or "").split()
+
+
+class ContentCollector:
+    """
+    Accumulate text and h1-h3 sections from iterwalk events of one content
+    element (`root`).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.lines = []
+        self.sections = []
+        self.section = ""
+        self.heading = ""
+        self.section_lines = []
+        self.skip_depth = 0
+        self.heading_depth = 0
+
+    def emit(self, text):
+        text = _clean(text)
+        if text:
+            self.lines.append(text)
+            if not self.heading_depth:
+                self.section_lines.append(text)
+
+    def comment(self, element):
+        if not self.skip_depth:
+            self.emit(element.tail)
+
+    def start(self, element):
+        tag = element.tag
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        if self.skip_depth:
+            return
+        if tag in SECTION_HEADINGS:
+            self.close_section()
+            self.heading = heading_text(element)
+            self.heading_depth += 1
+        if not self.section and tag in ('h1', 'h2'):
+            self.section = heading_text(element)
+        self.emit(element.text)
+
+    def end(self, element):
+        tag = element.tag
+        if tag in SKIP_TAGS:
+            self.skip_depth -= 1
+        elif tag in SECTION_HEADINGS and not self.skip_depth:
+            self.heading_depth -= 1
+        if not self.skip_depth and element is not self.root:
+            self.emit(element.tail)
+
+    def close_section(self):
+        if self.section_lines:
+            self.sections.append({"heading": self.heading, "text": "\n".join(self.section_lines)})
+        self.section_lines = []
+
+    def result(self):
+        self.close_section()
+        return {"text": "\n".join(self.lines), "section": self.section, "sections": self.sections}
+
+
+def extract_content(root):
+    """
+    Walk a content element once and return a dict with:
+
+    - `text`: every non-empty text node, stripped, one per line
+    - `section`: the first h1/h2 heading, used as page-level metadata
+    - `sections`: list of {"heading", "text"} dicts split at h1-h3 headings
+    """
+    collector = ContentCollector(root)
+    for event, element in etree.iterwalk(root, events=WALK_EVENTS):
+        if event == "start":
+            collector.start(element)
+        elif event == "end":
+            collector.end(element)
+        else:
+            collector.comment(element)
+    return collector.result()
+
+
+def extract_page(document):
+    """
+    Walk a whole page once and return a dict with the page `title`, every
+    anchor `hrefs` in document order, and the `content` of the first
+    div.main-content (falling back to the first <article>) as returned by
+    extract_content, or None if the page has neither.
+    """
+    title = None
+    hrefs = []
+    collector = None
+    content = None
+    article = None
+
+    for event, element in etree.iterwalk(document, events=WALK_EVENTS):
+        collecting = collector is not None and content is None
+        if event == "start":
+            tag = element.tag
+            if tag == 'a':
+                href = element.get('href')
+                if href is not None:
+                    hrefs.append(href)
+            elif tag == 'title' and title is None:
+                title = element.text or ""
+            elif tag == 'article' and article is None:
+                article = element
+            if collector is None and is_main_content(element):
+                collector = ContentCollector(element)
+                collecting = True
+            if collecting:
+                collector.start(element)
+        elif not collecting:
+            continue
+        elif event == "end":
+            collector.end(element)
+            if element is collector.root:
+                content = collector.result()
+        else:
+            collector.comment(element)
+
+    if content is None and article is not None:
+        content = extract_content(article)
+    return {"title": title, "hrefs": hrefs, "content": content}
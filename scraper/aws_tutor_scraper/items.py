@@ -7,6 +7,12 @@ import scrapy
 
 
 class AwsTutorScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    title = scrapy.Field()
+    content = scrapy.Field()
+    url = scrapy.Field()
+    section = scrapy.Field()
+    timestamp = scrapy.Field()
+    # List of {"heading", "text"} dicts, split on h1-h3 headings
+    sections = scrapy.Field()
+    # List of {"id", "heading", "index", "text"} dicts set by ChunkingPipeline
+    chunks = scrapy.Field()
@@ -0,0 +1,72 @@
+# Link filtering for AwsDocsSpider.
+#
+# Raw hrefs are screened with precompiled patterns before any URL joining, so
+# the fragment-only anchors, static assets and mailto:/javascript: links that
+# make up much of a docs page never cost a urljoin or a Request.
+
+import re
+from urllib.parse import urljoin, urlsplit
+
+from .urls import canonicalize_url
+
+DOCS_URL = r"https://docs\.aws\.amazon\.com/.+"
+SKIPPED_HREF = re.compile(r"^(?:#|mailto:|javascript:|tel:|data:)", re.IGNORECASE)
+STATIC_ASSET = re.compile(
+    r"\.(?:png|jpe?g|gif|svg|ico|webp|css|js|json|xml|txt|pdf|zip|gz|woff2?|ttf|eot|mp4|webm)(?:[?#].*)?$",
+    re.IGNORECASE,
+)
+# Plain relative paths like "page.html" or "api/page.html#frag" that can be
+# resolved by string concatenation; anything with dot segments, a scheme or
+# a leading "/", "?" or "." goes through urljoin. Absolute and root-relative
+# hrefs are concatenated too unless they contain a "/." (possible dot
+# segment), which urljoin resolves.
+SIMPLE_RELATIVE = re.compile(r"^(?![./?])(?!.*(?:^|/)\.{1,2}(?:/|$|[?#]))[^:]*$")
+
+
+class DocsLinkExtractor:
+    """
+    Turn raw hrefs into the canonical documentation URLs worth following.
+
+    `allow` is the pattern a joined URL must match. `sections`, if given, is
+    a list of path prefixes (e.g. "/lambda/") that restrict the crawl to
+    those documentation sections.
+    """
+
+    def __init__(self, allow=DOCS_URL, sections=None):
+        self.allow = re.compile(allow)
+        self.sections = tuple(
+            f"https://docs.aws.amazon.com/{section.strip('/')}/" for section in sections or ()
+        )
+
+    def extract(self, base_url, hrefs):
+        """
+        Filter, resolve and canonicalize hrefs found on `base_url`.
+        Returns a de-duplicated list in page order.
+        """
+        links = {}
+        allow = self.allow.match
+        sections = self.sections
+        parts = urlsplit(base_url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        base_dir = origin + parts.path[:parts.path.rfind("/") + 1]
+        for href in hrefs:
+            href = href.strip()
+            if not href or SKIPPED_HREF.match(href) or STATIC_ASSET.search(href):
+                continue
+            if "/." in href:
+                url = urljoin(base_url, href)
+            elif href.startswith(("https://", "http://")):
+                url = href
+            elif href.startswith("/") and not href.startswith("//"):
+                url = origin + href
+            elif SIMPLE_RELATIVE.match(href):
+                url = base_dir + href
+            else:
+                url = urljoin(base_url, href)
+            if not allow(url):
+                continue
+            url = canonicalize_url(url)
+            if sections and not url.startswith(sections):
+                continue
+            links[url] = None
+        return list(links)
@@ -0,0 +1,54 @@
+# Prometheus metrics for the item pipelines, recorded like the backend's
+# chat stages (backend/app/utils/metrics.py): one histogram labelled by
+# stage, timed with .time(), e.g.
+#
+#     with STAGE_SECONDS.labels(stage="embed").time():
+#         response = openai.Embedding.create(...)
+#
+# Set METRICS_PORT to serve them over HTTP while crawling; see
+# MetricsExporter below.
+
+from prometheus_client import Counter, Histogram, start_http_server
+from scrapy.exceptions import NotConfigured
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "scraper_stage_seconds",
+    "Time per embeddings API call (embed), per chunk handed to the Weaviate "
+    "writer including backpressure (store) and per Weaviate batch write (write).",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    "scraper_embedding_cache_lookups_total",
+    "Embedding cache lookups by result (hit or miss).",
+    ["result"],
+)
+STORED_OBJECTS = Counter(
+    "scraper_stored_objects_total",
+    "Objects sent to Weaviate by result (written or failed after retries).",
+    ["result"],
+)
+UPSTREAM_ERRORS = Counter(
+    "scraper_upstream_errors_total",
+    "Failed calls to upstream services, by upstream and operation.",
+    ["upstream", "operation"],
+)
+
+
+class MetricsExporter:
+    """
+    Scrapy extension serving the metrics on METRICS_PORT (and METRICS_ADDR)
+    for the length of the crawl. Disabled unless METRICS_PORT is set.
+    """
+
+    def __init__(self, port, addr="0.0.0.0"):
+        start_http_server(port, addr)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        port = crawler.settings.getint("METRICS_PORT")
+        if not port:
+            raise NotConfigured
+        return cls(port, crawler.settings.get("METRICS_ADDR", "0.0.0.0"))
@@ -4,6 +4,7 @@
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
@@ -101,3 +102,44 @@ class AwsTutorScraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class IncrementalCrawlMiddleware:
+    """
+    Send conditional requests for pages fetched on a previous crawl and drop
+    304 Not Modified responses before they reach the spider.
+
+    Uses the spider's `crawl_state` (see aws_tutor_scraper.crawl_state),
+    where the spider records the validators of a page once it is stored.
+    Enabled with the INCREMENTAL_CRAWL setting.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_CRAWL"):
+            raise NotConfigured
+        return cls(crawler.stats)
+
+    def process_request(self, request, spider):
+        state = getattr(spider, "crawl_state", None)
+        if state is None:
+            return None
+        etag, last_modified = state.validators(request.url)
+        if etag:
+            request.headers.setdefault("If-None-Match", etag)
+        if last_modified:
+            request.headers.setdefault("If-Modified-Since", last_modified)
+        return None
+
+    def process_response(self, request, response, spider):
+        state = getattr(spider, "crawl_state", None)
+        if state is None:
+            return response
+        if response.status == 304:
+            state.touch(request.url)
+            self.stats.inc_value("incremental/not_modified")
+            raise IgnoreRequest(f"Not modified: {request.url}")
+        return response
@@ -6,12 +6,23 @@
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+import gzip
+import json
 import os
-import weaviate
-import openai
 from dotenv import load_dotenv
 import logging
+import threading
+from collections import deque
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from twisted.internet import defer, reactor, threads
+
+from .chunking import chunk_document, estimate_tokens
+from .embedding_cache import EmbeddingCache
+from .metrics import EMBEDDING_CACHE_LOOKUPS, STAGE_SECONDS, UPSTREAM_ERRORS
+from .signals import item_stored
+from .weaviate_schema import delete_stale_chunks, ensure_class
+from .weaviate_writer import WeaviateBatchWriter
 
 
 class AwsTutorScraperPipeline:
@@ -19,63 +30,479 @@ class AwsTutorScraperPipeline:
         return item
 
 
+def deferred_from_future(future):
+    """
+    Wrap a concurrent.futures.Future in a Deferred fired on the reactor thread.
+    """
+    d = defer.Deferred()
+
+    def done(f):
+        if f.exception() is not None:
+            reactor.callFromThread(d.errback, f.exception())
+        else:
+            reactor.callFromThread(d.callback, f.result())
+
+    future.add_done_callback(done)
+    return d
+
+
+class ChunkingPipeline:
+    """
+    Split each page into heading-aware, token-bounded chunks.
+
+    Small pages are chunked inline; larger ones are sent to a process pool so
+    the reactor keeps crawling while they are split.
+    """
+
+    def __init__(self, max_tokens=512, overlap_tokens=64, inline_max_tokens=2000, workers=None):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.inline_max_tokens = inline_max_tokens
+        self.workers = workers
+        self.executor = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            max_tokens=settings.getint("CHUNK_MAX_TOKENS", 512),
+            overlap_tokens=settings.getint("CHUNK_OVERLAP_TOKENS", 64),
+            inline_max_tokens=settings.getint("CHUNKING_INLINE_MAX_TOKENS", 2000),
+            workers=settings.getint("CHUNKING_WORKERS") or None,
+        )
+
+    def open_spider(self, spider):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close_spider(self, spider):
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+    def process_item(self, item, spider):
+        sections = item.get('sections') or [{"heading": item['section'], "text": item['content']}]
+        args = (item['url'], sections, self.max_tokens, self.overlap_tokens)
+        if self.executor is None or estimate_tokens(item['content']) <= self.inline_max_tokens:
+            item['chunks'] = chunk_document(*args)
+            return item
+
+        d = deferred_from_future(self.executor.submit(chunk_document, *args))
+
+        def set_chunks(chunks):
+            item['chunks'] = chunks
+            return item
+
+        return d.addCallback(set_chunks)
+
+
+class ShardExportPipeline:
+    """
+    Stream items to rotated shard files in EXPORT_DIR so embedding can run
+    as a separate job (ingestion/ingest.py) instead of inside the crawl.
+
+    Shards are gzip-compressed JSONL or, with EXPORT_FORMAT = "parquet" and
+    pyarrow installed, Parquet files of at most `shard_items` items. Each
+    shard is written under a ".part" name and renamed once complete, so a
+    consumer only ever sees finished shards. Its pages are reported as
+    stored (the item_stored signal) then.
+    """
+
+    FORMATS = {"jsonl": ".jsonl.gz", "parquet": ".parquet"}
+
+    def __init__(self, export_dir, export_format="jsonl", shard_items=10000, signals=None):
+        if export_format not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        self.export_dir = export_dir
+        self.export_format = export_format
+        self.shard_items = shard_items
+        self.prefix = None
+        self.shard = 0
+        self.count = 0
+        self.file = None
+        self.rows = []
+        # URLs of the pages in the current shard
+        self.urls = []
+        self.signals = signals
+        self.spider = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            export_dir=settings.get("EXPORT_DIR", "export"),
+            export_format=settings.get("EXPORT_FORMAT", "jsonl"),
+            shard_items=settings.getint("EXPORT_SHARD_ITEMS", 10000),
+            signals=crawler.signals,
+        )
+
+    def open_spider(self, spider):
+        self.spider = spider
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.prefix = f"{spider.name}-{datetime.utcnow():%Y%m%dT%H%M%S}"
+
+    def close_spider(self, spider):
+        self.finish_shard()
+
+    def process_item(self, item, spider):
+        record = ItemAdapter(item).asdict()
+        if self.export_format == "parquet":
+            self.rows.append(record)
+        else:
+            if self.file is None:
+                self.file = gzip.open(self.part_path(), "wt", encoding="utf-8")
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.urls.append(record.get('url'))
+        self.count += 1
+        if self.count >= self.shard_items:
+            self.finish_shard()
+        return item
+
+    def shard_path(self):
+        name = f"{self.prefix}-{self.shard:05d}{self.FORMATS[self.export_format]}"
+        return os.path.join(self.export_dir, name)
+
+    def part_path(self):
+        return self.shard_path() + ".part"
+
+    def finish_shard(self):
+        """
+        Close the current shard and publish it under its final name.
+        """
+        if not self.count:
+            return
+        if self.export_format == "parquet":
+            write_parquet(self.rows, self.part_path())
+            self.rows = []
+        else:
+            self.file.close()
+            self.file = None
+        os.replace(self.part_path(), self.shard_path())
+        self.logger.info(f"Exported {self.count} items to {self.shard_path()}")
+        self.shard += 1
+        self.count = 0
+        urls, self.urls = self.urls, []
+        if self.signals is not None:
+            for url in urls:
+                self.signals.send_catch_log(signal=item_stored, url=url, spider=self.spider)
+
+
+def write_parquet(rows, path):
+    """
+    Write item dicts to a Parquet file. Requires pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("EXPORT_FORMAT = 'parquet' requires pyarrow to be installed")
+
+    section = pa.struct([("heading", pa.string()), ("text", pa.string())])
+    chunk = pa.struct([
+        ("id", pa.string()), ("heading", pa.string()), ("index", pa.int64()), ("text", pa.string()),
+    ])
+    schema = pa.schema([
+        ("title", pa.string()),
+        ("content", pa.string()),
+        ("url", pa.string()),
+        ("section", pa.string()),
+        ("timestamp", pa.string()),
+        ("sections", pa.list_(section)),
+        ("chunks", pa.list_(chunk)),
+    ])
+    pq.write_table(pa.Table.from_pylist(rows, schema=schema), path, compression="zstd")
+
+
 class WeaviatePipeline:
-    def __init__(self):
+    def __init__(self, client=None, batch_size=64, max_batch_tokens=50000,
+                 max_pending_batches=4, embedding_model="text-embedding-ada-002",
+                 write_batch_size=100, max_pending_writes=1000, write_flush_interval=1.0,
+                 write_max_retries=3, cache=None, signals=None):
         load_dotenv(os.path.join(os.path.dirname(__file__), '../../backend/.env'))
         self.vector_db_url = os.getenv("VECTOR_DB_URL")
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        openai.api_key = self.openai_api_key
-        self.client = weaviate.Client(self.vector_db_url)
+        # The Weaviate client and writer are created on first use, and the
+        # weaviate and openai packages imported then: together they take
+        # longer to import than the rest of the crawler, and Scrapy builds
+        # every configured pipeline at startup.
+        self._client = client
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        # Whether the class matches URLs exactly, so stale chunks can be
+        # deleted (see weaviate_schema); checked when the writer starts
+        self.delete_stale = False
         self.logger = logging.getLogger(__name__)
 
+        self.embedding_model = embedding_model
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.batch = []
+        self.batch_tokens = 0
+        # Batches are embedded off the reactor thread; the semaphore caps how
+        # many are in flight so a slow API pushes back on the crawler.
+        self.semaphore = defer.DeferredSemaphore(max_pending_batches)
+        self.pending = set()
+        # url -> [chunks not yet written, whether any failed, chunk IDs, or
+        # None for pages no previous crawl stored, which have no stale chunks].
+        # Completed pages are queued in `stored` by the writer thread and
+        # reported (the item_stored signal) from the reactor thread.
+        self.signals = signals
+        self.pages = {}
+        self.pages_lock = threading.Lock()
+        self.stored = deque()
+        self.write_options = dict(
+            class_name="AWSDocument",
+            batch_size=write_batch_size,
+            max_pending=max_pending_writes,
+            flush_interval=write_flush_interval,
+            max_retries=write_max_retries,
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            import weaviate
+            self._client = weaviate.Client(self.vector_db_url)
+        return self._client
+
+    @property
+    def writer(self):
+        """
+        The Weaviate batch writer, started by the first batch to be stored.
+        Batches are stored from worker threads, hence the lock.
+        """
+        with self._writer_lock:
+            if self._writer is None:
+                self.delete_stale = ensure_class(self.client, self.write_options["class_name"])
+                self._writer = WeaviateBatchWriter(self.client, **self.write_options)
+        return self._writer
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        cache_path = settings.get("EMBEDDING_CACHE_PATH")
+        cache = None
+        if cache_path:
+            cache = EmbeddingCache(cache_path, max_entries=settings.getint("EMBEDDING_CACHE_MAX_ENTRIES", 500000))
+        return cls(
+            batch_size=settings.getint("EMBEDDING_BATCH_SIZE", 64),
+            max_batch_tokens=settings.getint("EMBEDDING_BATCH_MAX_TOKENS", 50000),
+            max_pending_batches=settings.getint("EMBEDDING_MAX_PENDING_BATCHES", 4),
+            embedding_model=settings.get("EMBEDDING_MODEL", "text-embedding-ada-002"),
+            write_batch_size=settings.getint("WEAVIATE_BATCH_SIZE", 100),
+            max_pending_writes=settings.getint("WEAVIATE_MAX_PENDING_OBJECTS", 1000),
+            write_flush_interval=settings.getfloat("WEAVIATE_FLUSH_INTERVAL", 1.0),
+            write_max_retries=settings.getint("WEAVIATE_MAX_RETRIES", 3),
+            cache=cache,
+            signals=crawler.signals,
+        )
+
     def process_item(self, item, spider):
         """
-        Process each scraped item: generate embedding and store in Weaviate.
+        Queue each chunk of a scraped item for batched embedding and storage
+        in Weaviate.
+
+        Returns a Deferred when the item fills one or more batches, so the
+        item only leaves the pipeline once all of them have been embedded
+        and stored.
+        The page is reported as stored once all of its chunks are written
+        and the objects of chunks it no longer has are deleted.
+        """
+        self.report_stored(spider)
+        chunks = self.chunks_for(item)
+        chunk_ids = {chunk['id'] for chunk in chunks} if self.stored_before(item['url'], spider) else None
+        with self.pages_lock:
+            self.pages[item['url']] = [len(chunks), False, chunk_ids]
+        flushed = []
+        for chunk in chunks:
+            tokens = estimate_tokens(chunk['text'])
+            if self.batch and self.batch_tokens + tokens > self.max_batch_tokens:
+                flushed.append(self.flush())
+            self.batch.append((item, chunk))
+            self.batch_tokens += tokens
+            if len(self.batch) >= self.batch_size:
+                flushed.append(self.flush())
+        if flushed:
+            return defer.DeferredList(flushed).addCallback(lambda _: item)
+        return item
+
+    def stored_before(self, url, spider):
+        """
+        Whether a previous crawl may have stored the page at `url`: unknown
+        (so True) without the spider's crawl state, which only records a
+        page's hash once it is stored.
+        """
+        state = getattr(spider, "crawl_state", None)
+        return state is None or state.content_hash(url) is not None
+
+    def chunks_for(self, item):
+        """
+        Chunks set by ChunkingPipeline, or the whole page as a single chunk.
+        """
+        if item.get('chunks'):
+            return item['chunks']
+        return [{"id": item['url'], "heading": item['section'], "index": 0, "text": item['content']}]
+
+    def close_spider(self, spider):
+        """
+        Flush the last partial batch, wait for all in-flight batches and
+        drain the Weaviate writer.
+        """
+        if self.batch:
+            self.flush()
+        d = defer.DeferredList(list(self.pending))
+        d.addCallback(lambda _: self.close_writer())
+        d.addCallback(lambda _: self.report_stored(spider))
+        if self.cache is not None:
+            d.addCallback(lambda _: self.close_cache())
+        return d
+
+    def chunk_done(self, url, ok):
+        """
+        Count a chunk of the page at `url` as written (or failed). Called
+        from worker threads; the last chunk is written from the writer's.
         """
+        with self.pages_lock:
+            page = self.pages.get(url)
+            if page is None:
+                return
+            page[0] -= 1
+            page[1] = page[1] or not ok
+            if page[0] > 0:
+                return
+            del self.pages[url]
+        if page[1]:
+            return
         try:
-            # Generate embedding
-            embedding = self.generate_embedding(item['content'])
+            if page[2] is not None and self.delete_stale:
+                deleted = delete_stale_chunks(self.client, self.write_options["class_name"], url, page[2])
+                if deleted:
+                    self.logger.info(f"Deleted {deleted} stale chunks of {url}")
+        except Exception as e:
+            # Not reported as stored, so the next crawl processes it again
+            UPSTREAM_ERRORS.labels("weaviate", "delete").inc()
+            self.logger.error(f"Could not delete stale chunks of {url}: {e}")
+            return
+        self.stored.append(url)
+
+    def report_stored(self, spider):
+        while self.stored:
+            url = self.stored.popleft()
+            if self.signals is not None:
+                self.signals.send_catch_log(signal=item_stored, url=url, spider=spider)
+
+    def close_writer(self):
+        if self._writer is None:
+            return None
+        return threads.deferToThread(self._writer.close)
+
+    def close_cache(self):
+        self.logger.info(
+            f"Embedding cache: {self.cache.hits} hits, {self.cache.misses} misses"
+        )
+        self.cache.close()
+
+    def flush(self):
+        """
+        Hand the current batch to a worker thread and start a new one.
+        """
+        batch, self.batch, self.batch_tokens = self.batch, [], 0
+        d = self.semaphore.run(threads.deferToThread, self.process_batch, batch)
+        self.pending.add(d)
+        d.addErrback(lambda failure: self.logger.error(f"Error processing batch: {failure.value}"))
+        d.addBoth(self._batch_done, d)
+        return d
+
+    def _batch_done(self, result, d):
+        self.pending.discard(d)
+        return result
+
+    def process_batch(self, batch):
+        """
+        Embed a batch of (item, chunk) pairs with a single API call and store
+        the results. Runs in a worker thread.
+        """
+        embeddings = self.generate_embeddings([chunk['text'] for _, chunk in batch])
+        for (item, chunk), embedding in zip(batch, embeddings):
             if not embedding:
                 self.logger.error(f"Embedding generation failed for URL: {item['url']}")
-                return item
+                self.chunk_done(item['url'], False)
+                continue
+            try:
+                self.store_embedding(item, embedding, chunk)
+                self.logger.info(f"Stored data for URL: {item['url']}")
+            except Exception as e:
+                self.logger.error(f"Error processing item: {e}")
+                self.chunk_done(item['url'], False)
 
-            # Store in Weaviate
-            self.store_embedding(item, embedding)
-            self.logger.info(f"Stored data for URL: {item['url']}")
-        except Exception as e:
-            self.logger.error(f"Error processing item: {e}")
-        return item
+    def generate_embeddings(self, texts):
+        """
+        Generate embeddings for several texts, serving unchanged texts from
+        the embedding cache and requesting the rest in one OpenAI API call.
+        Returns a list aligned with `texts`, with None for failures.
+        """
+        if self.cache is None:
+            return self.request_embeddings(texts)
 
-    def generate_embedding(self, text):
+        keys = [EmbeddingCache.key(text, self.embedding_model) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        EMBEDDING_CACHE_LOOKUPS.labels("hit").inc(len(keys) - len(missing))
+        EMBEDDING_CACHE_LOOKUPS.labels("miss").inc(len(missing))
+        if missing:
+            fresh = self.request_embeddings([texts[i] for i in missing])
+            new_entries = {keys[i]: emb for i, emb in zip(missing, fresh) if emb}
+            if new_entries:
+                self.cache.put_many(new_entries)
+            cached.update(new_entries)
+        return [cached.get(key) for key in keys]
+
+    def request_embeddings(self, texts):
         """
-        Generate embedding using OpenAI's API.
+        Generate embeddings for several texts in one OpenAI API call.
         """
+        import openai
+        openai.api_key = self.openai_api_key
         try:
-            response = openai.Embedding.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response['data'][0]['embedding']
+            with STAGE_SECONDS.labels(stage="embed").time():
+                response = openai.Embedding.create(
+                    input=texts,
+                    model=self.embedding_model
+                )
+            data = sorted(response['data'], key=lambda d: d['index'])
+            return [d['embedding'] for d in data]
         except Exception as e:
+            UPSTREAM_ERRORS.labels("openai", "embed").inc()
             self.logger.error(f"OpenAI API error: {e}")
-            return None
+            return [None] * len(texts)
 
-    def store_embedding(self, item, embedding):
+    def generate_embedding(self, text):
         """
-        Store the content and its embedding in Weaviate.
+        Generate embedding using OpenAI's API.
         """
-        try:
-            self.client.data_object.create(
+        return self.generate_embeddings([text])[0]
+
+    def store_embedding(self, item, embedding, chunk=None):
+        """
+        Queue the content and its embedding for a batched write to Weaviate.
+        Blocks while the writer's queue is full.
+        """
+        from weaviate.util import generate_uuid5
+        chunk = chunk or self.chunks_for(item)[0]
+        with STAGE_SECONDS.labels(stage="store").time():
+            self.writer.add(
                 {
                     "title": item['title'],
-                    "content": item['content'],
+                    "content": chunk['text'],
                     "url": item['url'],
-                    "section": item['section'],
+                    "section": chunk['heading'] or item['section'],
+                    "chunk_id": chunk['id'],
+                    "chunk_index": chunk['index'],
                     "timestamp": item['timestamp'],
                     "source": "AWS Documentation"
                 },
-                "AWSDocument",
-                vector=embedding
+                vector=embedding,
+                uuid=generate_uuid5(chunk['id']),
+                done=lambda ok, url=item['url']: self.chunk_done(url, ok),
             )
-        except Exception as e:
-            self.logger.error(f"Weaviate storage error: {e}")
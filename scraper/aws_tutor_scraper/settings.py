@@ -50,9 +50,18 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "aws_tutor_scraper.middlewares.AwsTutorScraperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "aws_tutor_scraper.middlewares.IncrementalCrawlMiddleware": 900,
+}
+
+# Incremental re-crawls: re-request every URL in the persistent frontier at
+# CRAWL_STATE_PATH with If-None-Match / If-Modified-Since, drop 304s and only
+# pass pages whose text changed on to the item pipelines. A changed page is
+# only recorded once WeaviatePipeline or ShardExportPipeline has stored it,
+# so without either every page is processed again on the next crawl. For a
+# nightly refresh run: scrapy crawl aws_docs -s INCREMENTAL_CRAWL=True
+INCREMENTAL_CRAWL = False
+CRAWL_STATE_PATH = "crawl_state.sqlite3"
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -60,11 +69,77 @@ ROBOTSTXT_OBEY = True
 #    "scrapy.extensions.telnet.TelnetConsole": None,
 #}
 
+# Prometheus metrics of the item pipelines (embed and store latency, cache
+# hits, upstream errors; see aws_tutor_scraper/metrics.py) are served on
+# METRICS_PORT while crawling. Unset to disable.
+EXTENSIONS = {
+    "aws_tutor_scraper.metrics.MetricsExporter": 500,
+}
+METRICS_PORT = None
+
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 #ITEM_PIPELINES = {
-#    "aws_tutor_scraper.pipelines.AwsTutorScraperPipeline": 300,
+#    "aws_tutor_scraper.pipelines.ChunkingPipeline": 200,
+#    "aws_tutor_scraper.pipelines.WeaviatePipeline": 300,
 #}
+# To decouple crawling from embedding, export shards instead of embedding
+# inline and run ingestion/ingest.py over EXPORT_DIR:
+#ITEM_PIPELINES = {
+#    "aws_tutor_scraper.pipelines.ChunkingPipeline": 200,
+#    "aws_tutor_scraper.pipelines.ShardExportPipeline": 300,
+#}
+
+# ShardExportPipeline writes items to EXPORT_DIR in shards of at most
+# EXPORT_SHARD_ITEMS items, as gzipped JSONL ("jsonl") or Parquet
+# ("parquet", requires pyarrow).
+EXPORT_DIR = "export"
+EXPORT_FORMAT = "jsonl"
+EXPORT_SHARD_ITEMS = 10000
+
+# ChunkingPipeline splits pages at h1-h3 headings into chunks of at most
+# CHUNK_MAX_TOKENS (estimated) tokens, overlapping by CHUNK_OVERLAP_TOKENS.
+# Pages above CHUNKING_INLINE_MAX_TOKENS are chunked in a pool of
+# CHUNKING_WORKERS processes (default: one per CPU).
+CHUNK_MAX_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+CHUNKING_INLINE_MAX_TOKENS = 2000
+#CHUNKING_WORKERS = 4
+
+# Batched embedding in WeaviatePipeline: a batch is flushed once it holds
+# EMBEDDING_BATCH_SIZE items or its estimated token count would exceed
+# EMBEDDING_BATCH_MAX_TOKENS. At most EMBEDDING_MAX_PENDING_BATCHES batches
+# are embedded concurrently off the reactor thread.
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_BATCH_MAX_TOKENS = 50000
+EMBEDDING_MAX_PENDING_BATCHES = 4
+
+# Embeddings are cached on disk by content hash and model so re-crawls only
+# embed pages whose text changed. Set EMBEDDING_CACHE_PATH to None to disable.
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite3"
+EMBEDDING_CACHE_MAX_ENTRIES = 500000
+
+# Weaviate writes are batched by a background writer. Producers block once
+# WEAVIATE_MAX_PENDING_OBJECTS objects are queued; objects rejected by
+# Weaviate are retried individually up to WEAVIATE_MAX_RETRIES times.
+WEAVIATE_BATCH_SIZE = 100
+WEAVIATE_MAX_PENDING_OBJECTS = 1000
+WEAVIATE_FLUSH_INTERVAL = 1.0
+WEAVIATE_MAX_RETRIES = 3
+
+# Restrict the crawl to these documentation sections (URL path prefixes such
+# as "lambda" or "AmazonS3"). Empty means all of docs.aws.amazon.com.
+DOCS_SECTIONS = []
+
+# Deduplicate requests on canonical URLs with a fixed-size Bloom filter
+# (~9 MB for 5M URLs at 0.1% false positives). The filter is persisted under
+# JOBDIR when set, or at DUPEFILTER_BLOOM_PATH. A filter persisted across
+# separate crawls would drop the incremental-crawl frontier seeds, so only
+# set DUPEFILTER_BLOOM_PATH for a single resumable crawl.
+DUPEFILTER_CLASS = "aws_tutor_scraper.dedup.CanonicalBloomDupeFilter"
+DUPEFILTER_CAPACITY = 5000000
+DUPEFILTER_ERROR_RATE = 0.001
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -0,0 +1,7 @@
+# Signals sent by the item pipelines, in addition to Scrapy's own.
+
+# A page has been stored: every chunk of it was written to Weaviate, or the
+# export shard holding it was published. Sent with `url` and `spider`.
+# Incremental crawls only record a page's content hash and validators then,
+# so a page that never reached storage is processed again on the next crawl.
+item_stored = object()
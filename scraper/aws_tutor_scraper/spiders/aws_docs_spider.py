@@ -1,8 +1,11 @@
 import scrapy
+from scrapy import signals
+from aws_tutor_scraper.crawl_state import CrawlState
+from aws_tutor_scraper.extraction import extract_page
 from aws_tutor_scraper.items import AwsTutorScraperItem
-from urllib.parse import urljoin
-import re
-from bs4 import BeautifulSoup
+from aws_tutor_scraper.links import DocsLinkExtractor
+from aws_tutor_scraper.signals import item_stored
+import hashlib
 from datetime import datetime
 
 class AwsDocsSpider(scrapy.Spider):
@@ -16,49 +19,106 @@ class AwsDocsSpider(scrapy.Spider):
         'ROBOTSTXT_OBEY': True,
     }
 
+    crawl_state = None
+    # url -> (content hash, etag, last modified) of changed pages not yet stored
+    pending_pages = None
+    link_extractor = DocsLinkExtractor()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        sections = crawler.settings.getlist("DOCS_SECTIONS")
+        if sections:
+            spider.link_extractor = DocsLinkExtractor(sections=sections)
+        if crawler.settings.getbool("INCREMENTAL_CRAWL"):
+            spider.crawl_state = CrawlState(crawler.settings.get("CRAWL_STATE_PATH"))
+            spider.pending_pages = {}
+            crawler.signals.connect(spider.page_stored, signal=item_stored)
+            crawler.signals.connect(spider.close_crawl_state, signal=signals.spider_closed)
+        return spider
+
+    def start_requests(self):
+        """
+        Start from the docs homepage and, on incremental crawls, from every
+        page in the persistent frontier.
+        """
+        for url in self.start_urls:
+            yield scrapy.Request(url=url, dont_filter=True)
+        if self.crawl_state is not None:
+            for url in self.crawl_state.known_urls():
+                yield scrapy.Request(url=url, callback=self.parse_docs)
+
+    def close_crawl_state(self, spider):
+        self.crawl_state.close()
+
     def parse(self, response):
         """
         Parse the homepage and extract internal links to follow.
         """
-        internal_links = response.css("a::attr(href)").getall()
-        for link in internal_links:
-            link = link.strip()
-            if not link.startswith("http"):
-                link = urljoin(response.url, link)
-            if re.match(r"https://docs\.aws\.amazon\.com/.+", link):
-                yield scrapy.Request(url=link, callback=self.parse_docs)
+        page = extract_page(response.selector.root)
+        yield from self.follow_links(self.link_extractor.extract(response.url, page['hrefs']))
+
+    def follow_links(self, links):
+        """
+        Build requests for canonical documentation links, recording them in
+        the frontier on incremental crawls.
+        """
+        if self.crawl_state is not None:
+            self.crawl_state.discover_many(links)
+        for link in links:
+            yield scrapy.Request(url=link, callback=self.parse_docs)
     
     def parse_docs(self, response):
         """
         Parse individual documentation pages and extract content.
         """
         item = AwsTutorScraperItem()
-        item['title'] = response.css("title::text").get().strip()
-        # Adjust the selector based on AWS docs structure
-        content_div = response.css("div.main-content").get() or response.css("article").get()
-        if content_div:
-            # Clean and extract text
-            soup = BeautifulSoup(content_div, 'html.parser')
-            text = soup.get_text(separator="\n", strip=True)
+        # Title, links and content (div.main-content, else <article>) all
+        # come from a single walk over the already-parsed tree
+        page = extract_page(response.selector.root)
+        item['title'] = (page['title'] or "").strip()
+        extracted = page['content']
+        if extracted:
+            text = extracted['text']
+            changed = self.content_changed(response, text)
             item['content'] = text
             item['url'] = response.url
-            item['section'] = self.extract_section(soup)
+            item['section'] = extracted['section']
+            item['sections'] = extracted['sections']
             item['timestamp'] = datetime.utcnow().isoformat()
-            yield item
+            if changed:
+                yield item
 
             # Recursively follow internal links within the page
-            internal_links = response.css("a::attr(href)").getall()
-            for link in internal_links:
-                link = link.strip()
-                if not link.startswith("http"):
-                    link = urljoin(response.url, link)
-                if re.match(r"https://docs\.aws\.amazon\.com/.+", link):
-                    yield scrapy.Request(url=link, callback=self.parse_docs)
+            yield from self.follow_links(self.link_extractor.extract(response.url, page['hrefs']))
+
+    def content_changed(self, response, text):
+        """
+        On incremental crawls, check the page text against the hash stored
+        on the previous crawl. Always True otherwise.
+
+        The new hash and validators of a changed page are only recorded by
+        `page_stored()`, so a page whose storage fails is not mistaken for
+        unchanged on the next crawl.
+        """
+        if self.crawl_state is None:
+            return True
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        validators = (etag.decode() if etag else None, last_modified.decode() if last_modified else None)
+        if self.crawl_state.content_hash(response.url) != content_hash:
+            self.pending_pages[response.url] = (content_hash,) + validators
+            return True
+        self.crawl_state.record_validators(response.url, *validators)
+        self.crawler.stats.inc_value("incremental/unchanged")
+        return False
 
-    def extract_section(self, soup):
+    def page_stored(self, url):
         """
-        Extract the current section or heading for metadata.
+        Record a changed page in the crawl state once a pipeline has stored
+        it (the item_stored signal).
         """
-        # Example: Extract h1 or h2 tags
-        section = soup.find(['h1', 'h2'])
-        return section.get_text().strip() if section else ""
+        page = self.pending_pages.pop(url, None)
+        if page is not None:
+            self.crawl_state.record_page(url, *page)
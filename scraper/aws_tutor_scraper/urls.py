@@ -0,0 +1,42 @@
+# URL canonicalization for AWS documentation links.
+#
+# Many links point at the same page: with #fragments, tracking query strings
+# (?icmpid=..., ?id=docs_gateway) or a dated API version instead of /latest/.
+# Canonicalizing before scheduling lets the dupefilter treat them as one URL.
+
+import posixpath
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+DOCS_ORIGIN = "https://docs.aws.amazon.com"
+QUERY_OR_FRAGMENT = re.compile(r"[?#]")
+VERSIONED_SEGMENT = re.compile(r"/\d{4}-\d{2}-\d{2}(?=/)")
+REPEATED_SLASHES = re.compile(r"/{2,}")
+
+
+def _canonical_path(path):
+    path = REPEATED_SLASHES.sub("/", path) or "/"
+    if "/." in path:
+        # Resolve "." and ".." segments, keeping a trailing slash
+        trailing = path.endswith(("/", "/.", "/.."))
+        path = posixpath.normpath(path)
+        if trailing and path != "/":
+            path += "/"
+    return VERSIONED_SEGMENT.sub("/latest", path)
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url):
+    """
+    Normalize a docs URL: https scheme, lowercase host, no query string or
+    fragment, no duplicate slashes or dot segments, and dated version
+    segments mapped to /latest/.
+    """
+    url = url.strip()
+    if url.startswith(DOCS_ORIGIN + "/"):
+        # Fast path for the common case: skip urlsplit/urlunsplit
+        path = QUERY_OR_FRAGMENT.split(url[len(DOCS_ORIGIN):], 1)[0]
+        return DOCS_ORIGIN + _canonical_path(path)
+    parts = urlsplit(url)
+    return urlunsplit(("https", parts.netloc.lower(), _canonical_path(parts.path), "", ""))
@@ -0,0 +1,74 @@
+# Weaviate class setup and stale chunk cleanup, shared by WeaviatePipeline and
+# the ingestion job.
+#
+# A page's chunks are stored as objects whose UUIDs derive from the chunk IDs,
+# so re-storing a page overwrites its current chunks in place. Chunks it no
+# longer has (the page shrank or a heading was renamed) are removed with one
+# batch delete filtered on the page URL. That filter has to match URLs
+# exactly: with Weaviate's default "word" tokenization, url Equal
+# ".../lambda/" would also match every page below it. The class is therefore
+# created with "field" tokenization for url and chunk_id, and classes created
+# otherwise (e.g. by auto-schema) are left alone.
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXACT_PROPERTIES = ("url", "chunk_id")
+
+
+def ensure_class(client, class_name):
+    """
+    Create `class_name` if it doesn't exist yet, with url and chunk_id
+    matched exactly by filters. Returns whether stale chunks can be
+    deleted safely, i.e. whether both properties are field-tokenized.
+    """
+    schema = _class_schema(client, class_name)
+    if schema is None:
+        try:
+            client.schema.create_class({
+                "class": class_name,
+                "vectorizer": "none",
+                "properties": [
+                    {"name": name, "dataType": ["text"], "tokenization": "field"}
+                    for name in EXACT_PROPERTIES
+                ],
+            })
+        except Exception as e:
+            # Another process may have created it in the meantime
+            logger.warning(f"Could not create Weaviate class {class_name}: {e}")
+        schema = _class_schema(client, class_name) or {}
+    tokenization = {prop["name"]: prop.get("tokenization") for prop in schema.get("properties", [])}
+    exact = all(tokenization.get(name) == "field" for name in EXACT_PROPERTIES)
+    if not exact:
+        logger.warning(
+            f"Weaviate class {class_name} does not tokenize {' and '.join(EXACT_PROPERTIES)} as 'field'; "
+            "chunks that re-processed pages no longer have are not deleted. Recreate the class to fix this."
+        )
+    return exact
+
+
+def _class_schema(client, class_name):
+    for schema in client.schema.get().get("classes") or []:
+        if schema["class"] == class_name:
+            return schema
+    return None
+
+
+def delete_stale_chunks(client, class_name, url, chunk_ids):
+    """
+    Delete the objects of the page at `url` whose chunk ID is not one of
+    `chunk_ids`, with a single batch delete. Returns the number deleted.
+    """
+    where = {
+        "operator": "And",
+        "operands": [{"path": ["url"], "operator": "Equal", "valueText": url}] + [
+            {"path": ["chunk_id"], "operator": "NotEqual", "valueText": chunk_id}
+            for chunk_id in sorted(chunk_ids)
+        ],
+    }
+    result = client.batch.delete_objects(class_name, where, output="minimal")
+    results = (result or {}).get("results") or {}
+    if results.get("failed"):
+        raise RuntimeError(f"{results['failed']} of {results.get('matches')} stale chunks of {url} not deleted")
+    return results.get("successful", 0)
@@ -0,0 +1,128 @@
+# Batched writes to Weaviate for the item pipelines.
+#
+# Objects are queued by the pipeline and written by a background thread using
+# Weaviate's batch import endpoint instead of one data_object.create call per
+# document.
+
+import logging
+import queue
+import threading
+import time
+
+from .metrics import STAGE_SECONDS, STORED_OBJECTS, UPSTREAM_ERRORS
+
+_STOP = object()
+
+
+class WeaviateBatchWriter:
+    """
+    Write objects to Weaviate in batches from a background thread.
+
+    `add` blocks once `max_pending` objects are waiting, which pushes back on
+    whoever is producing objects. Objects that Weaviate rejects are retried on
+    their own (the rest of the batch is not resent) up to `max_retries` times.
+    An object's `done` callback is called from the writer thread with True
+    once it is written, or False once the writer gives up on it.
+    """
+
+    def __init__(self, client, class_name="AWSDocument", batch_size=100,
+                 max_pending=1000, flush_interval=1.0, max_retries=3,
+                 retry_backoff=0.5):
+        self.client = client
+        self.class_name = class_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.logger = logging.getLogger(__name__)
+
+        self.written = 0
+        self.failed = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name="weaviate-writer", daemon=True)
+        self.thread.start()
+
+    def add(self, data_object, vector=None, uuid=None, done=None):
+        """
+        Queue an object for writing. Blocks while the queue is full.
+        """
+        self.queue.put((data_object, vector, uuid, done))
+
+    def close(self):
+        """
+        Write everything still queued and stop the background thread.
+        """
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                entry = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                entry = None
+            if entry is _STOP:
+                self._flush(batch)
+                return
+            if entry is not None:
+                batch.append(entry)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _flush(self, batch):
+        attempt = 0
+        while batch:
+            batch = self._send(batch)
+            if not batch:
+                return
+            if attempt >= self.max_retries:
+                self.failed += len(batch)
+                STORED_OBJECTS.labels("failed").inc(len(batch))
+                self.logger.error(f"Giving up on {len(batch)} objects after {attempt} retries")
+                self._notify(batch, False)
+                return
+            attempt += 1
+            time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+    def _send(self, batch):
+        """
+        Send one batch and return the entries that failed.
+        """
+        try:
+            with STAGE_SECONDS.labels(stage="write").time():
+                for data_object, vector, uuid, _ in batch:
+                    self.client.batch.add_data_object(data_object, self.class_name, uuid=uuid, vector=vector)
+                results = self.client.batch.create_objects()
+        except Exception as e:
+            UPSTREAM_ERRORS.labels("weaviate", "write").inc()
+            self.logger.error(f"Weaviate batch error: {e}")
+            self.client.batch.empty_objects()
+            return batch
+
+        failed = []
+        for entry, result in zip(batch, results or []):
+            errors = (result.get('result') or {}).get('errors')
+            if errors:
+                self.logger.warning(f"Weaviate rejected {entry[0].get('url')}: {errors}")
+                failed.append(entry)
+        if results is None or len(results) < len(batch):
+            failed.extend(batch[len(results or []):])
+        self.written += len(batch) - len(failed)
+        STORED_OBJECTS.labels("written").inc(len(batch) - len(failed))
+        failed_ids = {id(entry) for entry in failed}
+        self._notify([entry for entry in batch if id(entry) not in failed_ids], True)
+        return failed
+
+    def _notify(self, batch, ok):
+        for entry in batch:
+            done = entry[3]
+            if done is None:
+                continue
+            try:
+                done(ok)
+            except Exception as e:
+                self.logger.error(f"Error in write callback: {e}")
@@ -0,0 +1,90 @@
+# bench_embedding.py
+# Throughput of WeaviatePipeline embedding against a local stub embedding server.
+#
+# Usage (from the scraper directory):
+#     python -m benchmarks.bench_embedding --items 2000
+
+import argparse
+import logging
+import os
+import time
+
+import tempfile
+
+import openai
+from twisted.internet import defer, task
+
+from aws_tutor_scraper.embedding_cache import EmbeddingCache
+from aws_tutor_scraper.pipelines import WeaviatePipeline
+from benchmarks.stubs import FakeVectorStore, StubEmbeddingServer
+
+# Scrapy's default CONCURRENT_ITEMS
+CONCURRENT_ITEMS = 100
+
+
+def make_items(n):
+    return [
+        {
+            "title": f"Page {i}",
+            "content": "Amazon S3 stores objects in buckets. " * 40,
+            "url": f"https://docs.aws.amazon.com/bench/{i}.html",
+            "section": "Benchmark",
+            "timestamp": "2024-01-01T00:00:00",
+        }
+        for i in range(n)
+    ]
+
+
+@defer.inlineCallbacks
+def run_pipeline(pipeline, items):
+    # Feed items the way Scrapy does: up to CONCURRENT_ITEMS in flight
+    semaphore = defer.DeferredSemaphore(CONCURRENT_ITEMS)
+    start = time.perf_counter()
+    yield defer.DeferredList([
+        semaphore.run(defer.maybeDeferred, pipeline.process_item, item, None)
+        for item in items
+    ])
+    yield pipeline.close_spider(None)
+    return time.perf_counter() - start
+
+
+@defer.inlineCallbacks
+def main(reactor, args):
+    items = make_items(args.items)
+    with StubEmbeddingServer(latency=args.latency) as server:
+        openai.api_base = server.url
+        os.environ["OPENAI_API_KEY"] = "stub"
+        print(f"{'batch size':>10} {'api calls':>10} {'seconds':>8} {'items/s':>9}")
+        for batch_size in args.batch_sizes:
+            server.calls = 0
+            pipeline = WeaviatePipeline(client=FakeVectorStore(latency=0), batch_size=batch_size,
+                                        max_pending_batches=args.pending)
+            elapsed = yield run_pipeline(pipeline, items)
+            print(f"{batch_size:>10} {server.calls:>10} {elapsed:>8.2f} {len(items) / elapsed:>9.1f}")
+
+        # Re-crawl with the embedding cache: only changed pages hit the API
+        print(f"\n{'changed':>10} {'api calls':>10} {'seconds':>8}")
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "cache.sqlite3")
+            for changed in [1.0] + args.changed:
+                n_changed = int(len(items) * changed)
+                for i, item in enumerate(items[:n_changed]):
+                    item['content'] = f"Revision {changed} of page {i}. " + item['content']
+                server.calls = 0
+                pipeline = WeaviatePipeline(client=FakeVectorStore(latency=0), batch_size=64,
+                                            max_pending_batches=args.pending,
+                                            cache=EmbeddingCache(cache_path))
+                elapsed = yield run_pipeline(pipeline, items)
+                print(f"{changed:>10.0%} {server.calls:>10} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub round-trip seconds")
+    parser.add_argument("--pending", type=int, default=4, help="max in-flight batches")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--changed", type=float, nargs="+", default=[0.1, 0.0],
+                        help="fractions of pages changed on each re-crawl")
+    task.react(main, [parser.parse_args()])
@@ -0,0 +1,94 @@
+# bench_extraction.py
+# Per-page CPU time of content extraction in AwsDocsSpider.parse_docs:
+# the previous BeautifulSoup(html.parser) re-parse vs extract_content on the
+# lxml tree Scrapy already built. Runs over the saved pages in fixtures/.
+#
+# Usage (from the scraper directory):
+#     python -m benchmarks.bench_extraction --repeat 200
+
+import argparse
+import glob
+import os
+import time
+
+from scrapy.http import HtmlResponse
+
+from aws_tutor_scraper.extraction import extract_content
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_fixtures():
+    responses = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html"))):
+        with open(path, "rb") as f:
+            response = HtmlResponse(url=f"https://docs.aws.amazon.com/{os.path.basename(path)}",
+                                    body=f.read(), encoding="utf-8")
+        # Scrapy parses the page once for title/link selectors either way
+        response.selector
+        responses.append(response)
+    return responses
+
+
+def legacy_extract(response):
+    """
+    The extraction path parse_docs used before: serialize the content div,
+    re-parse it with html.parser and walk the soup.
+    """
+    from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+    content_div = response.css("div.main-content").get() or response.css("article").get()
+    soup = BeautifulSoup(content_div, 'html.parser')
+    text = soup.get_text(separator="\n", strip=True)
+    section = soup.find(['h1', 'h2'])
+    sections, heading, lines = [], "", []
+    for node in soup.descendants:
+        if isinstance(node, Tag) and node.name in ('h1', 'h2', 'h3'):
+            if lines:
+                sections.append({"heading": heading, "text": "\n".join(lines)})
+            heading, lines = node.get_text(" ", strip=True), []
+        elif isinstance(node, NavigableString) and not isinstance(node, Comment):
+            stripped = node.strip()
+            if stripped and node.find_parent(['h1', 'h2', 'h3']) is None:
+                lines.append(stripped)
+    if lines:
+        sections.append({"heading": heading, "text": "\n".join(lines)})
+    return {"text": text, "section": section.get_text().strip() if section else "", "sections": sections}
+
+
+def current_extract(response):
+    content_div = response.css("div.main-content") or response.css("article")
+    return extract_content(content_div[0].root)
+
+
+def cpu_per_page(extract, responses, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        for response in responses:
+            extract(response)
+    return (time.process_time() - start) / (repeat * len(responses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    responses = load_fixtures()
+    runs = [("lxml tree (current)", current_extract)]
+    try:
+        import bs4  # noqa: F401
+        runs.insert(0, ("bs4 html.parser (before)", legacy_extract))
+        for response in responses:
+            assert legacy_extract(response)["text"] == current_extract(response)["text"]
+    except ImportError:
+        print("beautifulsoup4 not installed; skipping the 'before' measurement")
+
+    print(f"{len(responses)} fixture pages x {args.repeat}")
+    for name, extract in runs:
+        per_page = cpu_per_page(extract, responses, args.repeat)
+        print(f"{name:>26}: {per_page * 1e3:7.3f} ms CPU/page")
+
+
+if __name__ == "__main__":
+    main()
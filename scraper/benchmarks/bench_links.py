@@ -0,0 +1,97 @@
+# bench_links.py
+# parse_docs link handling on pages with thousands of anchors: the previous
+# per-anchor re.match/urljoin loop plus separate content selectors vs the
+# single-pass extract_page + DocsLinkExtractor.
+#
+# Usage (from the scraper directory):
+#     python -m benchmarks.bench_links --links 5000
+
+import argparse
+import re
+import time
+from urllib.parse import urljoin
+
+from scrapy.http import HtmlResponse
+
+from aws_tutor_scraper.extraction import extract_content, extract_page
+from aws_tutor_scraper.links import DocsLinkExtractor
+from aws_tutor_scraper.urls import canonicalize_url
+
+# Mix of href shapes seen on real docs pages
+HREFS = [
+    "API_{i}.html",
+    "API_{i}.html#API_{i}_Errors",
+    "#section-{i}",
+    "/lambda/latest/dg/page-{i}.html",
+    "https://docs.aws.amazon.com/AmazonS3/2006-03-01/API/API_{i}.html",
+    "https://aws.amazon.com/products/{i}/",
+    "/assets/images/diagram-{i}.png",
+    "mailto:docs-{i}@example.com",
+]
+
+
+def make_page(n_links):
+    anchors = "\n".join(
+        f'<li><a href="{HREFS[i % len(HREFS)].format(i=i)}">Link {i}</a></li>' for i in range(n_links)
+    )
+    body = "\n".join(f"<h2>Section {i}</h2><p>Paragraph {i} of the reference.</p>" for i in range(50))
+    html = (f"<html><head><title>Reference</title></head><body><nav><ul>{anchors}</ul></nav>"
+            f'<div class="main-content"><h1>Reference</h1>{body}</div></body></html>')
+    return HtmlResponse(url="https://docs.aws.amazon.com/lambda/latest/api/welcome.html",
+                        body=html.encode(), encoding="utf-8")
+
+
+def legacy_parse(response):
+    """
+    Link and content handling as parse_docs did it before: separate CSS
+    queries, and urljoin plus an uncompiled re.match for every anchor.
+    """
+    title = response.css("title::text").get().strip()
+    content = extract_content((response.css("div.main-content") or response.css("article"))[0].root)
+    links = []
+    for link in response.css("a::attr(href)").getall():
+        link = link.strip()
+        if not link.startswith("http"):
+            link = urljoin(response.url, link)
+        if re.match(r"https://docs\.aws\.amazon\.com/.+", link):
+            links.append(link)
+    links = list(dict.fromkeys(canonicalize_url(link) for link in links))
+    return title, content, links
+
+
+def current_parse(response, extractor=DocsLinkExtractor()):
+    page = extract_page(response.selector.root)
+    return page['title'].strip(), page['content'], extractor.extract(response.url, page['hrefs'])
+
+
+def cpu_per_page(parse, response, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        # Measure cold cost; on a real crawl repeated nav links hit the cache
+        canonicalize_url.cache_clear()
+        parse(response)
+    return (time.process_time() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--links", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'links':>6} {'before ms':>10} {'after ms':>9} {'requests':>9}")
+    for n_links in args.links:
+        response = make_page(n_links)
+        response.selector
+        before = legacy_parse(response)
+        after = current_parse(response)
+        assert before[1] == after[1]
+        # The old loop kept static assets; the new one drops them up front
+        assert set(after[2]) <= set(before[2])
+        print(f"{n_links:>6} {cpu_per_page(legacy_parse, response, args.repeat) * 1e3:>10.2f}"
+              f" {cpu_per_page(current_parse, response, args.repeat) * 1e3:>9.2f}"
+              f" {len(before[2]):>4} -> {len(after[2])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench_store.py
+# Weaviate import time: per-object data_object.create vs WeaviateBatchWriter,
+# measured against an in-memory fake vector store.
+#
+# Usage (from the scraper directory):
+#     python -m benchmarks.bench_store --docs 10000
+
+import argparse
+import time
+
+from aws_tutor_scraper.weaviate_writer import WeaviateBatchWriter
+from benchmarks.stubs import FakeVectorStore
+
+DIM = 1536
+
+
+def make_docs(n):
+    vector = [0.01] * DIM
+    return [
+        ({"title": f"Page {i}", "url": f"https://docs.aws.amazon.com/bench/{i}.html"}, vector, str(i))
+        for i in range(n)
+    ]
+
+
+def import_per_object(store, docs):
+    for data_object, vector, uuid in docs:
+        store.data_object.create(data_object, "AWSDocument", uuid=uuid, vector=vector)
+
+
+def import_batched(store, docs, batch_size):
+    writer = WeaviateBatchWriter(store, batch_size=batch_size)
+    for data_object, vector, uuid in docs:
+        writer.add(data_object, vector=vector, uuid=uuid)
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--latency", type=float, default=0.002, help="fake round-trip seconds")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[50, 100, 500])
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    runs = [("per-object", import_per_object)]
+    runs += [(f"batch={size}", lambda s, d, size=size: import_batched(s, d, size)) for size in args.batch_sizes]
+
+    print(f"{'mode':>12} {'requests':>9} {'seconds':>8} {'s/10k docs':>11}")
+    for name, run in runs:
+        store = FakeVectorStore(latency=args.latency)
+        start = time.perf_counter()
+        run(store, docs)
+        elapsed = time.perf_counter() - start
+        assert len(store.objects) == len(docs)
+        print(f"{name:>12} {store.requests:>9} {elapsed:>8.2f} {elapsed * 10000 / len(docs):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# stubs.py
+# Local stand-ins for the external services the scraper talks to, so
+# benchmarks can run without network access or API keys.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubEmbeddingServer:
+    """
+    Minimal OpenAI-compatible /v1/embeddings endpoint.
+
+    Every call sleeps for `latency` seconds (simulating the network round
+    trip) plus `per_input` seconds per input text.
+    """
+
+    def __init__(self, latency=0.05, per_input=0.0005, dim=1536):
+        self.latency = latency
+        self.per_input = per_input
+        self.dim = dim
+        self.calls = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+                stub.calls += 1
+                time.sleep(stub.latency + stub.per_input * len(inputs))
+                payload = json.dumps({
+                    "object": "list",
+                    "model": body.get('model'),
+                    "data": [
+                        {"object": "embedding", "index": i, "embedding": [0.001 * i] * stub.dim}
+                        for i in range(len(inputs))
+                    ],
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeVectorStore:
+    """
+    In-memory weaviate.Client stand-in with simulated HTTP latency.
+
+    `data_object.create` costs one round trip per object; `batch.create_objects`
+    costs one round trip per batch plus `per_object` seconds per object.
+    """
+
+    def __init__(self, latency=0.002, per_object=0.00002):
+        self.latency = latency
+        self.per_object = per_object
+        self.objects = {}
+        self.requests = 0
+        self.data_object = _FakeDataObject(self)
+        self.batch = _FakeBatch(self)
+        self.schema = _FakeSchema()
+
+
+class _FakeSchema:
+    def __init__(self):
+        self.classes = []
+
+    def get(self):
+        return {"classes": self.classes}
+
+    def create_class(self, schema):
+        self.classes.append(schema)
+
+
+class _FakeDataObject:
+    def __init__(self, store):
+        self.store = store
+
+    def create(self, data_object, class_name, uuid=None, vector=None):
+        self.store.requests += 1
+        time.sleep(self.store.latency + self.store.per_object)
+        self.store.objects[uuid or len(self.store.objects)] = (data_object, vector)
+
+
+class _FakeBatch:
+    def __init__(self, store):
+        self.store = store
+        self.pending = []
+
+    def add_data_object(self, data_object, class_name, uuid=None, vector=None):
+        self.pending.append((uuid, data_object, vector))
+
+    def create_objects(self):
+        self.store.requests += 1
+        time.sleep(self.store.latency + self.store.per_object * len(self.pending))
+        for uuid, data_object, vector in self.pending:
+            self.store.objects[uuid] = (data_object, vector)
+        results = [{"id": uuid, "result": {}} for uuid, _, _ in self.pending]
+        self.pending = []
+        return results
+
+    def empty_objects(self):
+        self.pending = []
+
+    def delete_objects(self, class_name, where, output="minimal"):
+        # Benchmarked pages are new, so nothing matches
+        self.store.requests += 1
+        time.sleep(self.store.latency)
+        return {"results": {"matches": 0, "successful": 0, "failed": 0}}